@@ -0,0 +1,315 @@
+"""
+Rosbag ingestion into typed NumPy columns, without ROS, bagpy or intermediate CSV files.
+
+A ROS1 bag (format 2.0) is read in one sequential pass. Messages of the selected topics are
+collected as raw byte slices and decoded per topic with a single np.frombuffer over a structured
+dtype that mirrors the serialized message, so the cost is one Python step per record and no
+per-message object. Each topic comes back as a structured array with float64 columns, plus
+    t      receive time from the bag record (s)
+    stamp  header stamp (s), for stamped messages
+
+    topics = read_bag('dist/2023-02-03-17-12-17.bag')
+    pose = topics['/mavros/local_position/pose']
+    plt.plot(pose['x'], pose['y'])
+
+load_bag() does the same through a persistent cache keyed by the SHA-1 of the bag file, so
+analysing a bag again is a single np.load (or Parquet read, when pyarrow is installed and
+format='parquet').
+"""
+import bz2
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import logging
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Bump when decoded columns change, so stale cache entries are not reused
+VERSION = 1
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'droneforce', 'bags')
+
+# Topics used by the flight analysis and the message type they are recorded with
+DEFAULT_TOPICS = {
+    '/mavros/local_position/pose': 'geometry_msgs/PoseStamped',
+    '/desired_position': 'geometry_msgs/PoseStamped',
+    '/fault': 'std_msgs/Bool',
+    '/mavros/local_position/odom': 'nav_msgs/Odometry',
+}
+
+# Serialized layout per message type: ('header',), ('string',) or (name, dtype), ('skip', nbytes).
+# Strings are length-prefixed, so their size is found per message.
+_POSE = [('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('qx', '<f8'), ('qy', '<f8'), ('qz', '<f8'), ('qw', '<f8')]
+_TWIST = [('vx', '<f8'), ('vy', '<f8'), ('vz', '<f8'), ('wx', '<f8'), ('wy', '<f8'), ('wz', '<f8')]
+_COVARIANCE = ('skip', 36*8)
+LAYOUTS = {
+    'geometry_msgs/PoseStamped': [('header',)] + _POSE,
+    'geometry_msgs/TwistStamped': [('header',)] + _TWIST,
+    'nav_msgs/Odometry': [('header',), ('string',)] + _POSE + [_COVARIANCE] + _TWIST + [_COVARIANCE],
+    'std_msgs/Bool': [('data', '?')],
+    'std_msgs/Float64': [('data', '<f8')],
+}
+
+_OP_MSG_DATA = 0x02
+_OP_BAG_HEADER = 0x03
+_OP_CHUNK = 0x05
+_OP_CONNECTION = 0x07
+
+# Message data record header as rosbag writes it (fields sorted: conn, op, time), parsed without
+# the generic field loop since nearly every record in a bag is one of these
+_MSG_HEADER_LEN = 38
+_MSG_HEADER = struct.Struct('<I5sII3sBI5s8s')
+_MSG_NAMES = (b'conn=', b'op=', b'time=')
+
+
+def columns(msg_type):
+    ''' Output dtype for a message type: t, stamp (stamped types) and the float64/bool fields. '''
+    layout = LAYOUTS[msg_type]
+    names = [('t', '<f8')]
+    if layout[0] == ('header',):
+        names.append(('stamp', '<f8'))
+    names += [(item[0], '?' if item[1] == '?' else '<f8') for item in layout if len(item) == 2 and item[0] != 'skip']
+    return np.dtype(names)
+
+
+def _fields(header):
+    ''' Record header bytes -> {name: raw value}. '''
+    fields = {}
+    i = 0
+    end = len(header)
+    while i < end:
+        n, = struct.unpack_from('<I', header, i)
+        name, _, value = bytes(header[i+4:i+4+n]).partition(b'=')
+        fields[name.decode()] = value
+        i += 4 + n
+    return fields
+
+
+class _Scanner:
+    """ One pass over the records of a bag, collecting raw messages of the wanted topics. """
+    def __init__(self, topics):
+        self.topics = topics
+        # conn id -> topic, for wanted topics only
+        self.wanted = {}
+        self.types = {}
+        self.messages = {topic: [] for topic in topics}
+        self.times = {topic: [] for topic in topics}
+
+    def scan(self, buf, start, end):
+        unpack = struct.unpack_from
+        unpack_msg = _MSG_HEADER.unpack_from
+        i = start
+        while i < end:
+            header_len, = unpack('<I', buf, i)
+            if header_len == _MSG_HEADER_LEN:
+                _, conn_name, conn, _, op_name, op, _, time_name, time = unpack_msg(buf, i+4)
+                if (conn_name, op_name, time_name) == _MSG_NAMES and op == _OP_MSG_DATA:
+                    i += 4 + header_len
+                    data_len, = unpack('<I', buf, i)
+                    topic = self.wanted.get(conn)
+                    if topic is not None:
+                        self.messages[topic].append(buf[i+4:i+4+data_len])
+                        self.times[topic].append(time)
+                    i += 4 + data_len
+                    continue
+            header = buf[i+4:i+4+header_len]
+            i += 4 + header_len
+            data_len, = unpack('<I', buf, i)
+            data = buf[i+4:i+4+data_len]
+            i += 4 + data_len
+
+            fields = _fields(header)
+            op = fields['op'][0]
+            if op == _OP_MSG_DATA:
+                topic = self.wanted.get(unpack('<I', fields['conn'])[0])
+                if topic is not None:
+                    self.messages[topic].append(data)
+                    self.times[topic].append(fields['time'])
+            elif op == _OP_CONNECTION:
+                self.connection(fields, data)
+            elif op == _OP_CHUNK:
+                self.chunk(fields, data)
+            elif op == _OP_BAG_HEADER:
+                index_pos, = unpack('<Q', fields['index_pos'])
+                # Connection and chunk info records after index_pos repeat what the chunks hold
+                if index_pos:
+                    end = min(end, index_pos)
+
+    def connection(self, fields, data):
+        topic = fields['topic'].decode()
+        if topic not in self.topics:
+            return
+        msg_type = _fields(data)['type'].decode()
+        expected = self.topics[topic]
+        if expected is not None and msg_type != expected:
+            raise ValueError(f'{topic} is recorded as {msg_type}, expected {expected}')
+        self.wanted[struct.unpack('<I', fields['conn'])[0]] = topic
+        self.types[topic] = msg_type
+
+    def chunk(self, fields, data):
+        compression = fields['compression'].decode()
+        if compression == 'none':
+            raw = data
+        elif compression == 'bz2':
+            raw = bz2.decompress(data)
+        elif compression == 'lz4':
+            try:
+                import lz4.frame
+            except ImportError:
+                raise ImportError('lz4 compressed bag: pip install lz4') from None
+            raw = lz4.frame.decompress(data)
+        else:
+            raise ValueError(f'unknown chunk compression {compression!r}')
+        self.scan(memoryview(raw), 0, len(raw))
+
+
+def _structure(layout, message):
+    ''' Structured dtype of one serialized message (string lengths read from it). '''
+    names, formats, offsets = [], [], []
+    i = 0
+    for item in layout:
+        if item == ('header',):
+            names += ['_sec', '_nsec']
+            formats += ['<u4', '<u4']
+            offsets += [i+4, i+8]
+            n, = struct.unpack_from('<I', message, i+12)
+            i += 16 + n
+        elif item == ('string',):
+            n, = struct.unpack_from('<I', message, i)
+            i += 4 + n
+        elif item[0] == 'skip':
+            i += item[1]
+        else:
+            names.append(item[0])
+            formats.append(item[1])
+            offsets.append(i)
+            i += np.dtype(item[1]).itemsize
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': i})
+
+
+def decode(msg_type, messages, times):
+    ''' Raw messages of one type (and their record times) -> structured array of columns(msg_type). '''
+    layout = LAYOUTS[msg_type]
+    out = np.empty(len(messages), dtype=columns(msg_type))
+    if not len(messages):
+        return out
+    t = np.frombuffer(b''.join(times), dtype='<u4').reshape(-1, 2)
+    out['t'] = t[:, 0] + 1e-9 * t[:, 1]
+
+    # Messages with the same string lengths share one dtype; usually that is all of them
+    groups = {}
+    for k, message in enumerate(messages):
+        dtype = _structure(layout, message)
+        groups.setdefault(dtype, []).append(k)
+    for dtype, rows in groups.items():
+        raw = np.frombuffer(b''.join(messages[k] for k in rows), dtype=dtype)
+        rows = np.asarray(rows) if len(groups) > 1 else slice(None)
+        for name in out.dtype.names:
+            if name == 't':
+                continue
+            if name == 'stamp':
+                out['stamp'][rows] = raw['_sec'] + 1e-9 * raw['_nsec']
+            else:
+                out[name][rows] = raw[name]
+    return out
+
+
+def read_bag(path, topics=None):
+    ''' {topic: structured array} for the given topics ({topic: type or None}, DEFAULT_TOPICS by default).
+
+    Every requested topic is in the result; topics the bag does not have come back empty when
+    their type is known.
+    '''
+    topics = dict(DEFAULT_TOPICS if topics is None else topics)
+    for topic, msg_type in topics.items():
+        if msg_type is not None and msg_type not in LAYOUTS:
+            raise ValueError(f'{topic}: no decoder for {msg_type}, supported: {sorted(LAYOUTS)}')
+
+    with open(path, 'rb') as f:
+        buf = memoryview(f.read())
+    if bytes(buf[:13]) != b'#ROSBAG V2.0\n':
+        raise ValueError(f'{path}: not a ROS bag 2.0 file')
+    scanner = _Scanner(topics)
+    scanner.scan(buf, 13, len(buf))
+    result = {}
+    for topic, msg_type in topics.items():
+        msg_type = scanner.types.get(topic, msg_type)
+        if msg_type is not None:
+            result[topic] = decode(msg_type, scanner.messages[topic], scanner.times[topic])
+    return result
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_key(digest, topics):
+    selection = json.dumps(sorted(topics.items()), separators=(',', ':'))
+    return f"{digest}-{hashlib.sha1(f'{VERSION}{selection}'.encode()).hexdigest()[:12]}"
+
+def _topic_file(topic):
+    return topic.strip('/').replace('/', '.') or '_'
+
+
+def load_bag(path, topics=None, cache_dir=CACHE_DIR, format='npz'):
+    ''' read_bag through an on-disk cache keyed by the bag's content hash and the topic selection.
+
+    format is 'npz' (one file per bag) or 'parquet' (a directory with one file per topic, needs
+    pyarrow). cache_dir=None reads the bag without caching.
+    '''
+    topics = dict(DEFAULT_TOPICS if topics is None else topics)
+    if cache_dir is None:
+        return read_bag(path, topics)
+    if format == 'parquet' and pyarrow is None:
+        raise ImportError("format='parquet' needs pyarrow (pip install pyarrow)")
+    if format not in ('npz', 'parquet'):
+        raise ValueError(f"format must be 'npz' or 'parquet', not {format!r}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, _cache_key(file_hash(path), topics))
+    if format == 'npz':
+        entry += '.npz'
+        if os.path.exists(entry):
+            with np.load(entry) as data:
+                return {topic: data[_topic_file(topic)] for topic in topics if _topic_file(topic) in data}
+        result = read_bag(path, topics)
+        # Write then rename, so an interrupted run never leaves a truncated entry
+        tmp = f'{entry}.{os.getpid()}.tmp.npz'
+        np.savez(tmp, **{_topic_file(topic): array for topic, array in result.items()})
+        os.replace(tmp, entry)
+        logging.info('cached %s as %s', path, entry)
+        return result
+
+    if os.path.isdir(entry):
+        result = {}
+        for topic in topics:
+            file = os.path.join(entry, _topic_file(topic) + '.parquet')
+            if os.path.exists(file):
+                table = pyarrow.parquet.read_table(file)
+                cols = {name: table.column(name).to_numpy() for name in table.column_names}
+                array = np.empty(table.num_rows, dtype=[(name, col.dtype) for name, col in cols.items()])
+                for name, col in cols.items():
+                    array[name] = col
+                result[topic] = array
+        return result
+    result = read_bag(path, topics)
+    tmp = f'{entry}.{os.getpid()}.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    for topic, array in result.items():
+        table = pyarrow.table({name: array[name] for name in array.dtype.names})
+        pyarrow.parquet.write_table(table, os.path.join(tmp, _topic_file(topic) + '.parquet'))
+    os.replace(tmp, entry)
+    logging.info('cached %s as %s', path, entry)
+    return result
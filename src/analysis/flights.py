@@ -0,0 +1,175 @@
+"""
+Tracking metrics for recorded flights, computed for a whole directory of bags over a process pool.
+
+Each bag is ingested through the cache of src/analysis/bag.py and its local position compared
+with /desired_position (the setpoint in force at each pose sample). The per-bag metrics are
+joined with a metadata CSV (one row per bag file name, see dist/rosbag.csv) into one table:
+
+    rows = analyse_directory('dist', metadata='dist/rosbag.csv')
+    print(table(rows))
+"""
+import csv
+import glob
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.analysis.bag import CACHE_DIR, load_bag
+from src.analysis.timeindex import DFTimeIndex
+
+import logging
+
+POSE = '/mavros/local_position/pose'
+DESIRED = '/desired_position'
+FAULT = '/fault'
+
+METRICS = ('samples', 'rmse', 'max_dev', 'fault_time', 'rmse_pre', 'rmse_post', 'settling_time')
+METADATA = ('controller', 'trajectory_timer', 'angle_delta', 'rate', 'fault')
+
+
+def tracking_error(pose, desired, align='asof'):
+    ''' (t, error) of every pose sample inside the time span of the desired stream.
+
+    align='asof' compares with the last setpoint received at or before the sample (what the
+    controller was tracking), 'linear' with the setpoints interpolated to the sample time.
+    Bag receive times are used, the setpoints carry no header stamp.
+    '''
+    index = DFTimeIndex(desired['t'])
+    t = pose['t']
+    inside = (t >= index.t[0]) & (t <= index.t[-1]) if len(index) else np.zeros(len(t), dtype=bool)
+    t = t[inside]
+    p = np.column_stack((pose['x'][inside], pose['y'][inside], pose['z'][inside]))
+    p_des = np.column_stack((desired['x'], desired['y'], desired['z']))
+    if align == 'asof':
+        p_des = p_des[index.asof(t)]
+    elif align == 'linear':
+        p_des = index.interpolate(p_des, t)
+    else:
+        raise ValueError(f"align must be 'asof' or 'linear', not {align!r}")
+    return t, np.linalg.norm(p - p_des, axis=1)
+
+
+def fault_time(fault):
+    ''' Receive time of the first /fault message that is True, None if the fault never fired. '''
+    on = np.flatnonzero(fault['data'])
+    return fault['t'][on[0]] if len(on) else None
+
+
+def settling_time(t, error, tol, start=None):
+    ''' Time from start (first sample by default) until the error stays within tol for good;
+    nan if it is still outside at the end. '''
+    if not len(t):
+        return math.nan
+    start = t[0] if start is None else start
+    outside = np.flatnonzero(error > tol)
+    if not len(outside):
+        return 0.0
+    if outside[-1] == len(t) - 1:
+        return math.nan
+    return t[outside[-1] + 1] - start
+
+
+def _rms(x):
+    return float(np.sqrt(np.mean(x**2))) if len(x) else math.nan
+
+
+def flight_metrics(topics, settle_tol=0.5, align='asof'):
+    ''' METRICS of one flight from load_bag() output; times are relative to the first setpoint.
+
+    settling_time is the recovery time: counted from the fault, over the samples after it, when
+    /fault fired, otherwise from the first setpoint.
+    '''
+    desired = topics[DESIRED]
+    t, error = tracking_error(topics[POSE], desired, align)
+    t0 = desired['t'][0] if len(desired) else math.nan
+    t_fault = fault_time(topics[FAULT])
+    pre = error if t_fault is None else error[t < t_fault]
+    after = np.zeros(len(t), dtype=bool) if t_fault is None else t >= t_fault
+    post = error[after]
+    if t_fault is None:
+        settling = settling_time(t, error, settle_tol, start=t0)
+    else:
+        settling = settling_time(t[after], post, settle_tol, start=t_fault)
+    return {
+        'samples': len(error),
+        'rmse': _rms(error),
+        'max_dev': float(error.max()) if len(error) else math.nan,
+        'fault_time': math.nan if t_fault is None else t_fault - t0,
+        'rmse_pre': _rms(pre),
+        'rmse_post': _rms(post),
+        'settling_time': settling,
+    }
+
+
+def analyse(path, cache_dir=CACHE_DIR, settle_tol=0.5, align='asof'):
+    ''' Metrics of one bag as a row {'bag': file name, metric: value}. '''
+    row = {'bag': os.path.basename(path)}
+    row.update(flight_metrics(load_bag(path, cache_dir=cache_dir), settle_tol, align))
+    return row
+
+
+def read_metadata(path):
+    ''' {bag file name: {column: value}} from a CSV with a 'bag' column; numbers become floats. '''
+    metadata = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            for name, value in row.items():
+                try:
+                    row[name] = float(value)
+                except (TypeError, ValueError):
+                    pass
+            metadata[os.path.basename(row.pop('bag'))] = row
+    return metadata
+
+
+def analyse_directory(directory, metadata=None, processes=None, cache_dir=CACHE_DIR, settle_tol=0.5,
+                      align='asof'):
+    ''' analyse() every *.bag in directory over a process pool, joined with the metadata CSV.
+
+    Rows come back sorted by bag name. A bag that cannot be read keeps its metadata, nan metrics
+    and the reason in 'error', instead of stopping the batch. Bags without a metadata row are
+    listed with empty metadata and reported in a warning.
+    '''
+    paths = sorted(glob.glob(os.path.join(directory, '*.bag')))
+    info = read_metadata(metadata) if metadata is not None else {}
+    rows = []
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(analyse, path, cache_dir, settle_tol, align) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                row = future.result()
+                row['error'] = ''
+            except Exception as e:
+                logging.warning('%s: %s', path, e)
+                row = {'bag': os.path.basename(path), 'error': str(e)}
+                row.update({name: math.nan for name in METRICS})
+            for name in METADATA:
+                row.setdefault(name, '')
+            row.update(info.get(row['bag'], {}))
+            rows.append(row)
+    unmatched = [row['bag'] for row in rows if row['bag'] not in info]
+    if metadata is not None and unmatched:
+        logging.warning('%d of %d bags have no row in %s: %s', len(unmatched), len(rows), metadata,
+                        ', '.join(unmatched))
+    return rows
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return '-' if math.isnan(value) else f'{value:.4g}'
+    return str(value)
+
+def table(rows, columns=('bag',) + METADATA + METRICS):
+    ''' Rows as an aligned text table. '''
+    cells = [list(columns)] + [[_cell(row.get(name, '')) for name in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return '\n'.join('  '.join(c.ljust(w) for c, w in zip(line, widths)).rstrip() for line in cells)
+
+def write_csv(rows, path):
+    columns = list(dict.fromkeys(name for row in rows for name in row))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,162 @@
+"""
+Time alignment of topic columns: as-of joins and linear / SLERP interpolation between topics.
+
+Topics arrive at their own rates (the 15 Hz setpoint generator, the mavros pose stream, ...), so
+samples must be put on a common time base before they are compared. A DFTimeIndex wraps the
+sorted receive times of one topic and maps a whole array of query times in one vectorized pass:
+
+    index = DFTimeIndex(desired['t'])
+    k = index.asof(pose['t'])                   # setpoint in force at each pose sample
+    x = index.interpolate(desired['x'], pose['t'])
+
+Lookups are one np.searchsorted of the query times against the index followed by plain array
+arithmetic; with sorted query times numpy narrows each search from the previous result, so
+aligning two streams is effectively a sorted merge. Arrays here are the structured
+column arrays of src/analysis/bag.py; rows without a match are -1 (indices) or nan (values).
+"""
+import numpy as np
+
+from src.utility.quaternion import quaternion_slerp
+
+QUAT = ('qx', 'qy', 'qz', 'qw')
+
+
+class DFTimeIndex:
+    """ Sorted sample times of one stream, for as-of and interpolation lookups. """
+    def __init__(self, t):
+        t = np.asarray(t, dtype=float)
+        if len(t) > 1 and np.any(np.diff(t) < 0):
+            # Keep a stable order for equal times, lookups then return positions in the original array
+            self.order = np.argsort(t, kind='stable')
+            self.t = t[self.order]
+        else:
+            self.order = None
+            self.t = t
+
+    def __len__(self):
+        return len(self.t)
+
+    def _original(self, k):
+        return k if self.order is None else np.where(k >= 0, self.order[np.maximum(k, 0)], -1)
+
+    def asof(self, t, direction='backward', tolerance=None):
+        ''' Index of the sample matching each query time, -1 where there is none.
+
+        direction: 'backward' (last sample at or before t), 'forward' (first at or after t) or
+        'nearest'. tolerance (s) drops matches further away than that.
+        '''
+        t = np.asarray(t, dtype=float)
+        n = len(self.t)
+        if direction not in ('backward', 'forward', 'nearest'):
+            raise ValueError(f"direction must be 'backward', 'forward' or 'nearest', not {direction!r}")
+        if n == 0:
+            return np.full(t.shape, -1)
+        if direction == 'backward':
+            k = np.searchsorted(self.t, t, side='right') - 1
+        elif direction == 'forward':
+            k = np.searchsorted(self.t, t, side='left')
+            k[k >= n] = -1
+        else:
+            after = np.searchsorted(self.t, t, side='left')
+            before = after - 1
+            d_after = np.where(after < n, self.t[np.minimum(after, n-1)] - t, np.inf)
+            d_before = np.where(before >= 0, t - self.t[np.maximum(before, 0)], np.inf)
+            k = np.where(d_before <= d_after, before, after)
+        if tolerance is not None:
+            matched = k >= 0
+            far = np.abs(self.t[np.maximum(k, 0)] - t) > tolerance
+            k[matched & far] = -1
+        return self._original(k)
+
+    def bracket(self, t):
+        ''' (k, w, valid): query times as sample k plus fraction w towards sample k+1, in the sorted
+        order; valid is False outside [t_first, t_last] (no extrapolation). '''
+        t = np.asarray(t, dtype=float)
+        n = len(self.t)
+        if n < 2:
+            valid = np.zeros(t.shape, dtype=bool) if n == 0 else t == self.t[0]
+            return np.zeros(t.shape, dtype=int), np.zeros(t.shape), valid
+        k = np.clip(np.searchsorted(self.t, t, side='right') - 1, 0, n - 2)
+        dt = self.t[k+1] - self.t[k]
+        w = np.divide(t - self.t[k], dt, out=np.zeros(t.shape), where=dt > 0)
+        valid = (t >= self.t[0]) & (t <= self.t[-1])
+        return k, w, valid
+
+    def _sorted(self, values):
+        values = np.asarray(values)
+        return values if self.order is None else values[self.order]
+
+    def interpolate(self, values, t):
+        ''' Linear interpolation of values (n, ...) sampled at this index to the query times. '''
+        values = self._sorted(values).astype(float, copy=False)
+        k, w, valid = self.bracket(t)
+        if len(self.t) < 2:
+            out = np.full(np.shape(t) + values.shape[1:], np.nan)
+            out[valid] = values[0]
+            return out
+        w = w.reshape(w.shape + (1,) * (values.ndim - 1))
+        out = values[k] + w * (values[k+1] - values[k])
+        out[~valid] = np.nan
+        return out
+
+    def slerp(self, quaternions, t):
+        ''' SLERP of (n, 4) (x, y, z, w) quaternions sampled at this index to the query times. '''
+        q = self._sorted(quaternions).astype(float, copy=False)
+        k, w, valid = self.bracket(t)
+        if len(self.t) < 2:
+            out = np.full(np.shape(t) + (4,), np.nan)
+            out[valid] = q[0] / np.linalg.norm(q[0])
+            return out
+        out = quaternion_slerp(q[k], q[k+1], w)
+        out[~valid] = np.nan
+        return out
+
+
+def quaternions(array):
+    ''' (n, 4) quaternion columns (qx, qy, qz, qw) of a structured array. '''
+    return np.stack([array[name] for name in QUAT], axis=-1)
+
+
+def asof_join(left, right, columns=None, direction='backward', tolerance=None, suffix=''):
+    ''' Columns of right matched as-of to every row of left (both structured, with a 't' column).
+
+    Returns left with the right columns appended (named name + suffix), nan where no sample
+    matched; an integer column becomes float so it can hold nan, booleans become False.
+    '''
+    columns = [name for name in right.dtype.names if name != 't'] if columns is None else list(columns)
+    k = DFTimeIndex(right['t']).asof(left['t'], direction, tolerance)
+    matched = k >= 0
+    k = np.maximum(k, 0)
+    values = {}
+    for name in columns:
+        column = right[name]
+        if column.dtype == bool:
+            values[name] = matched & column[k] if len(column) else matched
+        else:
+            values[name] = np.where(matched, column[k], np.nan) if len(column) else np.full(len(k), np.nan)
+    return _append(left, values, suffix)
+
+
+def interpolate_join(left, right, columns=None, suffix=''):
+    ''' Columns of right interpolated to the times of left: linear, and SLERP for the quaternion
+    columns (qx, qy, qz, qw) when all four are requested. nan outside the time span of right. '''
+    columns = [name for name in right.dtype.names if name != 't'] if columns is None else list(columns)
+    index = DFTimeIndex(right['t'])
+    interpolated = {}
+    if all(name in columns for name in QUAT):
+        q = index.slerp(quaternions(right), left['t'])
+        interpolated.update({name: q[:, i] for i, name in enumerate(QUAT)})
+    for name in columns:
+        if name not in interpolated:
+            interpolated[name] = index.interpolate(right[name], left['t'])
+    return _append(left, {name: interpolated[name] for name in columns}, suffix)
+
+
+def _append(left, values, suffix):
+    dtype = left.dtype.descr + [(name + suffix, column.dtype) for name, column in values.items()]
+    out = np.empty(len(left), dtype=dtype)
+    for name in left.dtype.names:
+        out[name] = left[name]
+    for name, column in values.items():
+        out[name + suffix] = column
+    return out
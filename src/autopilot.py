@@ -1,22 +1,47 @@
-import time
-from dronekit import connect
 from pymavlink import mavutil
 
+from src.telemetry import DFTelemetry
+from src.transport import TRANSPORTS
+
 import logging
 
+# RC_CHANNELS_OVERRIDE value that leaves a channel untouched
+RC_CHANNEL_IGNORE = 65535
+# RC_CHANNELS_OVERRIDE carries 8 channels on MAVLink 1.0 (--mav10)
+RC_OVERRIDE_CHANNELS = 8
+
+# Telemetry the controllers need: attitude and body rates, local position and velocity, motor outputs
+CONTROL_STREAMS = ('ATTITUDE_QUATERNION', 'LOCAL_POSITION_NED', 'SERVO_OUTPUT_RAW')
+
+def control_stream_rates(rate, oversample=2):
+    ''' {message: Hz} for a controller running at rate Hz: state at oversample times the control rate,
+    so every tick of a fixed-rate loop sees a fresh sample (1 for a loop triggered by the samples),
+    and the motor outputs once per tick. '''
+    return {'ATTITUDE_QUATERNION': oversample * rate, 'LOCAL_POSITION_NED': oversample * rate, 'SERVO_OUTPUT_RAW': rate}
+
 class DFAutopilot:
-    """ A Dronekit autopilot connection manager. """
-    def __init__(self, connection_string, *args, **kwargs):
+    """ An autopilot connection manager over a pluggable MAVLink transport.
+
+    transport is 'dronekit' (default), 'mavlink' (lean pymavlink link) or an already
+    constructed transport object (see src/transport.py).
+    """
+    def __init__(self, connection_string, transport='dronekit', *args, **kwargs):
         logging.debug('connecting to Drone (or SITL/HITL) on: %s', connection_string)
         self.alive = True
-        self.master = connect(connection_string, wait_ready=True, rate=20)
-        self.mavutil = mavutil.mavlink_connection('127.0.0.1:14552')
+        if isinstance(transport, str):
+            transport = TRANSPORTS[transport](connection_string, *args, **kwargs)
+        self.transport = transport
+        # Dronekit Vehicle, for scripts that still use its attributes (mode, attitude, ...)
+        self.master = getattr(transport, 'vehicle', None)
+        # Per-type telemetry subscriptions on this link (see src/telemetry.py), started on demand
+        self.telemetry = DFTelemetry(transport)
         # Add a heartbeat listener
         # Func for heartbeat
         def heartbeat_listener(_self, name, msg):
             self.last_heartbeat = msg
 
         self.heart = heartbeat_listener
+        self.rc_channels = [RC_CHANNEL_IGNORE] * RC_OVERRIDE_CHANNELS
 
         logging.info('Drone connection successful')
 
@@ -25,7 +50,7 @@ class DFAutopilot:
         self.alive = True
         logging.info('__enter__ -> reviving heart (if required)')
         # Listen to the heartbeat
-        self.master.add_message_listener('HEARTBEAT', self.heart)
+        self.transport.add_listener('HEARTBEAT', self.heart)
        
         return self
 
@@ -35,17 +60,18 @@ class DFAutopilot:
         logging.info('__exit__ -> disarming, stopping heart and closing connection')
         # TODO: add reset parameters procedure. Can be based on flag?
         # Disarm if not disarmed
-        if self.master.armed:
-            self.master.armed = False
+        if self.transport.armed:
+            self.transport.disarm()
         # Kill heartbeat
-        self.master.remove_message_listener('HEARTBEAT', self.heart)
+        self.transport.remove_listener('HEARTBEAT', self.heart)
+        self.telemetry.stop()
         # Close Drone connection
         logging.info('disconnect -> closing Drone connection') 
-        self.master.close()
+        self.transport.close()
 
     def set_servo(self, motor_num, pwm_value):
         pwm_value_int = int(pwm_value)
-        msg = self.master.message_factory.command_long_encode(
+        msg = self.transport.mav.command_long_encode(
                     0, 0, 
                     mavutil.mavlink.MAV_CMD_DO_SET_SERVO,
                     0,
@@ -53,17 +79,120 @@ class DFAutopilot:
                     pwm_value_int,
                     0,0,0,0,0
                     )
-        self.master.send_mavlink(msg)
+        self.transport.send(msg)
 
-    def set_motor_mode(self, motor_num, set_reset):
-        # get servo function - what this motor does
-        logging.debug("PRE SET PARAM %s: %s", f'SERVO{motor_num}_FUNCTION', self.master.parameters[f'SERVO{motor_num}_FUNCTION'])
-        time.sleep(0.1)
+    def set_servos(self, pwm_values):
+        ''' Set the PWM value of motors 1..n in a single RC_CHANNELS_OVERRIDE frame.
+
+        Motors have to be in RCPassThru (see set_motor_mode) so that RC channel n
+        is passed straight to servo n. Unlike set_servo, this is one unacknowledged
+        packet per tick and all motors are updated together.
+        '''
+        if len(pwm_values) > RC_OVERRIDE_CHANNELS:
+            raise ValueError(f'set_servos supports up to {RC_OVERRIDE_CHANNELS} motors, got {len(pwm_values)}')
+        for i, pwm_value in enumerate(pwm_values):
+            self.rc_channels[i] = int(pwm_value)
+        # Channels beyond this call must not keep overriding with an earlier call's PWMs
+        for i in range(len(pwm_values), RC_OVERRIDE_CHANNELS):
+            self.rc_channels[i] = RC_CHANNEL_IGNORE
+        msg = self.transport.mav.rc_channels_override_encode(
+                    0, 0,
+                    *self.rc_channels
+                    )
+        self.transport.send(msg)
+
+    def fetch_params(self, names, timeout=1.0):
+        ''' Read several parameters at once; returns {name: value} for those that answered. '''
+        msgs = [self.transport.mav.param_request_read_encode(
+                    self.transport.target_system, self.transport.target_component,
+                    name.encode('ascii'), -1)
+                for name in names]
+        replies = self.transport.request(msgs, 'PARAM_VALUE', names, lambda m: m.param_id, timeout)
+        return {name: msg.param_value for name, msg in replies.items()}
+
+    def configure_motors(self, functions, timeout=1.0, retries=1):
+        ''' Set SERVOn_FUNCTION for several motors at once, e.g. {1: 1, 2: 1, 3: 1, 4: 1} for RCPassThru.
+
+        Motors already at the requested function in the cached parameter snapshot are skipped.
+        The remaining PARAM_SETs are sent back to back and their PARAM_VALUE acks are collected
+        together (resending the unacknowledged ones up to `retries` times).
+        Returns the list of motors that were not confirmed.
+        '''
+        motors = {f'SERVO{motor_num}_FUNCTION': motor_num for motor_num in functions}
+        # Snapshot the parameters we have never seen before comparing against it
+        unknown = [name for name in motors if self.transport.cached_param(name) is None]
+        if unknown:
+            self.fetch_params(unknown, timeout)
 
-        # set servo function - change to 1 for RCPassThru
-        self.master.parameters[f'SERVO{motor_num}_FUNCTION'] = set_reset
-        time.sleep(0.1)
+        pending = {}
+        for name, motor_num in motors.items():
+            value = float(functions[motor_num])
+            if self.transport.cached_param(name) == value:
+                logging.debug("SKIP SET PARAM %s: already %s", name, value)
+            else:
+                pending[name] = value
 
-        # get servo function - what this motor does
-        logging.debug("POST SET PARAM %s: %s", f'SERVO{motor_num}_FUNCTION', self.master.parameters[f'SERVO{motor_num}_FUNCTION'])
-        time.sleep(0.1)
\ No newline at end of file
+        def confirmed(msg):
+            # Only an ack carrying the requested value counts
+            if pending.get(msg.param_id) == msg.param_value:
+                return msg.param_id
+
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            msgs = [self.transport.mav.param_set_encode(
+                        self.transport.target_system, self.transport.target_component,
+                        name.encode('ascii'), value, mavutil.mavlink.MAV_PARAM_TYPE_REAL32)
+                    for name, value in pending.items()]
+            acks = self.transport.request(msgs, 'PARAM_VALUE', list(pending), confirmed, timeout)
+            for name in acks:
+                logging.debug("POST SET PARAM %s: %s", name, pending.pop(name))
+
+        if pending:
+            logging.warning('SERVOn_FUNCTION not confirmed after %d attempts: %s', retries + 1, sorted(pending))
+        return sorted(motors[name] for name in pending)
+
+    def set_message_interval(self, name, rate, timeout=1.0):
+        ''' Ask for `name` messages at rate Hz through MAV_CMD_SET_MESSAGE_INTERVAL (0 stops the
+        message, None restores the autopilot's default). Returns the MAV_RESULT, None without an ack. '''
+        msg_id = getattr(mavutil.mavlink, f'MAVLINK_MSG_ID_{name}')
+        interval = 0 if rate is None else -1 if rate == 0 else int(1e6 / rate)
+        msg = self.transport.mav.command_long_encode(
+                    self.transport.target_system, self.transport.target_component,
+                    mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL,
+                    0,
+                    msg_id,
+                    interval,
+                    0,0,0,0,0
+                    )
+        acks = self.transport.request([msg], 'COMMAND_ACK', [mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL],
+                                      lambda m: m.command, timeout)
+        ack = acks.get(mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL)
+        return None if ack is None else ack.result
+
+    def configure_streams(self, rates, verify=2.0, tolerance=0.8, timeout=1.0):
+        ''' Request exactly the messages in rates {name: Hz} (e.g. control_stream_rates(30)), then
+        measure for `verify` seconds what actually arrives.
+
+        Returns {name: {'requested': Hz, 'result': MAV_RESULT or None, 'achieved': Hz}} and warns
+        about messages that were refused or arrive slower than tolerance * requested.
+        '''
+        report = {}
+        # One command at a time: the acks of MAV_CMD_SET_MESSAGE_INTERVAL do not say which message they answer
+        for name, rate in rates.items():
+            report[name] = {'requested': rate, 'result': self.set_message_interval(name, rate, timeout), 'achieved': None}
+        if verify:
+            for name, achieved in self.telemetry.measure_rates(list(rates), verify).items():
+                report[name]['achieved'] = achieved
+        for name, stream in report.items():
+            if stream['result'] != mavutil.mavlink.MAV_RESULT_ACCEPTED:
+                logging.warning('%s at %s Hz not accepted (MAV_RESULT %s)', name, stream['requested'], stream['result'])
+            elif stream['achieved'] is not None and stream['achieved'] < tolerance * stream['requested']:
+                logging.warning('%s requested at %s Hz, arriving at %.1f Hz', name, stream['requested'], stream['achieved'])
+            else:
+                logging.debug('%s: requested %s Hz, achieved %s Hz', name, stream['requested'], stream['achieved'])
+        return report
+
+    def set_motor_mode(self, motor_num, set_reset):
+        # set servo function - 1 for RCPassThru, 33.. for Motor1..
+        return not self.configure_motors({motor_num: set_reset})
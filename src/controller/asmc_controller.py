@@ -1,331 +1,476 @@
-#!/usr/bin/env python
-import sys
-# ROS python API
-import rospy
-
-import tf.transformations as transformations
-
-# 3D point & Stamped Pose msgs
-from trajectory_msgs.msg import MultiDOFJointTrajectory as Mdjt
-# from msg_check.msg import PlotDataMsg
-
+import math
 
 import numpy as np
-from tf.transformations import *
-#import RPi.GPIO as GPIO
-import time
+
+from src.dynamics.kinematics import quat_to_rot, desired_frame, attitude_error
+from src.dynamics.state import POS, VEL, QUAT, OMEGA, SP_POS, SP_VEL, SP_YAW
 
 import logging
 
+def _quat_to_rot_table():
+    ''' (9, 16) matrix taking the products q_a q_b (a, b in x, y, z, w) to R - I, row-major. '''
+    x, y, z, w = range(4)
+    table = np.zeros((9, 16))
+    for entry, terms in enumerate((
+            ((-2, y, y), (-2, z, z)), ((2, x, y), (-2, z, w)), ((2, x, z), (2, y, w)),
+            ((2, x, y), (2, z, w)), ((-2, x, x), (-2, z, z)), ((2, y, z), (-2, x, w)),
+            ((2, x, z), (-2, y, w)), ((2, y, z), (2, x, w)), ((-2, x, x), (-2, y, y)))):
+        for coefficient, a, b in terms:
+            table[entry, 4*a + b] = coefficient
+    return table
+
+# Batched quat_to_rot: R = I + QUAT_TO_ROT @ (q q^T), for (4, N) quaternion stacks
+QUAT_TO_ROT = _quat_to_rot_table()
+# Attitude error from E = rot_des^T rot_curr flattened row-major: -0.5 (E12 - E21), -0.5 (E02 - E20), 0.5 (E01 - E10)
+SKEW = np.array([
+    [0.0, 0.0, 0.0, 0.0, 0.0, -0.5, 0.0, 0.5, 0.0],
+    [0.0, 0.0, -0.5, 0.0, 0.0, 0.0, 0.5, 0.0, 0.0],
+    [0.0, 0.5, 0.0, -0.5, 0.0, 0.0, 0.0, 0.0, 0.0],
+])
 
 class ASMC_Controller:
-    """ ASMC Controller manager. """
-    # initialization method
-    def __init__(self):
-        # Instantiate a setpoints message
-        self.sp = []
-        # set the flag to use position setpoints and yaw angle
-       
-        # Step size for position update
-        self.STEP_SIZE = 2.0
-        # Fence. We will assume a square fence for now
-        self.FENCE_LIMIT = 5.0
-
-        # A Message for the current local position of the drone
-        # Parameters for PX4
-        # NAV_RCL_ACT 0
-        # COM_RCL_EXCEPT 4
-        # NAV_DLL_ACT 0
-
-        # initial values for setpoints
-        self.cur_pose = []
-
-        self.cur_pose.pose.position.x = 0
-        self.cur_pose.pose.position.y = 0
-        self.cur_pose.pose.position.z = 0
-
-        self.cur_pose.pose.orientation.w = 0
-        self.cur_pose.pose.orientation.x = 0
-        self.cur_pose.pose.orientation.y = 0
-        self.cur_pose.pose.orientation.z = 0
-
-        self.cur_vel = []
-        self.sp.pose.position.x = 0.0
-        self.sp.pose.position.y = 0.0
-        self.ALT_SP = 1.0
-        self.sp.pose.position.z = self.ALT_SP
-        self.local_pos = [0.0, 0.0, self.ALT_SP]
-        self.local_quat = np.array([0.0, 0.0, 0.0, 1.0])
-        self.desVel = np.zeros(3)
-        self.errInt = np.zeros(3)
-        self.att_cmd = []
-        self.thrust_cmd = []
-
-        # Control parameters
-        self.Kp0 = np.array([1.0, 1.0, 1.0])
-        self.Kp1 = np.array([2.0, 2.0, 1.0])
-
-        self.Lam = np.array([2.0, 2.0, 3.0])
-        self.Phi = np.array([1.5, 1.5, 1.0])
-        self.M = 0.1
-
-        self.alpha_0 = np.array([1,1,1])
-        self.alpha_1 = np.array([3,3,3])
-        self.alpha_m = 0.01
-        self.v = 0.1
+    """ ROS-free adaptive sliding mode controller (the loop of tests/test-28-asmc-hold.py).
+
+    Outer loop: ASMC on position -> desired thrust vector -> desired attitude and normalized thrust.
+    Inner loop: ASMC on the attitude error -> normalized FRD body moments.
+
+    step(state, setpoint, dt) takes the arrays of src/dynamics/state.py and returns
+    (th_cmd, torq_cmd) ready for the CA_inv mixer. All working arrays are allocated once here;
+    torq_cmd is one of them, so copy it if it has to outlive the next step.
+
+    Set armed to False to freeze the gain adaptation (the scripts do this until the vehicle is armed).
+    boundary selects the switching term: 'norm' (unit sliding vector with an epsilon boundary layer,
+    test-28) or 'axis' (per-axis saturation sigmoid, test-20/21).
+    """
+    def __init__(self, *args, **kwargs):
+        # Outer loop adaptation
+        self.Kp0_ = 0.1
+        self.Kp1_ = 0.1
+        self.alpha_0_ = 10.0
+        self.alpha_1_ = 10.0
+
+        # Tuning for outer
+        self.Lam = np.array([0.95, 0.95, 5.0])
+        self.Phi = np.array([1.0, 1.0, 1.1])   #1.0 - 1.5
+
+        self.M = 0.5
+        self.alpha_m = 0.01  # 0.01 - 0.05
 
         self.norm_thrust_const = 0.06
-        self.max_th = 16.0
-        self.max_throttle = 0.96
-        
+        self.max_th = 18.0
+        self.max_throttle = 0.95
+
+        # Inner loop adaptation
+        self.Kp0_q_ = 0.1
+        self.Kp1_q_ = 0.1
+        self.Kp2_q_ = 0.1
+        self.alpha_0_q_ = 1
+        self.alpha_1_q_ = 1
+        self.alpha_2_q_ = 1
+
+        # Tuning for inner
+        self.Lam_q = np.array([2.0, 2.0, 2.0])
+        self.Phi_q = np.array([1.5, 1.5, 1.5])   #1.0 - 1.5
+
+        self.norm_moment_const = 0.05
+        self.max_mom = 10
+        self.max_mom_throttle = 0.5
+
+        self.v = 1.0
+        self.v_q = 1.0
+        self.epsilon = 0.001
+        self.epsilon_q = 0.01
+        # Weight of the switching term, same on every axis
+        self.delta = 0.1
+        self.boundary = 'norm'
+
+        self.max_dt = 0.02
+        self.max_dt_q = 0.04
         self.gravity = np.array([0, 0, 9.8])
-        self.pre_time = time.time()    
-        # self.data_out = PlotDataMsg()
-
-        # Publishers
-        # Add att and thrust pub
-        # self.att_pub = rospy.Publisher('mavros/setpoint_attitude/attitude', PoseStamped, queue_size=10)
-        # self.thrust_pub = rospy.Publisher('mavros/setpoint_attitude/thrust', Thrust, queue_size=10)
-        # self.data_pub = rospy.Publisher('/data_out', PlotDataMsg, queue_size=10)
-        self.armed = False
-        self.pin_1 = 16
-        self.pin_2 = 18
+        self.armed = True
+        for name, value in kwargs.items():
+            setattr(self, name, np.array(value, dtype=float) if np.ndim(value) else value)
+        if self.boundary not in ('norm', 'axis'):
+            raise ValueError(f"boundary must be 'norm' or 'axis', not {self.boundary!r}")
+
+        # Working arrays
+        self.errPos = np.zeros(3)
+        self.errVel = np.zeros(3)
+        self.sv = np.zeros(3)
+        self.sv_tmp = np.zeros(3)
+        self.delTau = np.zeros(3)
+        self.des_th = np.zeros(3)
+        self.rot_curr = np.eye(3)
+        self.rot_des = np.eye(3)
+        self.euler_err = np.zeros(3)
+        self.euler_rate_err = np.zeros(3)
+        self.sv_q = np.zeros(3)
+        self.delTau_q = np.zeros(3)
+        self.torq_cmd = np.zeros(3)
+        self.th_cmd = 0.0
+        self.gains = (self.Kp0_, self.Kp1_, self.M, self.Kp0_q_, self.Kp1_q_, self.Kp2_q_)
+        logging.info('ASMC Controller initiated')
 
     def __enter__(self):
         return self
 
     def __exit__(self, *args):
-        x = 0
-        # Kill variables here
-
-    def multiDoFCb(self, msg):
-        pt = msg.points[0]
-        self.sp.pose.position.x = pt.transforms[0].translation.x
-        self.sp.pose.position.y = pt.transforms[0].translation.y
-        self.sp.pose.position.z = pt.transforms[0].translation.z
-        # self.data_out.sq = self.sp.pose.position
-        self.desVel = np.array([pt.velocities[0].linear.x, pt.velocities[0].linear.y, pt.velocities[0].linear.z])
-        # self.desVel = np.array([pt.accelerations[0].linear.x, pt.accelerations[0].linear.y, pt.accelerations[0].linear.z])
-        # self.array2Vector3(sp.pose.position, self.data_out.acceleration)
-
-    ## local position callback
-    def posCb(self, msg):
-        self.local_pos.x = msg.pose.position.x
-        self.local_pos.y = msg.pose.position.y
-        self.local_pos.z = msg.pose.position.z
-        self.local_quat[0] = msg.pose.orientation.x
-        self.local_quat[1] = msg.pose.orientation.y
-        self.local_quat[2] = msg.pose.orientation.z
-        self.local_quat[3] = msg.pose.orientation.w
-
-    ## Update setpoint message
-    def updateSp(self):
-        self.sp.pose.position.x = self.local_pos.x
-        self.sp.pose.position.y = self.local_pos.y
-        # self.sp.position.z = self.local_pos.z
-
-    def odomCb(self, msg):
-        self.cur_pose.pose.position.x = msg.pose.pose.position.x
-        self.cur_pose.pose.position.y = msg.pose.pose.position.y
-        self.cur_pose.pose.position.z = msg.pose.pose.position.z
-
-        self.cur_pose.pose.orientation.w = msg.pose.pose.orientation.w
-        self.cur_pose.pose.orientation.x = msg.pose.pose.orientation.x
-        self.cur_pose.pose.orientation.y = msg.pose.pose.orientation.y
-        self.cur_pose.pose.orientation.z = msg.pose.pose.orientation.z
-
-        self.cur_vel.twist.linear.x = msg.twist.twist.linear.x
-        self.cur_vel.twist.linear.y = msg.twist.twist.linear.y
-        self.cur_vel.twist.linear.z = msg.twist.twist.linear.z
-
-        self.cur_vel.twist.angular.x = msg.twist.twist.angular.x
-        self.cur_vel.twist.angular.y = msg.twist.twist.angular.y
-        self.cur_vel.twist.angular.z = msg.twist.twist.angular.z
-
-    def newPoseCB(self, msg):
-        if(self.sp.pose.position != msg.pose.position):
-            print("New pose received")
-        self.sp.pose.position.x = msg.pose.position.x
-        self.sp.pose.position.y = msg.pose.position.y
-        self.sp.pose.position.z = msg.pose.position.z
-   
-        self.sp.pose.orientation.x = msg.pose.orientation.x
-        self.sp.pose.orientation.y = msg.pose.orientation.y
-        self.sp.pose.orientation.z = msg.pose.orientation.z
-        self.sp.pose.orientation.w = msg.pose.orientation.w
-
-    def vector2Arrays(self, vector):        
-        return np.array([vector.x, vector.y, vector.z])
-
-    def array2Vector3(self, array, vector):
-        vector.x = array[0]
-        vector.y = array[1]
-        vector.z = array[2]
-
-    def sigmoid(self, s, v):
-        if np.absolute(s) > v:
-            return s/np.absolute(s)
+        self.reset()
+
+    def reset(self):
+        ''' Restore the adaptive gains to their initial values. '''
+        self.Kp0_, self.Kp1_, self.M, self.Kp0_q_, self.Kp1_q_, self.Kp2_q_ = self.gains
+        self.torq_cmd[:] = 0.0
+        self.th_cmd = 0.0
+
+    def switching(self, s, s_norm, Rho, epsilon, v, out):
+        ''' Rho * unit(s): one norm for the whole vector, or a per-axis saturation. '''
+        if self.boundary == 'norm':
+            np.multiply(s, Rho / max(s_norm, epsilon), out=out)
         else:
-            return s/v
+            np.divide(s, v, out=out)
+            np.clip(out, -1.0, 1.0, out=out)
+            out *= Rho
+        return out
+
+    def th_des(self, state, setpoint, dt):
+        dt = min(dt, self.max_dt)
+        errPos = np.subtract(state[POS], setpoint[SP_POS], out=self.errPos)
+        errVel = np.subtract(state[VEL], setpoint[SP_VEL], out=self.errVel)
+
+        sv = np.multiply(self.Phi, errPos, out=self.sv)
+        sv += errVel
+        # |[errPos, errVel]| without concatenating
+        zi_norm = min(math.sqrt(errPos.dot(errPos) + errVel.dot(errVel)), 5.0)
+        sv_norm = math.sqrt(sv.dot(sv))
 
-    def th_des(self):
-        dt = rospy.get_time() - self.pre_time
-        self.pre_time = self.pre_time + dt
-        if dt > 0.04:
-            dt = 0.04
+        if self.armed:
+            self.Kp0_ = max(self.Kp0_ + (sv_norm - self.alpha_0_*self.Kp0_)*dt, 0.0001)
+            self.Kp1_ = max(self.Kp1_ + (sv_norm*zi_norm - self.alpha_1_*self.Kp1_)*dt, 0.0001)
+            self.M = max(self.M + (-sv[2] - self.alpha_m*self.M)*dt, 0.1)
 
-        curPos = self.vector2Arrays(self.cur_pose.pose.position)
-        desPos = self.vector2Arrays(self.sp.pose.position)
-        curVel = self.vector2Arrays(self.cur_vel.twist.linear)
+        Rho = self.Kp0_ + self.Kp1_*zi_norm
+        delTau = self.switching(sv, sv_norm, Rho, self.epsilon, self.v, self.delTau)
 
-        errPos = curPos - desPos
-        errVel = curVel - self.desVel
-        # print(errPos)
-        sv = errVel + np.multiply(self.Phi, errPos)
+        # des_th = -Lam*sv - delta*Rho*delTau + M*gravity
+        des_th = np.multiply(self.gravity, self.M, out=self.des_th)
+        des_th -= np.multiply(self.Lam, sv, out=self.sv_tmp)
+        delTau *= self.delta*Rho
+        des_th -= delTau
 
-        if self.armed:
-            self.Kp0 += (sv - np.multiply(self.alpha_0, self.Kp0))*dt
-            self.Kp1 += (sv - np.multiply(self.alpha_1, self.Kp1))*dt
-            self.Kp0 = np.maximum(self.Kp0, 0.0001*np.ones(3))
-            self.Kp1 = np.maximum(self.Kp1, 0.0001*np.ones(3))
-            # self.M += (-sv[2] - self.alpha_m*self.M)*dt
-            # self.M = np.maximum(self.M, 0.1)
-            # print(self.M)
+        # putting limit on maximum thrust vector
+        th_norm = math.sqrt(des_th.dot(des_th))
+        if th_norm > self.max_th:
+            des_th *= self.max_th/th_norm
+            th_norm = self.max_th
+        return des_th, th_norm
 
-        Rho = self.Kp0 + self.Kp1*errPos
+    def acc2quat(self, des_th, th_norm, des_yaw, out=None):
+        ''' Desired rotation (columns xb, yb, zb) for a thrust vector and yaw, written into out. '''
+        out = self.rot_des if out is None else out
+        desired_frame(des_th, des_yaw, out)
+        return out
 
-        delTau = np.zeros(3)
-        delTau[0] = Rho[0]*self.sigmoid(sv[0],self.v)
-        delTau[1] = Rho[1]*self.sigmoid(sv[1],self.v)
-        delTau[2] = Rho[2]*self.sigmoid(sv[2],self.v)
+    def geo_con_new(self, state, setpoint, dt):
+        rot_curr = quat_to_rot(state[QUAT], self.rot_curr)
 
-        des_th = -np.multiply(self.Lam, sv) - delTau + self.M*self.gravity
-        # print((des_th))
+        des_th, th_norm = self.th_des(state, setpoint, dt)
+        rot_des = self.acc2quat(des_th, th_norm, setpoint[SP_YAW])
 
-        # self.array2Vector3(sv, self.data_out.sp)
-        #self.array2Vector3(self.Kp0, self.data_out.Kp_hat)
-        # self.array2Vector3(errPos, self.data_out.position_error)
-        # self.array2Vector3(errVel, self.data_out.velocity_error)
-        #self.array2Vector3(delTau, self.data_out.delTau_p)
-        #self.array2Vector3(Rho, self.data_out.rho_p)
-        #self.data_out.M_hat = self.M
+        # des_th . zb_des is |des_th| (zb_des = des_th / |des_th|)
+        thrust = self.norm_thrust_const * th_norm
+        thrust = max(0.0, min(thrust, self.max_throttle))
 
+        attitude_error(rot_des, rot_curr, self.euler_err)
 
-        # putting limit on maximum thrust vector
-        if np.linalg.norm(des_th) > self.max_th:
-            des_th = (self.max_th/np.linalg.norm(des_th))*des_th
-
-        return des_th
-
-    def acc2quat(self, des_th, des_yaw):
-        proj_xb_des = np.array([np.cos(des_yaw), np.sin(des_yaw), 0.0])
-        if np.linalg.norm(des_th) == 0.0:
-            zb_des = np.array([0,0,1])
-        else:    
-            zb_des = des_th / np.linalg.norm(des_th)
-        yb_des = np.cross(zb_des, proj_xb_des) / np.linalg.norm(np.cross(zb_des, proj_xb_des))
-        xb_des = np.cross(yb_des, zb_des) / np.linalg.norm(np.cross(yb_des, zb_des))
-       
-        rotmat = np.transpose(np.array([xb_des, yb_des, zb_des]))
-        return rotmat
-
-    def geo_con(self):
-        des_th = self.th_des()    
-        r_des = self.acc2quat(des_th, 0.0)
-        rot_44 = np.vstack((np.hstack((r_des,np.array([[0,0,0]]).T)), np.array([[0,0,0,1]])))
-
-        quat_des = quaternion_from_matrix(rot_44)
-       
-        zb = r_des[:,2]
-        # thrust = self.norm_thrust_const * des_th.dot(zb)
-        # self.data_out.thrust = thrust
-        
-        # thrust = np.maximum(0.0, np.minimum(thrust, self.max_throttle))
-
-        now = rospy.Time.now()
-        # self.data_out.header.stamp = now
-        self.att_cmd.pose.orientation.x = quat_des[0]
-        self.att_cmd.pose.orientation.y = quat_des[1]
-        self.att_cmd.pose.orientation.z = quat_des[2]
-        self.att_cmd.pose.orientation.w = quat_des[3]
-        # self.thrust_cmd.thrust = thrust
-        # print(thrust)
-        # print(quat_des)
-
-        # self.data_out.orientation = self.att_cmd.pose.orientation
-
-
-    def geo_con_new(self):
-        pose = transformations.quaternion_matrix(  
-                numpy.array([self.cur_pose.pose.orientation.x, 
-                             self.cur_pose.pose.orientation.y, 
-                             self.cur_pose.pose.orientation.z, 
-                             self.cur_pose.pose.orientation.w]))  #4*4 matrix
-        pose_temp1 = np.delete(pose, -1, axis=1)
-        rot_curr = np.delete(pose_temp1, -1, axis=0)   #3*3 current rotation matrix
-        zb_curr = rot_curr[:,2]
-
-        #---------------------------------------------#
-        des_th = self.th_des()    
-        rot_des = self.acc2quat(des_th, 0.0)   #desired yaw = 0
-
-        thrust = self.norm_thrust_const * des_th.dot(zb_curr)
-        thrust = np.maximum(0.0, np.minimum(thrust, self.max_throttle))
-        self.thrust_cmd.thrust = thrust
-
-
-        angle_error_matrix = 0.5 * (np.multiply(np.transpose(rot_des), rot_curr) -
-                                    np.multiply(np.transpose(rot_curr), rot_des) ) #skew matrix
- 
-        roll_x_err = -angle_error_matrix[1,2]
-        pitch_y_err = angle_error_matrix[0,2]
-        yaw_z_err = -angle_error_matrix[0,1]
-
-        self.euler_err = np.array([roll_x_err, pitch_y_err, yaw_z_err])
-
-        self.des_q_dot = np.array([0 ,0, 0])
-        des_euler_rate =  np.dot(np.multiply(np.transpose(rot_des), rot_curr), 
-                                     self.des_q_dot)
-
-        curr_euler_rate = np.array([self.cur_vel.twist.angular.x,
-                                    self.cur_vel.twist.angular.y,
-                                    self.cur_vel.twist.angular.z])
-
-        self.euler_rate_err = curr_euler_rate - des_euler_rate
-
-        # print(self.euler_err)
-        # print(self.euler_rate_err)
-
-        # print("-----------------")
-
-
-    def moment_des(self):
-        dt = rospy.get_time() - self.pre_time
-        self.pre_time = self.pre_time + dt
-        if dt > 0.04:
-            dt = 0.04
-
-        sv_q = self.euler_rate_err + np.multiply(self.Phi_q, self.euler_err)
+        # FLU body rates -> FRD, desired rates are zero
+        omega = state[OMEGA]
+        self.euler_rate_err[0] = omega[0]
+        self.euler_rate_err[1] = -omega[1]
+        self.euler_rate_err[2] = -omega[2]
+
+        self.th_cmd = thrust
+        return thrust
+
+    def moment_des(self, dt):
+        dt = min(dt, self.max_dt_q)
+        euler_err = self.euler_err
+        euler_rate_err = self.euler_rate_err
+
+        sv_q = np.multiply(self.Phi_q, euler_err, out=self.sv_q)
+        sv_q += euler_rate_err
+        zi_norm_q = min(math.sqrt(euler_err.dot(euler_err) + euler_rate_err.dot(euler_rate_err)), 5.0)
+        sv_norm_q = math.sqrt(sv_q.dot(sv_q))
 
         if self.armed:
-            self.Kp0_q += (sv_q - np.multiply(self.alpha_0_q, self.Kp0_q))*dt
-            self.Kp1_q += (sv_q - np.multiply(self.alpha_1_q, self.Kp1_q))*dt
-            # self.Kp0_q = np.maximum(self.Kp0_q, 0.0001*np.ones(3))
-            # self.Kp1_q = np.maximum(self.Kp1_q, 0.0001*np.ones(3))
+            self.Kp0_q_ = max(self.Kp0_q_ + (sv_norm_q - self.alpha_0_q_*self.Kp0_q_)*dt, 0.0001)
+            self.Kp1_q_ = max(self.Kp1_q_ + (sv_norm_q*zi_norm_q - self.alpha_1_q_*self.Kp1_q_)*dt, 0.0001)
+            self.Kp2_q_ = max(self.Kp2_q_ + (sv_norm_q*zi_norm_q**2 - self.alpha_2_q_*self.Kp2_q_)*dt, 0.0001)
+            # test-28 also drives the mass estimate from the yaw sliding variable
+            self.M = max(self.M + (-sv_q[2] - self.alpha_m*self.M)*dt, 0.1)
+
+        Rho_q = self.Kp0_q_ + self.Kp1_q_*zi_norm_q + self.Kp2_q_*zi_norm_q
+        delTau_q = self.switching(sv_q, sv_norm_q, Rho_q, self.epsilon_q, self.v_q, self.delTau_q)
+
+        # des_mom = -Lam_q*sv_q - delta*Rho_q*delTau_q
+        des_mom = np.multiply(self.Lam_q, sv_q, out=self.torq_cmd)
+        delTau_q *= self.delta*Rho_q
+        des_mom += delTau_q
+        np.negative(des_mom, out=des_mom)
+
+        # putting limit on maximum vector
+        mom_norm = math.sqrt(des_mom.dot(des_mom))
+        if mom_norm > self.max_mom:
+            des_mom *= self.max_mom/mom_norm
+
+        des_mom *= self.norm_moment_const
+        return np.clip(des_mom, -self.max_mom_throttle, self.max_mom_throttle, out=des_mom)
+
+    def step(self, state, setpoint, dt):
+        th_cmd = self.geo_con_new(state, setpoint, dt)
+        torq_cmd = self.moment_des(dt)
+        return th_cmd, torq_cmd
+
+
+class ASMC_BatchController(ASMC_Controller):
+    """ ASMC_Controller over N vehicles at once (fleet simulation, gain sweeps).
+
+    step(states, setpoints, dt) takes (N, 13) states and (N, 7) or (7,) setpoints and returns
+    th_cmd (N,) and torq_cmd (N, 3), matching N independent ASMC_Controller objects. Gains may be
+    given per vehicle as (N, 3) arrays; the adaptive gains are kept per vehicle as (N,) arrays.
+
+    Internally everything is component-major, (3, N) vectors and (3, 3, N) rotation stacks, so every
+    NumPy call runs over N contiguous values instead of N rows of three, and every call writes into
+    a working array allocated here. th_cmd and torq_cmd (a (N, 3) view) are working arrays too:
+    copy them if they have to outlive the next step. Per-axis gains are laid out once here, so pass
+    them to the constructor rather than assigning them afterwards.
+    """
+    def __init__(self, n_vehicles, *args, **kwargs):
+        self.N = n_vehicles
+        super().__init__(*args, **kwargs)
+        N = n_vehicles
+        self.gains = tuple(np.full(N, gain, dtype=float) for gain in self.gains)
+        # Per-axis gains as (3, 1) columns, or (3, N) when given per vehicle
+        for name in ('Lam', 'Phi', 'Lam_q', 'Phi_q', 'v', 'v_q', 'gravity'):
+            value = np.asarray(getattr(self, name), dtype=float)
+            setattr(self, name + '_T', value.T.reshape(3, -1) if value.ndim else np.full((3, 1), value))
+
+        # Working arrays
+        self.x = np.zeros((13, N))
+        self.sp = np.zeros((7, N))
+        self.qq = np.zeros((4, 4, N))
+        self.errPos = np.zeros((3, N))
+        self.errVel = np.zeros((3, N))
+        self.sv = np.zeros((3, N))
+        self.tmp = np.zeros((3, N))
+        self.delTau = np.zeros((3, N))
+        self.des_th = np.zeros((3, N))
+        self.rot_curr = np.zeros((3, 3, N))
+        self.rot_des = np.zeros((3, 3, N))
+        self.rot_err = np.zeros((3, 3, N))
+        self.euler_err = np.zeros((3, N))
+        self.euler_rate_err = np.zeros((3, N))
+        self.sv_q = np.zeros((3, N))
+        self.delTau_q = np.zeros((3, N))
+        self.torq_cmd = np.zeros((3, N))
+        # Per-vehicle scalars: norms, gains being adapted, scratch
+        self.zi_norm = np.zeros(N)
+        self.sv_norm = np.zeros(N)
+        self.th_norm = np.zeros(N)
+        self.Rho = np.zeros(N)
+        self.r0 = np.zeros(N)
+        self.r1 = np.zeros(N)
+        self.cy = np.zeros(N)
+        self.sy = np.zeros(N)
+        self.zero = np.zeros(N, dtype=bool)
+        self.reset()
+
+    def reset(self):
+        self.Kp0_, self.Kp1_, self.M, self.Kp0_q_, self.Kp1_q_, self.Kp2_q_ = (gain.copy() for gain in self.gains)
+        self.torq_cmd[:] = 0.0
+        self.th_cmd = np.zeros(self.N)
+
+    @staticmethod
+    def norm(a, out):
+        # Same summation order as the scalar a.dot(a)
+        np.einsum('in,in->n', a, a, out=out)
+        return np.sqrt(out, out=out)
+
+    def zi(self, a, b, out):
+        # min(|[a, b]|, 5) without concatenating, summed like the scalar a.dot(a) + b.dot(b)
+        np.einsum('in,in->n', a, a, out=out)
+        out += np.einsum('in,in->n', b, b, out=self.r0)
+        np.sqrt(out, out=out)
+        return np.minimum(out, 5.0, out=out)
+
+    def adapt(self, gain, drive, alpha, dt):
+        # gain = max(gain + (drive - alpha*gain)*dt, 0.0001), in place
+        r = np.multiply(gain, alpha, out=self.r1)
+        np.subtract(drive, r, out=r)
+        r *= dt
+        gain += r
+        return np.maximum(gain, 0.0001, out=gain)
+
+    def adapt_M(self, s, dt):
+        # M = max(M + (-s - alpha_m*M)*dt, 0.1), in place
+        r = np.multiply(self.M, self.alpha_m, out=self.r1)
+        r += s
+        np.negative(r, out=r)
+        r *= dt
+        self.M += r
+        np.maximum(self.M, 0.1, out=self.M)
+
+    def switching(self, s, s_norm, Rho, epsilon, v, out):
+        if self.boundary == 'norm':
+            r = np.maximum(s_norm, epsilon, out=self.r0)
+            np.multiply(s, np.divide(Rho, r, out=r), out=out)
+        else:
+            np.divide(s, v, out=out)
+            np.clip(out, -1.0, 1.0, out=out)
+            out *= Rho
+        return out
+
+    def limit(self, a, a_norm, limit):
+        # Scale the columns longer than limit back to it: by limit/max(|a|, limit), exactly 1 otherwise
+        r = np.maximum(a_norm, limit, out=self.r1)
+        a *= np.divide(limit, r, out=r)
+        np.minimum(a_norm, limit, out=a_norm)
+
+    def th_des(self, x, sp, dt):
+        dt = min(dt, self.max_dt)
+        errPos = np.subtract(x[POS], sp[SP_POS], out=self.errPos)
+        errVel = np.subtract(x[VEL], sp[SP_VEL], out=self.errVel)
+
+        sv = np.multiply(self.Phi_T, errPos, out=self.sv)
+        sv += errVel
+        zi_norm = self.zi(errPos, errVel, self.zi_norm)
+        sv_norm = self.norm(sv, self.sv_norm)
 
-        Rho_q = self.Kp0_q + self.Kp1_q*self.euler_err
+        if self.armed:
+            self.adapt(self.Kp0_, sv_norm, self.alpha_0_, dt)
+            self.adapt(self.Kp1_, np.multiply(sv_norm, zi_norm, out=self.r0), self.alpha_1_, dt)
+            self.adapt_M(sv[2], dt)
 
-        delTau_q = np.zeros(3)
-        delTau_q[0] = Rho_q[0]*self.sigmoid(sv_q[0],self.v)
-        delTau_q[1] = Rho_q[1]*self.sigmoid(sv_q[1],self.v)
-        delTau_q[2] = Rho_q[2]*self.sigmoid(sv_q[2],self.v)
+        Rho = np.multiply(self.Kp1_, zi_norm, out=self.Rho)
+        Rho += self.Kp0_
+        delTau = self.switching(sv, sv_norm, Rho, self.epsilon, self.v_T, self.delTau)
 
-        des_mom = -np.multiply(self.Lam_q, sv_q) - delTau_q
+        # des_th = -Lam*sv - delta*Rho*delTau + M*gravity
+        des_th = np.multiply(self.gravity_T, self.M, out=self.des_th)
+        des_th -= np.multiply(self.Lam_T, sv, out=self.tmp)
+        delTau *= np.multiply(Rho, self.delta, out=self.r0)
+        des_th -= delTau
 
-    def pub_att(self):
-        self.geo_con()
-        self.thrust_pub.publish(self.thrust_cmd)
-        self.att_pub.publish(self.att_cmd)
-        # self.data_pub.publish(self.data_out)
+        # putting limit on maximum thrust vector
+        th_norm = self.norm(des_th, self.th_norm)
+        self.limit(des_th, th_norm, self.max_th)
+        return des_th, th_norm
+
+    def acc2quat(self, des_th, th_norm, des_yaw, out=None):
+        ''' (3, 3, N) desired rotations with columns xb, yb, zb. '''
+        out = self.rot_des if out is None else out
+        cy = np.cos(des_yaw, out=self.cy)
+        sy = np.sin(des_yaw, out=self.sy)
+        r = self.r0
+        zb = out[:, 2]
+        zero = np.equal(th_norm, 0.0, out=self.zero)
+        if zero.any():
+            np.divide(des_th, np.where(zero, 1.0, th_norm), out=zb)
+            zb[:, zero] = np.array([[0.0], [0.0], [1.0]])
+        else:
+            np.divide(des_th, th_norm, out=zb)
+        zx, zy, zz = zb
+        # yb = zb x (cos, sin, 0), normalized
+        yb = out[:, 1]
+        yx, yy, yz = yb
+        np.multiply(zz, sy, out=yx)
+        np.negative(yx, out=yx)
+        np.multiply(zz, cy, out=yy)
+        np.multiply(zx, sy, out=yz)
+        yz -= np.multiply(zy, cy, out=r)
+        yb /= self.norm(yb, r)
+        # xb = yb x zb
+        xx, xy, xz = out[:, 0]
+        np.multiply(yy, zz, out=xx)
+        xx -= np.multiply(yz, zy, out=r)
+        np.multiply(yz, zx, out=xy)
+        xy -= np.multiply(yx, zz, out=r)
+        np.multiply(yx, zy, out=xz)
+        xz -= np.multiply(yy, zx, out=r)
+        return out
+
+    def quat_to_rot(self, q):
+        # All sixteen products in one call, then the nine entries in one matrix product
+        qq = np.multiply(q[:, None], q[None, :], out=self.qq)
+        R = self.rot_curr
+        R9 = R.reshape(9, -1)
+        np.matmul(QUAT_TO_ROT, qq.reshape(16, -1), out=R9)
+        R[0, 0] += 1.0
+        R[1, 1] += 1.0
+        R[2, 2] += 1.0
+        return R
+
+    def geo_con_new(self, x, sp, dt):
+        rot_curr = self.quat_to_rot(x[QUAT])
+
+        des_th, th_norm = self.th_des(x, sp, dt)
+        rot_des = self.acc2quat(des_th, th_norm, sp[SP_YAW])
+
+        thrust = np.multiply(th_norm, self.norm_thrust_const, out=self.th_cmd)
+        np.clip(thrust, 0.0, self.max_throttle, out=thrust)
+
+        # rot_des^T rot_curr for the whole stack, then its skew part
+        E = np.einsum('kin,kjn->ijn', rot_des, rot_curr, out=self.rot_err)
+        np.matmul(SKEW, E.reshape(9, -1), out=self.euler_err)
+
+        # FLU body rates -> FRD, desired rates are zero
+        omega = x[OMEGA]
+        self.euler_rate_err[0] = omega[0]
+        np.negative(omega[1:], out=self.euler_rate_err[1:])
+        return thrust
+
+    def moment_des(self, dt):
+        dt = min(dt, self.max_dt_q)
+        euler_err = self.euler_err
+        euler_rate_err = self.euler_rate_err
+
+        sv_q = np.multiply(self.Phi_q_T, euler_err, out=self.sv_q)
+        sv_q += euler_rate_err
+        zi_norm_q = self.zi(euler_err, euler_rate_err, self.zi_norm)
+        sv_norm_q = self.norm(sv_q, self.sv_norm)
 
-        self.geo_con_new()
\ No newline at end of file
+        if self.armed:
+            self.adapt(self.Kp0_q_, sv_norm_q, self.alpha_0_q_, dt)
+            self.adapt(self.Kp1_q_, np.multiply(sv_norm_q, zi_norm_q, out=self.r0), self.alpha_1_q_, dt)
+            drive = np.multiply(zi_norm_q, zi_norm_q, out=self.r0)
+            drive *= sv_norm_q
+            self.adapt(self.Kp2_q_, drive, self.alpha_2_q_, dt)
+            self.adapt_M(sv_q[2], dt)
+
+        # Rho_q = Kp0_q + Kp1_q*zi + Kp2_q*zi
+        Rho_q = np.multiply(self.Kp1_q_, zi_norm_q, out=self.Rho)
+        Rho_q += self.Kp0_q_
+        Rho_q += np.multiply(self.Kp2_q_, zi_norm_q, out=self.r0)
+        delTau_q = self.switching(sv_q, sv_norm_q, Rho_q, self.epsilon_q, self.v_q_T, self.delTau_q)
+
+        # des_mom = -Lam_q*sv_q - delta*Rho_q*delTau_q
+        des_mom = np.multiply(self.Lam_q_T, sv_q, out=self.torq_cmd)
+        delTau_q *= np.multiply(Rho_q, self.delta, out=self.r0)
+        des_mom += delTau_q
+        np.negative(des_mom, out=des_mom)
+
+        # putting limit on maximum vector
+        self.limit(des_mom, self.norm(des_mom, self.th_norm), self.max_mom)
+
+        des_mom *= self.norm_moment_const
+        return np.clip(des_mom, -self.max_mom_throttle, self.max_mom_throttle, out=des_mom)
+
+    def step(self, states, setpoints, dt):
+        # One transposing copy in, everything after runs on contiguous component rows
+        x = self.x
+        x[:] = states.T
+        sp = self.sp
+        sp[:] = np.asarray(setpoints).T.reshape(7, -1)
+        th_cmd = self.geo_con_new(x, sp, dt)
+        torq_cmd = self.moment_des(dt)
+        return th_cmd, torq_cmd.T
@@ -0,0 +1,181 @@
+import numpy as np
+
+from src.dynamics.kinematics import quat_to_rot, quats_to_rots, desired_frame, attitude_error
+from src.dynamics.state import POS, VEL, QUAT, OMEGA, SP_POS, SP_VEL, SP_YAW
+
+import logging
+
+class PID_Controller:
+    """ ROS-free PID position + attitude controller (the loop of tests/test-26-pid-hold.py).
+
+    step(state, setpoint, dt) takes the arrays of src/dynamics/state.py and returns
+    (th_cmd, torq_cmd): normalized thrust and FRD body moments for the mixer.
+    """
+    def __init__(self, *args, **kwargs):
+        self.kPos = np.array([1.0, 1.0, 16.0])
+        self.kVel = np.array([1.0, 1.0, 1.0])
+        self.kInt = np.array([0.01, 0.01, 0.01])
+
+        self.kPos_q = np.array([4.0, 4.0, 1.0])
+        self.kVel_q = np.array([1.0, 1.0, 1.0])
+        self.kInt_q = np.array([0.01, 0.01, 0.01])
+
+        self.norm_thrust_const = 0.06
+        self.max_th = 18.0
+        self.max_throttle = 0.95
+
+        self.norm_moment_const = 0.05
+        self.max_mom = 10
+        self.max_mom_throttle = 0.5
+
+        self.max_dt = 0.04
+        self.gravity = np.array([0, 0, 9.8])
+        for name, value in kwargs.items():
+            setattr(self, name, np.asarray(value, dtype=float) if np.ndim(value) else value)
+        self.reset()
+        logging.info('PID Controller initiated')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.reset()
+
+    def reset(self):
+        self.errInt = np.zeros(3)
+        self.errInt_q = np.zeros(3)
+        self.euler_err = np.zeros(3)
+        self.euler_rate_err = np.zeros(3)
+        self.rot_curr = np.eye(3)
+        self.rot_des = np.eye(3)
+
+    def th_des(self, state, setpoint, dt):
+        errPos = state[POS] - setpoint[SP_POS]
+        errVel = state[VEL] - setpoint[SP_VEL]
+        self.errInt += errPos*dt
+
+        des_th = np.multiply(self.kPos, errPos) + np.multiply(self.kVel,errVel) + np.multiply(self.kInt, self.errInt)
+
+        if np.linalg.norm(des_th) > self.max_th:
+            des_th = (self.max_th/np.linalg.norm(des_th))*des_th
+
+        return (-des_th + self.gravity)
+
+    def acc2quat(self, des_th, des_yaw):
+        desired_frame(des_th, des_yaw, self.rot_des)
+        return self.rot_des
+
+    def geo_con_new(self, state, setpoint, dt):
+        rot_curr = quat_to_rot(state[QUAT], self.rot_curr)
+
+        des_th = self.th_des(state, setpoint, dt)
+        # des_th . zb_des is |des_th|
+        th_norm = desired_frame(des_th, setpoint[SP_YAW], self.rot_des)
+
+        thrust = self.norm_thrust_const * th_norm
+        thrust = max(0.0, min(thrust, self.max_throttle))
+
+        attitude_error(self.rot_des, rot_curr, self.euler_err)
+
+        # FLU body rates -> FRD, desired rates are zero
+        omega = state[OMEGA]
+        self.euler_rate_err[0] = omega[0]
+        self.euler_rate_err[1] = -omega[1]
+        self.euler_rate_err[2] = -omega[2]
+
+        return thrust
+
+    def moment_des(self, dt):
+        self.errInt_q += self.euler_err*dt
+
+        des_mom = -(self.kPos_q*self.euler_err) - (self.kVel_q*self.euler_rate_err) - (self.kInt_q*self.errInt_q)
+
+        if np.linalg.norm(des_mom) > self.max_mom:
+            des_mom = (self.max_mom/np.linalg.norm(des_mom))*des_mom
+
+        des_mom = self.norm_moment_const * des_mom
+
+        return np.maximum(-self.max_mom_throttle, np.minimum(des_mom, self.max_mom_throttle))
+
+    def step(self, state, setpoint, dt):
+        dt = min(dt, self.max_dt)
+        th_cmd = self.geo_con_new(state, setpoint, dt)
+        torq_cmd = self.moment_des(dt)
+        return th_cmd, torq_cmd
+
+
+class PID_BatchController(PID_Controller):
+    """ PID_Controller over N vehicles at once (for src/dynamics/batch_simulator.py).
+
+    step(states, setpoints, dt) takes (N, 13) states and (N, 7) or (7,) setpoints and returns
+    th_cmd (N,) and torq_cmd (N, 3), matching PID_Controller vehicle by vehicle.
+    """
+    def __init__(self, n_vehicles, *args, **kwargs):
+        self.N = n_vehicles
+        super().__init__(*args, **kwargs)
+
+    def reset(self):
+        self.errInt = np.zeros((self.N, 3))
+        self.errInt_q = np.zeros((self.N, 3))
+        self.euler_err = np.zeros((self.N, 3))
+        self.euler_rate_err = np.zeros((self.N, 3))
+        self.rot_curr = np.zeros((self.N, 3, 3))
+
+    def th_des(self, states, setpoints, dt):
+        errPos = states[:, POS] - setpoints[..., SP_POS]
+        errVel = states[:, VEL] - setpoints[..., SP_VEL]
+        self.errInt += errPos*dt
+
+        des_th = self.kPos*errPos + self.kVel*errVel + self.kInt*self.errInt
+
+        norm = np.linalg.norm(des_th, axis=1)
+        over = norm > self.max_th
+        des_th[over] *= (self.max_th/norm[over])[:, None]
+
+        return (-des_th + self.gravity)
+
+    def acc2quat(self, des_th, des_yaw):
+        des_yaw = np.broadcast_to(des_yaw, (len(des_th),))
+        proj_xb_des = np.stack([np.cos(des_yaw), np.sin(des_yaw), np.zeros(len(des_th))], axis=1)
+        norm = np.linalg.norm(des_th, axis=1)[:, None]
+        zb_des = np.where(norm == 0.0, np.array([0.0, 0.0, 1.0]), des_th / np.where(norm == 0.0, 1.0, norm))
+        yb_des = np.cross(zb_des, proj_xb_des)
+        yb_des /= np.linalg.norm(yb_des, axis=1)[:, None]
+        xb_des = np.cross(yb_des, zb_des)
+        xb_des /= np.linalg.norm(xb_des, axis=1)[:, None]
+
+        return np.stack([xb_des, yb_des, zb_des], axis=2)
+
+    def geo_con_new(self, states, setpoints, dt):
+        rot_curr = quats_to_rots(states[:, QUAT], self.rot_curr)
+
+        des_th = self.th_des(states, setpoints, dt)
+        rot_des = self.acc2quat(des_th, setpoints[..., SP_YAW])
+
+        zb = rot_des[:, :, 2]
+        thrust = self.norm_thrust_const * np.einsum('ij,ij->i', des_th, zb)
+        thrust = np.maximum(0.0, np.minimum(thrust, self.max_throttle))
+
+        # Only the three off-diagonal terms of the skew matrix are needed
+        M = np.einsum('nki,nkj->nij', rot_des, rot_curr)
+        self.euler_err = np.stack([-0.5*(M[:, 1, 2] - M[:, 2, 1]),
+                                   -0.5*(M[:, 0, 2] - M[:, 2, 0]),
+                                   0.5*(M[:, 0, 1] - M[:, 1, 0])], axis=1)
+
+        omega = states[:, OMEGA]
+        self.euler_rate_err = omega * np.array([1.0, -1.0, -1.0])
+
+        return thrust
+
+    def moment_des(self, dt):
+        self.errInt_q += self.euler_err*dt
+
+        des_mom = -(self.kPos_q*self.euler_err) - (self.kVel_q*self.euler_rate_err) - (self.kInt_q*self.errInt_q)
+
+        norm = np.linalg.norm(des_mom, axis=1)
+        over = norm > self.max_mom
+        des_mom[over] *= (self.max_mom/norm[over])[:, None]
+
+        des_mom = self.norm_moment_const * des_mom
+
+        return np.maximum(-self.max_mom_throttle, np.minimum(des_mom, self.max_mom_throttle))
@@ -0,0 +1,114 @@
+import numpy as np
+
+from src.utility.map_range import TORQUE_PWM_LIMITS
+
+def pwm_to_torque_limits(pwm_min, pwm_max, limits=TORQUE_PWM_LIMITS):
+  """ Invert the torque_to_PWM map: per-motor PWM bounds -> bounds on the motor input u. """
+  fromMin, fromMax, toMin, toMax = limits
+  scale = (fromMax - fromMin) / (toMax - toMin)
+  u_min = fromMin + (np.asarray(pwm_min, dtype=float) - toMin) * scale
+  u_max = fromMin + (np.asarray(pwm_max, dtype=float) - toMin) * scale
+  return u_min, u_max
+
+class DFAllocator:
+  """ Bounded control allocation by weighted least squares with a warm-started active set.
+
+  Solves   min ||Wu (u - ud)||^2 + gamma ||Wv (CA u - v)||^2   s.t.  u_min <= u <= u_max
+  where v = [roll, pitch, yaw, thrust] and CA (4 x n) maps motor inputs to v. With a large
+  gamma the torque error is minimised first, weighted by Wv, so roll/pitch (and thrust) are kept
+  and yaw gives way when motors saturate. Unsaturated commands give the pseudo-inverse answer.
+
+  The active set of the previous call is reused, so a slowly varying command usually converges
+  in one or two iterations; max_iter caps the work for a fixed time budget. Every iterate is
+  feasible, so a capped solve still returns motor inputs within bounds (converged is False).
+  """
+  def __init__(self, CA, u_min, u_max, Wv=(10, 10, 1, 10), Wu=None, gamma=1e6, max_iter=20):
+    n = np.shape(CA)[1]
+    self.n = n
+    self.u_min = np.broadcast_to(np.asarray(u_min, dtype=float), (n,)).copy()
+    self.u_max = np.broadcast_to(np.asarray(u_max, dtype=float), (n,)).copy()
+    self.Wv = np.asarray(Wv, dtype=float)
+    self.Wu = np.ones(n) if Wu is None else np.asarray(Wu, dtype=float)
+    self.gamma_sqrt = np.sqrt(gamma)
+    self.max_iter = max_iter
+
+    self.u = np.clip(np.zeros(n), self.u_min, self.u_max)
+    # Working set: -1 at lower bound, +1 at upper bound, 0 free
+    self.W = np.zeros(n, dtype=int)
+    self.W[self.u == self.u_min] = -1
+    self.W[self.u == self.u_max] = 1
+    self.b = np.empty(4 + n)
+    self.iterations = 0
+    self.converged = True
+    self.set_matrix(CA)
+
+  @classmethod
+  def from_frame(cls, frame, pwm_min=1000, pwm_max=2000, limits=TORQUE_PWM_LIMITS, **kwargs):
+    u_min, u_max = pwm_to_torque_limits(pwm_min, pwm_max, limits)
+    return cls(frame.CA, u_min, u_max, **kwargs)
+
+  def set_matrix(self, CA):
+    """ Use a new allocation matrix (e.g. after a fault); the active set is kept as warm start. """
+    self.CA = np.asarray(CA, dtype=float)
+    self.A = np.vstack((self.gamma_sqrt * self.Wv[:, None] * self.CA, np.diag(self.Wu)))
+
+  def allocate(self, v, ud=None):
+    """ Motor inputs u for the generalized command v, within [u_min, u_max]. """
+    A = self.A
+    b = self.b
+    b[:4] = self.gamma_sqrt * self.Wv * v
+    b[4:] = 0.0 if ud is None else self.Wu * ud
+
+    # Warm start: previous solution, pinned to the bounds of the previous active set
+    W = self.W
+    u = np.clip(self.u, self.u_min, self.u_max)
+    u[W == -1] = self.u_min[W == -1]
+    u[W == 1] = self.u_max[W == 1]
+    d = b - A @ u
+    free = W == 0
+
+    self.converged = False
+    for self.iterations in range(1, self.max_iter+1):
+      A_free = A[:, free]
+      p_free = np.linalg.lstsq(A_free, d, rcond=None)[0]
+      p = np.zeros(self.n)
+      p[free] = p_free
+      u_opt = u + p
+      infeasible = free & ((u_opt < self.u_min) | (u_opt > self.u_max))
+
+      if not infeasible.any():
+        u = u_opt
+        d -= A_free @ p_free
+        # Lagrange multipliers of the active bounds
+        lam = W * (A.T @ d)
+        if (lam >= -1e-9).all():
+          self.converged = True
+          break
+        # Release the bound that is pulling the wrong way
+        i = np.argmin(lam)
+        W[i] = 0
+        free[i] = True
+      else:
+        # Step until the first free motor hits a bound, then fix it there
+        dist = np.ones(self.n)
+        lower = free & (p < 0)
+        upper = free & (p > 0)
+        dist[lower] = (self.u_min[lower] - u[lower]) / p[lower]
+        dist[upper] = (self.u_max[upper] - u[upper]) / p[upper]
+        i = np.argmin(dist)
+        alpha = max(dist[i], 0.0)
+        u = u + alpha * p
+        d -= A_free @ (alpha * p_free)
+        W[i] = 1 if p[i] > 0 else -1
+        # Pin exactly on the bound (and keep the residual consistent)
+        bound = self.u_max[i] if W[i] == 1 else self.u_min[i]
+        d -= A[:, i] * (bound - u[i])
+        u[i] = bound
+        free[i] = False
+
+    self.u = u
+    return u
+
+  def achieved(self, u=None):
+    """ Generalized command actually produced by u (defaults to the last allocation). """
+    return self.CA @ (self.u if u is None else u)
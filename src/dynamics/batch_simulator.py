@@ -0,0 +1,147 @@
+"""
+Batched headless simulator: N vehicles of the same frame stepped in lockstep.
+
+Same dynamics as src/dynamics/simulator.py, but the state is kept as structure-of-arrays
+(pos/vel/omega (N, 3), quat (N, 4)) and every RK4 stage is a handful of NumPy calls over the
+whole batch, so Monte Carlo sweeps of faults and wind cost little more per step than one vehicle.
+
+Per-vehicle parameters: wind (N, 3), effectiveness (N, n) and a scheduled fault per vehicle
+(set_faults: time, motor, loss-of-effectiveness level) applied at integration-step resolution.
+"""
+import numpy as np
+
+from src.dynamics.simulator import motor_coefficients
+from src.dynamics.state import POS, VEL, QUAT, OMEGA, STATE_SIZE
+
+class DFBatchSimulator:
+  def __init__(self, frame, mass, inertia, n_vehicles, dt=0.0025, arm_length=0.18, kf=8.8e-6,
+               km=1.4e-7, omega_max=1000.0, motor_tau=0.0, drag=0.1, gravity=9.8, pwm_min=1000,
+               pwm_max=2000, states=None):
+    self.frame = frame
+    self.mass = mass.mass
+    self.J = np.array([inertia.Jxx, inertia.Jyy, inertia.Jzz], dtype=float)
+    self.dt = dt
+    self.motor_tau = motor_tau
+    self.drag = drag
+    self.gravity = gravity
+    self.pwm_min = pwm_min
+    self.pwm_max = pwm_max
+
+    self.N = n_vehicles
+    self.n = len(frame.motors)
+    self.kf, self.km, self.torque_arm = motor_coefficients(frame.motors, arm_length, kf, km)
+    self.omega_max = omega_max
+    self.reset(states)
+
+  def reset(self, states=None, t=0.0):
+    """ states: (N, 13) or (13,) in the src/dynamics/state.py layout; default at rest on the ground. """
+    N = self.N
+    x = np.zeros((N, STATE_SIZE))
+    x[:, 9] = 1.0
+    if states is not None:
+      x[:] = states
+    self.pos = x[:, POS].copy()
+    self.vel = x[:, VEL].copy()
+    self.quat = x[:, QUAT].copy()
+    self.omega = x[:, OMEGA].copy()
+
+    self.effectiveness = np.ones((N, self.n))
+    self.throttle = np.zeros((N, self.n))
+    self.wind = np.zeros((N, 3))
+    self.fault_time = np.full(N, np.inf)
+    self.fault_motor = np.zeros(N, dtype=int)
+    self.fault_eta = np.ones(N)
+    self.faulted = np.zeros(N, dtype=bool)
+    self.t = t
+    self.on_ground = self.pos[:, 2] <= 0.0
+
+  def set_faults(self, time, motor_num, eta):
+    """ Schedule one loss-of-effectiveness fault per vehicle (scalars broadcast over the batch). """
+    self.fault_time[:] = time
+    self.fault_motor[:] = np.asarray(motor_num) - 1
+    self.fault_eta[:] = eta
+    self.faulted[:] = False
+
+  def apply_faults(self):
+    new = ~self.faulted & (self.t >= self.fault_time)
+    if new.any():
+      idx = np.flatnonzero(new)
+      self.effectiveness[idx, self.fault_motor[idx]] = self.fault_eta[idx]
+      self.faulted |= new
+
+  def states(self, out=None):
+    """ (N, 13) state matrix in the src/dynamics/state.py layout. """
+    if out is None:
+      out = np.empty((self.N, STATE_SIZE))
+    out[:, POS] = self.pos
+    out[:, VEL] = self.vel
+    out[:, QUAT] = self.quat
+    out[:, OMEGA] = self.omega
+    return out
+
+  def derivative(self, vel, quat, omega, acc, tau):
+    """ Derivatives of (pos, vel, quat, omega) for thrust acceleration acc (N,) and FLU torque tau (N, 3). """
+    qx, qy, qz, qw = quat.T
+    wx, wy, wz = omega.T
+
+    # Translational: thrust along body z (third column of R), gravity, linear drag on air velocity
+    dvel = -self.drag * (vel - self.wind)
+    dvel[:, 0] += 2*(qx*qz + qy*qw) * acc
+    dvel[:, 1] += 2*(qy*qz - qx*qw) * acc
+    dvel[:, 2] += (1 - 2*(qx*qx + qy*qy)) * acc - self.gravity
+
+    # Attitude kinematics q_dot = 0.5 q * (omega, 0)
+    dquat = np.empty_like(quat)
+    dquat[:, 0] = 0.5 * (qw*wx + qy*wz - qz*wy)
+    dquat[:, 1] = 0.5 * (qw*wy + qz*wx - qx*wz)
+    dquat[:, 2] = 0.5 * (qw*wz + qx*wy - qy*wx)
+    dquat[:, 3] = -0.5 * (qx*wx + qy*wy + qz*wz)
+
+    # Rotational: Euler's equation
+    Jx, Jy, Jz = self.J
+    domega = np.empty_like(omega)
+    domega[:, 0] = (tau[:, 0] - (Jz - Jy) * wy * wz) / Jx
+    domega[:, 1] = (tau[:, 1] - (Jx - Jz) * wz * wx) / Jy
+    domega[:, 2] = (tau[:, 2] - (Jy - Jx) * wx * wy) / Jz
+    return vel, dvel, dquat, domega
+
+  def step(self, pwm, duration=None):
+    """ Hold the (N, n) PWM matrix for duration seconds (one integration step by default). """
+    pwm = np.clip(np.asarray(pwm, dtype=float), self.pwm_min, self.pwm_max)
+    throttle_cmd = (pwm - self.pwm_min) / (self.pwm_max - self.pwm_min)
+    n_steps = 1 if duration is None else max(1, int(round(duration / self.dt)))
+    dt = self.dt
+    for _ in range(n_steps):
+      self.apply_faults()
+      if self.motor_tau > 0:
+        self.throttle += (throttle_cmd - self.throttle) * (1.0 - np.exp(-dt / self.motor_tau))
+      else:
+        self.throttle[:] = throttle_cmd
+      w = self.omega_max * self.throttle
+      thrusts = self.effectiveness * self.kf * w * w
+      acc = thrusts.sum(axis=1) / self.mass
+      # FRD motor torques to FLU
+      tau = thrusts @ self.torque_arm.T
+      tau[:, 1:] *= -1
+
+      x = (self.pos, self.vel, self.quat, self.omega)
+      k1 = self.derivative(x[1], x[2], x[3], acc, tau)
+      x2 = [a + 0.5*dt*b for a, b in zip(x, k1)]
+      k2 = self.derivative(x2[1], x2[2], x2[3], acc, tau)
+      x3 = [a + 0.5*dt*b for a, b in zip(x, k2)]
+      k3 = self.derivative(x3[1], x3[2], x3[3], acc, tau)
+      x4 = [a + dt*b for a, b in zip(x, k3)]
+      k4 = self.derivative(x4[1], x4[2], x4[3], acc, tau)
+      pos, vel, quat, omega = [a + (dt/6.0) * (b1 + 2*b2 + 2*b3 + b4) for a, b1, b2, b3, b4 in zip(x, k1, k2, k3, k4)]
+      quat /= np.linalg.norm(quat, axis=1)[:, None]
+
+      # Flat ground at z = 0: vehicles rest until thrust lifts them
+      ground = pos[:, 2] <= 0.0
+      if ground.any():
+        pos[ground, 2] = 0.0
+        vel[ground] = 0.0
+        omega[ground] = 0.0
+      self.on_ground = ground
+
+      self.pos, self.vel, self.quat, self.omega = pos, vel, quat, omega
+      self.t += dt
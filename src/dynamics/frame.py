@@ -1,10 +1,25 @@
 import enum
+import itertools
+import math
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 from src.dynamics.motors import DFMotor
 
+def failure_allocation(EA, failed):
+  """ (CA, CA_inv) with the failed motors (0-based) out. Module level so a process pool can run it.
+
+  CA is the nominal effectiveness pinv(EA) with the failed motors' columns zeroed, CA_inv its
+  pseudo-inverse, so the healthy motors take over what the failed ones produced.
+  """
+  CA = np.linalg.pinv(np.asarray(EA, dtype=float))
+  CA[:, list(failed)] = 0
+  CA_inv = np.round(np.linalg.pinv(CA), 5)
+  return CA, CA_inv
+
 class DFFrame:
-  def __init__(self, frame_type):
+  def __init__(self, frame_type, cache_size=32, max_failed=0, processes=None, resync_every=1000, sm_tolerance=1e-6):
     self.EA = []
     self.CA = []
     self.CA_restore = []
@@ -13,17 +28,167 @@ class DFFrame:
     # self.motors = [0] * len(frame_type.value)
     self.motors = []
 
+    # LRU cache of (CA, CA_inv) keyed by the effectiveness rows of every motor
+    self.cache = OrderedDict()
+    self.cache_size = cache_size
+    self.cache_hits = 0
+    self.cache_misses = 0
+
+    # 1-based numbers of the motors that are out on this frame. The DFMotor objects come from
+    # the Frames members, which every DFFrame of that type shares, so they are never modified
+    self.failed = frozenset()
+
     for motor in self.frame_type.value:
         m = [motor.roll, motor.pitch, motor.yaw, motor.thrust]
         self.motors.append(motor)
         self.EA.append(m)
-    self.CA = np.linalg.pinv(self.EA,)
-    self.CA_restore = np.linalg.pinv(self.EA,)
-    self.CA_inv = np.linalg.pinv(self.CA)
-    self.CA_inv = np.round(self.CA_inv, 5)
+    self.CA, self.CA_inv = self.allocation(self.EA)
+    self.CA_restore = self.CA
+
+    # Loss-of-effectiveness state: EA = diag(effectiveness) @ EA_nominal, with
+    # M_inv = (EA^T EA)^-1 kept up to date by rank-one updates (None while rank deficient)
+    self.EA_nominal = np.array(self.EA, dtype=float)
+    self.CA_nominal = np.linalg.pinv(self.EA_nominal)
+    self.M_nominal = self.EA_nominal.T @ self.EA_nominal
+    self.effectiveness = np.ones(len(self.motors))
+    self.M_inv = self.gram_inverse()
+    self.resync_every = resync_every
+    # Below this |1 + v^T M_inv u| the rank-one update loses too many digits: recompute M_inv instead
+    self.sm_tolerance = sm_tolerance
+    self.updates = 0
+
+    # Allocation for every combination of up to max_failed dead motors
+    self.failure_index = None
+    self.CA_table = None
+    self.CA_inv_table = None
+    if max_failed > 0:
+      self.precompute_failures(max_failed, processes)
+
+  def nominal_EA(self):
+    return [[motor.roll, motor.pitch, motor.yaw, motor.thrust] for motor in self.motors]
+
+  def allocation(self, EA, round_ca=False):
+    """ Return (CA, CA_inv) for an effectiveness matrix, computing the two pseudo-inverses only on a cache miss.
+
+    Entries are keyed by the matrix and the frame's failed motors.
+    """
+    EA = np.asarray(EA, dtype=float)
+    key = (EA.shape, EA.tobytes(), round_ca, self.failed)
+    if key in self.cache:
+      self.cache_hits += 1
+      self.cache.move_to_end(key)
+      return self.cache[key]
+
+    self.cache_misses += 1
+    CA = np.linalg.pinv(EA)
+    if round_ca:
+      CA = np.round(CA, 5)
+    CA_inv = np.linalg.pinv(CA)
+    CA_inv = np.round(CA_inv, 5)
+    # Cached arrays are shared between callers
+    CA.flags.writeable = False
+    CA_inv.flags.writeable = False
+
+    self.cache[key] = (CA, CA_inv)
+    if len(self.cache) > self.cache_size:
+      self.cache.popitem(last=False)
+    return CA, CA_inv
+
+  def precompute_failures(self, max_failed=2, processes=None):
+    """ Tabulate the allocation for every k-motor-out subset, k = 0..max_failed.
+
+    The matrices are stacked into CA_table (m, 4, n) and CA_inv_table (m, n, 4); failure_index
+    maps the bitmask of failed motors to the row, so switching is a constant-time lookup.
+    With processes set, the pseudo-inverses are computed in a process pool.
+    """
+    n = len(self.motors)
+    EA = self.nominal_EA()
+    subsets = [failed for k in range(max_failed+1) for failed in itertools.combinations(range(n), k)]
+
+    if processes:
+      with ProcessPoolExecutor(processes) as pool:
+        results = list(pool.map(failure_allocation, itertools.repeat(EA), subsets, chunksize=max(1, len(subsets)//processes)))
+    else:
+      results = [failure_allocation(EA, failed) for failed in subsets]
+
+    self.failure_index = np.full(1 << n, -1, dtype=np.int32)
+    for row, failed in enumerate(subsets):
+      self.failure_index[sum(1 << i for i in failed)] = row
+    self.CA_table = np.stack([CA for CA, _ in results])
+    self.CA_inv_table = np.stack([CA_inv for _, CA_inv in results])
+    self.CA_table.flags.writeable = False
+    self.CA_inv_table.flags.writeable = False
+
+  def set_failed_motors(self, motor_nums):
+    """ Switch to the precomputed allocation for the given (1-based) failed motors. """
+    mask = 0
+    for motor_num in motor_nums:
+      mask |= 1 << (motor_num-1)
+    row = -1 if self.failure_index is None else self.failure_index[mask]
+    if row < 0:
+      raise ValueError(f'no precomputed allocation for failed motors {sorted(motor_nums)}, see precompute_failures()')
+    self.failed = frozenset(motor_nums)
+    for i in range(len(self.motors)):
+      self.effectiveness[i] = 0.0 if mask >> i & 1 else 1.0
+    self.EA = self.effectiveness[:, None] * self.EA_nominal
+    self.M_inv = self.gram_inverse()
+    self.CA = self.CA_table[row]
+    self.CA_inv = self.CA_inv_table[row]
+
+  def gram_inverse(self):
+    """ (EA^T EA)^-1 of the current effectiveness, or None if EA lost full column rank. """
+    EA = self.effectiveness[:, None] * self.EA_nominal
+    M = EA.T @ EA
+    if np.linalg.cond(M) > 1e12:
+      return None
+    return np.linalg.inv(M)
+
+  def set_effectiveness(self, motor_num, eta):
+    """ Scale motor motor_num (1-based) to effectiveness eta (1 = healthy, 0 = dead) and update the allocation.
+
+    The degraded plant is CA = CA_nominal diag(eta). With EA = diag(eta) EA_nominal, EA^T EA changes
+    by (eta^2 - eta_old^2) r r^T for the motor row r, so its inverse M_inv is updated with
+    Sherman-Morrison and CA_inv = EA M_inv EA_nominal^T EA_nominal (CA @ CA_inv = I) costs small
+    products instead of an SVD. When the Sherman-Morrison denominator is smaller than sm_tolerance,
+    M_inv is recomputed from scratch; falls back to a full pseudo-inverse while EA is rank deficient.
+    """
+    if not 1 <= motor_num <= len(self.motors):
+      raise ValueError(f'motor_num must be 1..{len(self.motors)}, got {motor_num}')
+    if np.ndim(eta) != 0 or not math.isfinite(eta):
+      raise ValueError(f'eta must be a finite scalar, got {eta!r}')
+    i = motor_num-1
+    delta = eta**2 - self.effectiveness[i]**2
+    self.effectiveness[i] = eta
+    self.failed = self.failed | {motor_num} if eta == 0 else self.failed - {motor_num}
+    self.updates += 1
+
+    r = self.EA_nominal[i]
+    if self.M_inv is not None and self.updates % self.resync_every:
+      Mr = self.M_inv @ r
+      denom = 1.0 + delta * (r @ Mr)
+      if abs(denom) > self.sm_tolerance:
+        self.M_inv -= (delta / denom) * np.outer(Mr, Mr)
+      else:
+        self.M_inv = self.gram_inverse()
+    else:
+      # Periodic resync against round-off drift, or trying to leave the rank deficient state
+      self.M_inv = self.gram_inverse()
+
+    EA = self.effectiveness[:, None] * self.EA_nominal
+    self.EA = EA
+    self.CA = self.CA_nominal * self.effectiveness
+    if self.M_inv is not None:
+      self.CA_inv = np.round(EA @ (self.M_inv @ self.M_nominal), 5)
+    else:
+      self.CA_inv = np.round(np.linalg.pinv(self.CA), 5)
+
+  def cache_info(self):
+    return {'hits': self.cache_hits, 'misses': self.cache_misses, 'size': len(self.cache), 'max_size': self.cache_size}
 
   def inject_fault(self, motor_num):
-    self.frame_type.value[motor_num-1].faulty = True
+    self.failed = self.failed | {motor_num}
+    self.effectiveness[motor_num-1] = 0.0
+    self.M_inv = self.gram_inverse()
     self.EA = []
     i = 0
     for motor in self.frame_type.value:
@@ -35,20 +200,17 @@ class DFFrame:
           i = i+1
         else:
           m = [motor.roll, motor.pitch, motor.yaw, motor.thrust]
-        self.motors.append(motor)
         self.EA.append(m)
         
       # self.CA[i,motor_num-1] = 0
-    self.CA = np.linalg.pinv(self.EA)
-    self.CA = np.round(self.CA, 5)
-    self.CA_inv = np.linalg.pinv(self.CA)
-    self.CA_inv = np.round(self.CA_inv, 5)
+    self.CA, self.CA_inv = self.allocation(self.EA, round_ca=True)
 
   def eliminate_fault(self, motor_num):
-    self.frame_type.value[motor_num-1].faulty = False
+    self.failed = self.failed - {motor_num}
+    self.effectiveness[motor_num-1] = 1.0
+    self.M_inv = self.gram_inverse()
     self.CA = self.CA_restore
-    self.CA_inv = np.linalg.pinv(self.CA)
-    self.CA_inv = np.round(self.CA_inv, 5)
+    self.CA_inv = self.allocation(self.nominal_EA())[1]
     # print(f"Eliminate CA: {self.CA}")
 
 # Using enum class create enumerations
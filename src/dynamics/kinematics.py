@@ -0,0 +1,133 @@
+"""
+Attitude kinematics kernels shared by the controllers and the simulator.
+
+Every function writes into a caller-provided buffer and returns it, so a control loop that keeps
+its buffers allocates nothing per tick. Conventions follow src/dynamics/state.py: quaternions
+ordered (x, y, z, w) like tf.transformations, rotation matrices map body to world.
+
+When numba is installed the kernels are compiled on first use (and cached next to this file);
+otherwise they run as plain Python/NumPy with the same results. Set DF_NO_JIT=1 to force the
+fallback, e.g. to compare the two.
+"""
+import math
+import os
+
+from src.utility.quaternion import rotation_entries
+
+try:
+  from numba import njit
+except ImportError:
+  njit = None
+
+def jit(fn):
+  """ numba.njit(cache=True) when numba is available and not disabled, the function itself otherwise. """
+  if njit is None or os.environ.get('DF_NO_JIT'):
+    return fn
+  return njit(cache=True)(fn)
+
+JIT = njit is not None and not os.environ.get('DF_NO_JIT')
+
+_rotation_entries = jit(rotation_entries)
+
+@jit
+def quat_to_rot(q, out):
+  """ Unit (x, y, z, w) -> 3x3 rotation matrix, written into out; q is not normalised here
+  (s = 2 in the contract of src.utility.quaternion.rotation_entries). """
+  (out[0, 0], out[0, 1], out[0, 2],
+   out[1, 0], out[1, 1], out[1, 2],
+   out[2, 0], out[2, 1], out[2, 2]) = _rotation_entries(q[0], q[1], q[2], q[3], 2.0)
+  return out
+
+def quats_to_rots(q, out):
+  """ quat_to_rot over a (N, 4) batch, written into a (N, 3, 3) out. """
+  R = rotation_entries(q[:, 0], q[:, 1], q[:, 2], q[:, 3], 2.0)
+  for k in range(9):
+    out[:, k // 3, k % 3] = R[k]
+  return out
+
+if JIT:
+  # Compiled, a plain loop over the scalar kernel beats the temporaries of the array version
+  @jit
+  def quats_to_rots(q, out):
+    for n in range(q.shape[0]):
+      quat_to_rot(q[n], out[n])
+    return out
+
+@jit
+def rot_to_quat(R, out):
+  """ 3x3 rotation matrix -> (x, y, z, w), written into out.
+
+  Same branch choice and sign as tf.transformations.quaternion_from_matrix.
+  """
+  t = R[0, 0] + R[1, 1] + R[2, 2] + 1.0
+  if t > 1.0:
+    out[3] = t
+    out[2] = R[1, 0] - R[0, 1]
+    out[1] = R[0, 2] - R[2, 0]
+    out[0] = R[2, 1] - R[1, 2]
+  else:
+    i, j, k = 0, 1, 2
+    if R[1, 1] > R[0, 0]:
+      i, j, k = 1, 2, 0
+    if R[2, 2] > R[i, i]:
+      i, j, k = 2, 0, 1
+    t = R[i, i] - (R[j, j] + R[k, k]) + 1.0
+    out[i] = t
+    out[j] = R[i, j] + R[j, i]
+    out[k] = R[k, i] + R[i, k]
+    out[3] = R[k, j] - R[j, k]
+  s = 0.5 / math.sqrt(t)
+  for n in range(4):
+    out[n] *= s
+  return out
+
+@jit
+def desired_frame(des_th, des_yaw, out):
+  """ Desired rotation for a thrust vector and yaw (the scripts' acc2quat), written into out.
+
+  zb is along des_th (world up when des_th is zero), yb = zb x (cos yaw, sin yaw, 0) normalized,
+  xb = yb x zb. Returns |des_th|, which is also des_th . zb.
+  """
+  th_norm = math.sqrt(des_th[0]*des_th[0] + des_th[1]*des_th[1] + des_th[2]*des_th[2])
+  cy = math.cos(des_yaw)
+  sy = math.sin(des_yaw)
+  if th_norm == 0.0:
+    zx, zy, zz = 0.0, 0.0, 1.0
+  else:
+    zx, zy, zz = des_th[0]/th_norm, des_th[1]/th_norm, des_th[2]/th_norm
+  yx, yy, yz = -zz*sy, zz*cy, zx*sy - zy*cy
+  n = math.sqrt(yx*yx + yy*yy + yz*yz)
+  yx, yy, yz = yx/n, yy/n, yz/n
+  # yb and zb are orthonormal, so xb needs no normalization
+  out[0, 0] = yy*zz - yz*zy
+  out[1, 0] = yz*zx - yx*zz
+  out[2, 0] = yx*zy - yy*zx
+  out[0, 1] = yx
+  out[1, 1] = yy
+  out[2, 1] = yz
+  out[0, 2] = zx
+  out[1, 2] = zy
+  out[2, 2] = zz
+  return th_norm
+
+@jit
+def attitude_error(rot_des, rot_curr, out):
+  """ SO(3) attitude error of the scripts' geo_con_new, written into out.
+
+  E = 0.5 (rot_des^T rot_curr - rot_curr^T rot_des) and out = (-E[1,2], -E[0,2], E[0,1]), the
+  roll/pitch/yaw error in the controllers' FRD convention. Only the three needed entries of
+  rot_des^T rot_curr are formed, as column dot products.
+  """
+  d = rot_des
+  r = rot_curr
+  # (rot_des^T rot_curr)[i, j] = column i of rot_des . column j of rot_curr
+  e12 = d[0, 1]*r[0, 2] + d[1, 1]*r[1, 2] + d[2, 1]*r[2, 2]
+  e21 = d[0, 2]*r[0, 1] + d[1, 2]*r[1, 1] + d[2, 2]*r[2, 1]
+  e02 = d[0, 0]*r[0, 2] + d[1, 0]*r[1, 2] + d[2, 0]*r[2, 2]
+  e20 = d[0, 2]*r[0, 0] + d[1, 2]*r[1, 0] + d[2, 2]*r[2, 0]
+  e01 = d[0, 0]*r[0, 1] + d[1, 0]*r[1, 1] + d[2, 0]*r[2, 1]
+  e10 = d[0, 1]*r[0, 0] + d[1, 1]*r[1, 0] + d[2, 1]*r[2, 0]
+  out[0] = -0.5*(e12 - e21)
+  out[1] = -0.5*(e02 - e20)
+  out[2] = 0.5*(e01 - e10)
+  return out
@@ -0,0 +1,142 @@
+"""
+Headless multirotor simulator: rigid-body 6-DOF dynamics integrated with a fixed-step RK4.
+
+Takes the same PWM vector the controllers send through DFAutopilot.set_servos, so a controller
+can fly closed-loop without SITL, Gazebo or mavros. State layout and frames: src/dynamics/state.py.
+
+Motor model: throttle = (pwm - pwm_min) / (pwm_max - pwm_min), thrust = kf * (omega_max * throttle)^2
+and yaw reaction torque = km * (omega_max * throttle)^2, optionally behind a first-order lag.
+Linear drag acts on the velocity relative to `wind`.
+Torque directions come from the DFFrame motor factors (ArduPilot convention: roll/pitch/yaw in FRD,
+yaw +1 for CCW propellers), scaled by arm_length; a motor with `distance` set uses its lever arm.
+Defaults roughly match the Gazebo iris (hover near 1650 us on Quad_X with the scripts' PWM map).
+"""
+import numpy as np
+
+from src.dynamics.state import VEL, QUAT, OMEGA, STATE_SIZE, make_state
+
+def motor_coefficients(motors, arm_length, kf, km):
+  """ Per-motor thrust/moment coefficients (DFMotor values win over the defaults) and the (3, n)
+  FRD torque per newton of thrust: rows roll, pitch, yaw. """
+  n = len(motors)
+  kf = np.array([m.thrust_coeff or kf for m in motors], dtype=float)
+  km = np.array([m.moment_coeff or km for m in motors], dtype=float)
+  torque_arm = np.empty((3, n))
+  for i, m in enumerate(motors):
+    lx, ly, lz = m.distance
+    if lx or ly:
+      torque_arm[0, i] = -ly
+      torque_arm[1, i] = lx
+    else:
+      torque_arm[0, i] = m.roll * arm_length
+      torque_arm[1, i] = m.pitch * arm_length
+    torque_arm[2, i] = m.yaw * km[i] / kf[i]
+  return kf, km, torque_arm
+
+class DFSimulator:
+  def __init__(self, frame, mass, inertia, dt=0.0025, arm_length=0.18, kf=8.8e-6, km=1.4e-7,
+               omega_max=1000.0, motor_tau=0.0, drag=0.1, gravity=9.8, pwm_min=1000, pwm_max=2000,
+               state=None):
+    self.frame = frame
+    self.mass = mass.mass
+    self.J = np.array([inertia.Jxx, inertia.Jyy, inertia.Jzz], dtype=float)
+    self.dt = dt
+    self.motor_tau = motor_tau
+    self.drag = drag
+    self.gravity = gravity
+    self.pwm_min = pwm_min
+    self.pwm_max = pwm_max
+
+    self.n = len(frame.motors)
+    self.kf, self.km, self.torque_arm = motor_coefficients(frame.motors, arm_length, kf, km)
+    self.omega_max = omega_max
+
+    # Loss of effectiveness per motor (1 healthy, 0 dead)
+    self.effectiveness = np.ones(self.n)
+    self.throttle = np.zeros(self.n)
+    # Wind velocity (ENU), drag acts on the air-relative velocity
+    self.wind = np.zeros(3)
+    self.t = 0.0
+    self.state = make_state() if state is None else np.array(state, dtype=float)
+    self.on_ground = self.state[2] <= 0.0
+
+  def reset(self, state=None, t=0.0):
+    self.state = make_state() if state is None else np.array(state, dtype=float)
+    self.throttle[:] = 0.0
+    self.effectiveness[:] = 1.0
+    self.t = t
+    self.on_ground = self.state[2] <= 0.0
+
+  def set_effectiveness(self, motor_num, eta):
+    self.effectiveness[motor_num-1] = eta
+
+  def motor_thrusts(self, throttle):
+    w = self.omega_max * throttle
+    return self.effectiveness * self.kf * w * w
+
+  def derivative(self, x, thrust, tau):
+    """ State derivative for total thrust (N) and FLU body torque tau (Nm). Plain floats: the
+    vectors are 3 long, where numpy call overhead dominates. """
+    px, py, pz, vx, vy, vz, qx, qy, qz, qw, wx, wy, wz = x.tolist()
+    dx = np.empty(STATE_SIZE)
+
+    # Translational: thrust along body z (third column of R), gravity, linear drag (ENU)
+    a = thrust / self.mass
+    ux, uy, uz = self.wind
+    dx[0] = vx
+    dx[1] = vy
+    dx[2] = vz
+    dx[3] = 2*(qx*qz + qy*qw) * a - self.drag * (vx - ux)
+    dx[4] = 2*(qy*qz - qx*qw) * a - self.drag * (vy - uy)
+    dx[5] = (1 - 2*(qx*qx + qy*qy)) * a - self.drag * (vz - uz) - self.gravity
+
+    # Attitude kinematics q_dot = 0.5 q * (omega, 0)
+    dx[6] = 0.5 * (qw*wx + qy*wz - qz*wy)
+    dx[7] = 0.5 * (qw*wy + qz*wx - qx*wz)
+    dx[8] = 0.5 * (qw*wz + qx*wy - qy*wx)
+    dx[9] = -0.5 * (qx*wx + qy*wy + qz*wz)
+
+    # Rotational: Euler's equation
+    Jx, Jy, Jz = self.J
+    dx[10] = (tau[0] - (Jz - Jy) * wy * wz) / Jx
+    dx[11] = (tau[1] - (Jx - Jz) * wz * wx) / Jy
+    dx[12] = (tau[2] - (Jy - Jx) * wx * wy) / Jz
+    return dx
+
+  def step(self, pwm, duration=None):
+    """ Hold the PWM vector for duration seconds (one integration step by default); returns the state. """
+    pwm = np.clip(np.asarray(pwm, dtype=float), self.pwm_min, self.pwm_max)
+    throttle_cmd = (pwm - self.pwm_min) / (self.pwm_max - self.pwm_min)
+    n_steps = 1 if duration is None else max(1, int(round(duration / self.dt)))
+    dt = self.dt
+    for _ in range(n_steps):
+      if self.motor_tau > 0:
+        self.throttle += (throttle_cmd - self.throttle) * (1.0 - np.exp(-dt / self.motor_tau))
+      else:
+        self.throttle[:] = throttle_cmd
+      thrusts = self.motor_thrusts(self.throttle)
+      thrust = thrusts.sum()
+      # FRD motor torques to FLU
+      tau_frd = self.torque_arm @ thrusts
+      tau = (tau_frd[0], -tau_frd[1], -tau_frd[2])
+
+      x = self.state
+      k1 = self.derivative(x, thrust, tau)
+      k2 = self.derivative(x + 0.5*dt*k1, thrust, tau)
+      k3 = self.derivative(x + 0.5*dt*k2, thrust, tau)
+      k4 = self.derivative(x + dt*k3, thrust, tau)
+      x = x + (dt/6.0) * (k1 + 2*k2 + 2*k3 + k4)
+      x[QUAT] /= np.linalg.norm(x[QUAT])
+
+      # Flat ground at z = 0: the vehicle rests until thrust lifts it
+      if x[2] <= 0.0:
+        x[2] = 0.0
+        x[VEL] = 0.0
+        x[OMEGA] = 0.0
+        self.on_ground = True
+      else:
+        self.on_ground = False
+
+      self.state = x
+      self.t += dt
+    return self.state
@@ -0,0 +1,34 @@
+"""
+Vehicle state vector shared by the simulator and the ROS-free controllers.
+
+Frames follow mavros: position/velocity in the local ENU frame, body rates in the FLU body
+frame and the attitude quaternion ordered (x, y, z, w) like tf.transformations.
+"""
+import numpy as np
+
+POS = slice(0, 3)
+VEL = slice(3, 6)
+QUAT = slice(6, 10)
+OMEGA = slice(10, 13)
+STATE_SIZE = 13
+
+def make_state(pos=(0, 0, 0), vel=(0, 0, 0), quat=(0, 0, 0, 1), omega=(0, 0, 0)):
+  state = np.empty(STATE_SIZE)
+  state[POS] = pos
+  state[VEL] = vel
+  state[QUAT] = quat
+  state[OMEGA] = omega
+  return state
+
+# Setpoint vector: desired position and velocity (ENU) and yaw
+SP_POS = slice(0, 3)
+SP_VEL = slice(3, 6)
+SP_YAW = 6
+SETPOINT_SIZE = 7
+
+def make_setpoint(pos=(0, 0, 0), vel=(0, 0, 0), yaw=0.0):
+  setpoint = np.empty(SETPOINT_SIZE)
+  setpoint[SP_POS] = pos
+  setpoint[SP_VEL] = vel
+  setpoint[SP_YAW] = yaw
+  return setpoint
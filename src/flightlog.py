@@ -0,0 +1,202 @@
+"""
+DroneForce flight log: fixed-size binary records, appended by the control loop, memory-mapped on both ends.
+
+File layout (little-endian):
+    0     8 bytes  magic b'DFLOG1\\n\\0'
+    8     u32      header size (records start here, HEADER_SIZE)
+    12    u32      record size
+    16    u64      number of records written, updated after every append
+    24    u32      length of the JSON schema that follows: numpy dtype descr + free-form metadata
+    HEADER_SIZE    records, back to back
+
+Each record is one control tick (record_dtype): time, state (src/dynamics/state.py layout),
+setpoint, thrust and torque command, allocation output u, PWM and the fault flag.
+
+The writer preallocates the file and keeps it mapped, so append() only copies values into the
+mapping: no Python containers grow and no arrays are created per tick. When the preallocated
+space is used up the file is extended by another `capacity` records (the only remap). A reader
+maps the same file read-only and sees the records as a NumPy structured array without copying:
+
+    with DFLogWriter('flight.dflog', n_motors=4, meta={'frame': 'Quad_X'}) as log:
+        ...
+        log.append(t, state, setpoint, th_cmd, torq_cmd, u_input, pwm, fault)
+
+    log = DFLogReader('flight.dflog')
+    plt.plot(log.records['t'], log.records['state'][:, 2])
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from src.dynamics.state import STATE_SIZE, SETPOINT_SIZE
+
+MAGIC = b'DFLOG1\n\0'
+HEADER_SIZE = 4096
+# magic, header size, record size, count, schema length
+_HEADER = struct.Struct('<8sIIQI')
+_COUNT_OFFSET = 16
+
+
+def record_dtype(n_motors):
+    ''' One control tick; packed, so the file carries no padding. '''
+    return np.dtype([
+        ('t', '<f8'),
+        ('state', '<f8', (STATE_SIZE,)),
+        ('setpoint', '<f8', (SETPOINT_SIZE,)),
+        ('thrust', '<f8'),
+        ('torque', '<f8', (3,)),
+        ('u', '<f8', (n_motors,)),
+        ('pwm', '<i2', (n_motors,)),
+        ('fault', 'u1'),
+    ])
+
+
+def _descr(dtype):
+    return [list(field) for field in dtype.descr]
+
+def _dtype(descr):
+    # JSON turns the (name, format, shape) tuples into lists
+    return np.dtype([tuple(tuple(x) if isinstance(x, list) else x for x in field) for field in descr])
+
+
+class DFLogWriter:
+    """ Appends records to a preallocated, memory-mapped flight log. One writer per file. """
+    def __init__(self, path, n_motors, meta=None, capacity=1 << 16, dtype=None, prefault=False):
+        self.path = path
+        # Write every new page once when the file grows, so appends do not take the page faults
+        self.prefault = prefault
+        self.dtype = record_dtype(n_motors) if dtype is None else np.dtype(dtype)
+        self.capacity = capacity
+        self.meta = {} if meta is None else dict(meta)
+        schema = json.dumps({'dtype': _descr(self.dtype), 'meta': self.meta}).encode()
+        if _HEADER.size + len(schema) > HEADER_SIZE:
+            raise ValueError(f'schema of {len(schema)} bytes does not fit the {HEADER_SIZE} byte header')
+
+        self.file = open(path, 'w+b')
+        self.file.write(_HEADER.pack(MAGIC, HEADER_SIZE, self.dtype.itemsize, 0, len(schema)) + schema)
+        self.n = 0
+        self.size = 0
+        self.mm = None
+        self._grow()
+
+    def _grow(self):
+        ''' Extend the file by capacity records and map it again. '''
+        self._unmap()
+        self.size += self.capacity
+        self.file.truncate(HEADER_SIZE + self.size * self.dtype.itemsize)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self._count = np.frombuffer(self.mm, dtype='<u8', count=1, offset=_COUNT_OFFSET)
+        self.records = np.frombuffer(self.mm, dtype=self.dtype, count=self.size, offset=HEADER_SIZE)
+        if self.prefault:
+            self.records[self.n:].view(np.uint8)[:] = 0
+        # Per-field views, so append() indexes plain arrays
+        self._fields = [self.records[name] for name in self.dtype.names]
+
+    def _unmap(self):
+        if self.mm is not None:
+            self._count = self.records = self._fields = None
+            self.mm.flush()
+            try:
+                self.mm.close()
+            except BufferError:
+                # Somebody still holds a view of .records; the mapping is released with it
+                pass
+            self.mm = None
+
+    def append(self, *values):
+        ''' Write one record; values in record_dtype order (t, state, setpoint, thrust, torque, u, pwm, fault). '''
+        n = self.n
+        if n == self.size:
+            self._grow()
+        for field, value in zip(self._fields, values):
+            field[n] = value
+        self.n = n + 1
+        # Published last, so a reader never sees a half-written record
+        self._count[0] = n + 1
+
+    def extend(self, records):
+        ''' Write a structured array of records (this log's dtype) in one copy. '''
+        n = self.n
+        while n + len(records) > self.size:
+            self._grow()
+        self.records[n:n + len(records)] = records
+        self.n = n + len(records)
+        self._count[0] = self.n
+
+    def flush(self):
+        ''' Push written records to disk (the OS does this anyway; use it for durability points). '''
+        self.mm.flush()
+
+    def close(self):
+        ''' Unmap and trim the unused preallocated records. '''
+        if self.file.closed:
+            return
+        self._unmap()
+        self.file.truncate(HEADER_SIZE + self.n * self.dtype.itemsize)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DFLogReader:
+    """ Read-only, zero-copy view of a flight log; refresh() picks up records appended since. """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            head = f.read(HEADER_SIZE)
+        magic, header_size, record_size, _, schema_len = _HEADER.unpack_from(head)
+        if magic != MAGIC:
+            raise ValueError(f'{path}: not a DroneForce flight log')
+        schema = json.loads(head[_HEADER.size:_HEADER.size + schema_len])
+        self.dtype = _dtype(schema['dtype'])
+        if self.dtype.itemsize != record_size:
+            raise ValueError(f'{path}: record size {record_size} does not match its schema ({self.dtype.itemsize})')
+        self.meta = schema['meta']
+        self.header_size = header_size
+        self.mm = None
+        self.refresh()
+
+    def refresh(self):
+        ''' Map the file again if it grew; returns the number of records. '''
+        size = os.path.getsize(self.path)
+        if self.mm is None or size != len(self.mm):
+            self.close()
+            with open(self.path, 'rb') as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count, = struct.unpack_from('<Q', self.mm, _COUNT_OFFSET)
+        # The count can be ahead of a file truncated by hand; never read past the end
+        count = min(count, (size - self.header_size) // self.dtype.itemsize)
+        self.records = np.frombuffer(self.mm, dtype=self.dtype, count=count, offset=self.header_size)
+        return count
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        if self.mm is not None:
+            self.records = None
+            try:
+                self.mm.close()
+            except BufferError:
+                # Arrays taken from .records are still alive; the mapping goes with them
+                pass
+            self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_log(path):
+    ''' (records, meta) of a flight log, records as a read-only structured array over the file. '''
+    reader = DFLogReader(path)
+    return reader.records, reader.meta
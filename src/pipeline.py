@@ -0,0 +1,156 @@
+"""
+ROS-free control pipeline: vehicle state straight from the DFAutopilot MAVLink link, controller,
+allocation and PWM back over the same link.
+
+    LOCAL_POSITION_NED, ATTITUDE_QUATERNION --telemetry receiver--> DFMavlinkState (preallocated)
+        --sense--> controller.step --CA_inv--> torques_to_pwm --actuate--> set_servos (RC override)
+
+By default every ATTITUDE_QUATERNION sample triggers the control step (DFControlRuntime
+triggered mode), so the control rate is the attitude stream rate and a sample does not wait for
+the next tick; triggered=False steps at a fixed rate on the newest sample instead.
+
+The mavros hop (MAVLink -> ROS messages -> rospy callbacks -> field by field copies) is replaced
+by callbacks writing the MAVLink fields into one state vector in the layout and frames of
+src/dynamics/state.py (ENU / FLU, like mavros publishes them). Every buffer is allocated once;
+a tick copies the state, steps the controller and writes the mixer and PWM outputs in place.
+
+    with DFAutopilot(connection_string, transport='mavlink') as drone:
+        drone.configure_motors({1: 1, 2: 1, 3: 1, 4: 1})
+        drone.configure_streams(control_stream_rates(30, oversample=1))
+        pipeline = DFMavlinkPipeline(drone, PID_Controller(), frame, make_setpoint(pos=(0, 0, 3)), rate=30)
+        pipeline.run(duration=60)
+
+Motors have to be in RCPassThru (see DFAutopilot.set_servos).
+"""
+import copy
+import math
+import struct
+import time
+
+import numpy as np
+
+from src.dynamics.state import POS, QUAT, STATE_SIZE, make_state
+from src.recorder import DFRingRecorder
+from src.runtime import DFControlRuntime
+from src.state_adapter import DFStateBuffer
+from src.utility.map_range import torques_to_pwm
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+# Receive time of the state sample behind each PWM command, and the time the command was sent
+LATENCY_RECORD = [('t', '<f8'), ('latency', '<f8')]
+
+_S = math.sqrt(0.5)
+# position + velocity, quaternion + rates, packed into the state buffer in one call each
+_PACK_POS_VEL = struct.Struct('=6d').pack_into
+_PACK_QUAT_OMEGA = struct.Struct('=7d').pack_into
+
+
+class DFMavlinkState(DFStateBuffer):
+    """ Vehicle state (src/dynamics/state.py layout) written by MAVLink telemetry callbacks on the
+    receiver thread and read by the control loop with snapshot(). """
+    def __init__(self, telemetry):
+        super().__init__(make_state())
+        self.state = self.array
+        self.has_position = False
+        self.has_attitude = False
+        # Called on the receiver thread after every attitude sample (e.g. DFControlRuntime.notify)
+        self.on_sample = None
+        telemetry.subscribe('LOCAL_POSITION_NED', self.on_position)
+        telemetry.subscribe('ATTITUDE_QUATERNION', self.on_attitude)
+
+    @property
+    def ready(self):
+        return self.has_position and self.has_attitude
+
+    def on_position(self, msg):
+        ''' NED position / velocity -> ENU. '''
+        with self.lock:
+            self.seq += 1
+            _PACK_POS_VEL(self.state, POS.start * 8, msg.y, msg.x, -msg.z, msg.vy, msg.vx, -msg.vz)
+            self.t = time.monotonic()
+            self.has_position = True
+            self.seq += 1
+
+    def on_attitude(self, msg):
+        ''' FRD body in NED (q1..q4 = w, x, y, z) -> FLU body in ENU, (x, y, z, w) like mavros. '''
+        # q_enu = q_ned_enu * q * q_frd_flu, with q_ned_enu = (s, s, 0, 0) and q_frd_flu = (1, 0, 0, 0)
+        w, x, y, z = msg.q1, msg.q2, msg.q3, msg.q4
+        with self.lock:
+            self.seq += 1
+            _PACK_QUAT_OMEGA(self.state, QUAT.start * 8, _S * (x + y), _S * (x - y), _S * (w - z), _S * (w + z),
+                             msg.rollspeed, -msg.pitchspeed, -msg.yawspeed)
+            self.t = time.monotonic()
+            self.has_attitude = True
+            self.seq += 1
+        if self.on_sample is not None:
+            self.on_sample()
+
+
+class DFMavlinkPipeline:
+    """ Control loop over one DFAutopilot link (src/runtime.py scheduling), triggered by the
+    attitude samples or at a fixed rate.
+
+    controller is any step(state, setpoint, dt) -> (th_cmd, torq_cmd) controller; setpoint is
+    read every tick, so it can be changed in place. recorder (optional) is a DFRingRecorder of
+    flightlog.record_dtype(n_motors) that gets one record per tick.
+    """
+    def __init__(self, drone, controller, frame, setpoint, rate=30, limits=LIMITS, recorder=None, triggered=True):
+        self.drone = drone
+        self.controller = controller
+        self.frame = frame
+        self.setpoint = setpoint
+        self.limits = limits
+        self.recorder = recorder
+        self.source = DFMavlinkState(drone.telemetry)
+
+        n_motors = len(frame.motors)
+        self.state = np.empty(STATE_SIZE)
+        self.Torq = np.empty(4)
+        self.u = np.empty(n_motors)
+        self.pwm = np.empty(n_motors, dtype=np.int16)
+        self.work = np.empty(n_motors)
+        self.seq = -1
+        self.t_sample = None
+        # Receive time of the sample behind the PWMs in self.pwm (sense() may move t_sample on before actuate)
+        self.t_command = None
+        self.t0 = None
+        self.latency = DFRingRecorder(LATENCY_RECORD)
+        self.runtime = DFControlRuntime(self.sense, self.control, self.actuate, rate=rate, triggered=triggered)
+        if triggered:
+            self.source.on_sample = self.runtime.notify
+
+    def sense(self):
+        ''' The state when a new sample arrived since the last call, else None. '''
+        if self.source.seq == self.seq or not self.source.ready:
+            return None
+        self.seq = self.source.seq
+        self.t_sample = self.source.snapshot(self.state)
+        return self.state
+
+    def control(self, state, dt):
+        th_cmd, torq_cmd = self.controller.step(state, self.setpoint, dt)
+        self.Torq[0:3] = torq_cmd
+        self.Torq[3] = th_cmd
+        np.matmul(self.frame.CA_inv, self.Torq, out=self.u)
+        torques_to_pwm(self.u, self.limits, out=self.pwm, work=self.work)
+        self.t_command = self.t_sample
+        if self.recorder is not None:
+            self.recorder.append(self.t_sample - self.t0, state, self.setpoint, th_cmd, torq_cmd, self.u, self.pwm, False)
+        return self.pwm
+
+    def actuate(self, pwm):
+        self.drone.set_servos(pwm)
+        now = time.monotonic()
+        self.latency.append(now - self.t0, now - self.t_command)
+
+    def run(self, duration=None):
+        ''' Start the telemetry and run the loop (until stop() without a duration); returns the runtime stats. '''
+        # First step of a throwaway copy: lazy imports and numba dispatch stay out of the first tick
+        copy.deepcopy(self.controller).step(make_state(), self.setpoint, self.runtime.scheduler.period)
+        self.t0 = time.monotonic()
+        self.drone.telemetry.start()
+        return self.runtime.run(duration)
+
+    def stop(self):
+        self.runtime.stop()
@@ -0,0 +1,155 @@
+"""
+In-memory flight recorder: a fixed-capacity ring of records written by the control loop, with
+snapshots to a flight log (src/flightlog.py) taken by a background thread.
+
+The buffer is allocated once. append() copies values into the next slot and then publishes the
+new record count, so the writer takes no lock and never allocates. Readers copy the published range
+and afterwards drop any slot the writer may have reused meanwhile. When readers fall more than
+`capacity` records behind, the oldest records are lost (and counted), and the writer never waits.
+
+    recorder = DFRingRecorder(record_dtype(4))
+    with DFRecorderSnapshot(recorder, 'flight.dflog', period=1.0):
+        while flying:
+            ...
+            recorder.append(t, state, setpoint, th_cmd, torq_cmd, u_input, pwm, fault)
+
+One writer per recorder; any number of readers (read(), latest(), snapshot threads).
+"""
+import threading
+import time
+
+import numpy as np
+
+from src.flightlog import DFLogWriter
+
+import logging
+
+
+class DFRingRecorder:
+    """ Preallocated ring buffer of structured records; single writer, lock-free. """
+    def __init__(self, dtype, capacity=1 << 14):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=self.dtype)
+        # np.zeros maps pages lazily: touch them all now, not on the first lap of the control loop
+        self.buffer.view(np.uint8)[:] = 0
+        # Per-field views, so append() indexes plain arrays
+        self._fields = [self.buffer[name] for name in self.dtype.names]
+        # Records written so far; record i lives in slot i % capacity
+        self.head = 0
+
+    def __len__(self):
+        return min(self.head, self.capacity)
+
+    def append(self, *values):
+        ''' Write one record; values in dtype field order. '''
+        i = self.head
+        slot = i % self.capacity
+        for field, value in zip(self._fields, values):
+            field[slot] = value
+        # Published last, so readers never take a half-written record
+        self.head = i + 1
+
+    def _copy(self, start, stop):
+        a, b = start % self.capacity, stop % self.capacity
+        if stop == start:
+            return self.buffer[:0].copy()
+        if a < b:
+            return self.buffer[a:b].copy()
+        return np.concatenate((self.buffer[a:], self.buffer[:b]))
+
+    def read(self, since=0):
+        ''' (first, records): copy of records number since.. that are still in the buffer.
+
+        first is the number of records[0]; first - since records were overwritten before they
+        could be read, and first + len(records) is the `since` of the next call.
+        '''
+        head = self.head
+        first = max(since, head - self.capacity)
+        records = self._copy(first, head)
+        # The writer may have moved on while we copied; the record it is writing now
+        # (number self.head) reuses the slot of record self.head - capacity
+        oldest = self.head - self.capacity + 1
+        if oldest > first:
+            records = records[oldest - first:]
+            first = oldest
+        return first, records
+
+    def latest(self, n=1):
+        ''' Copy of the last n records. '''
+        return self.read(max(0, self.head - n))[1]
+
+
+class DFRecorderSnapshot:
+    """ Background thread appending new records of a recorder to a flight log every `period` s.
+
+    Each save copies only the records written since the previous one, `chunk` records at a time
+    through a scratch buffer allocated once, and yields the GIL between chunks so a tick never
+    waits for a whole snapshot.
+    """
+    def __init__(self, recorder, path, period=1.0, meta=None, chunk=256):
+        self.recorder = recorder
+        self.path = path
+        self.period = period
+        self.meta = meta
+        self.scratch = np.zeros(min(chunk, recorder.capacity), dtype=recorder.dtype)
+        self.next = recorder.head
+        self.written = 0
+        self.lost = 0
+        self.thread = None
+        self.log = None
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.log = DFLogWriter(self.path, None, meta=self.meta, capacity=self.recorder.capacity,
+                               dtype=self.recorder.dtype, prefault=True)
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        ''' Write what is left and close the log. '''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        if self.lost:
+            logging.warning('%s: %d records overwritten before they were saved', self.path, self.lost)
+
+    def run(self):
+        while not self.stopped.wait(self.period):
+            self.save()
+        self.save()
+
+    def save(self):
+        ''' Append the records written since the last save, one chunk at a time. '''
+        recorder = self.recorder
+        capacity = recorder.capacity
+        head = recorder.head
+        while self.next < head:
+            first = max(self.next, head - capacity)
+            slot = first % capacity
+            # One contiguous run of slots, at most a chunk
+            n = min(head - first, len(self.scratch), capacity - slot)
+            self.scratch[:n] = recorder.buffer[slot:slot + n]
+            # The writer may have reused some of these slots while we copied (see read())
+            oldest = recorder.head - capacity + 1
+            if oldest > first:
+                self.lost += oldest - self.next
+                self.next = oldest
+                continue
+            self.lost += first - self.next
+            self.log.extend(self.scratch[:n])
+            self.next = first + n
+            self.written += n
+            time.sleep(0)
@@ -0,0 +1,201 @@
+"""
+Asynchronous control loop runtime.
+
+Telemetry ingestion, control computation and actuator output run as separate asyncio coroutines
+joined by latest-value channels, so a slow read or write never delays the next control tick:
+
+    sense()  --state-->  control(state, dt)  --output-->  actuate(output)
+
+The control coroutine is driven by a deadline-aware scheduler that keeps absolute tick times,
+skips (instead of bursting through) ticks it has missed and reports every overrun. With
+triggered=True it runs on sample arrival instead: the sensor callback calls notify() (from any
+thread), sense() runs on the loop right away and the control step follows without waiting for a tick.
+"""
+import asyncio
+import time
+
+import logging
+
+
+class DFLatest:
+    """ Latest-value channel: put() overwrites, readers always see the newest value. """
+    def __init__(self, value=None):
+        self.value = value
+        self.seq = 0
+        # values that were replaced before anybody waited for them
+        self.overwritten = 0
+        self.event = asyncio.Event()
+
+    def put(self, value):
+        if self.event.is_set():
+            self.overwritten += 1
+        self.value = value
+        self.seq += 1
+        self.event.set()
+
+    def get(self):
+        return self.value
+
+    async def next(self):
+        ''' Wait for a value newer than the last one taken with next(). '''
+        await self.event.wait()
+        self.event.clear()
+        return self.value
+
+
+class DFDeadlineScheduler:
+    """ Fixed-rate tick source with absolute deadlines and overrun accounting. """
+    def __init__(self, rate):
+        self.period = 1.0 / rate
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.max_late = 0.0
+
+    async def __aiter__(self):
+        deadline = time.perf_counter()
+        while True:
+            deadline += self.period
+            late = time.perf_counter() - deadline
+            if late > 0:
+                # The previous tick did not finish in its slot
+                self.overruns += 1
+                self.max_late = max(self.max_late, late)
+                missed = int(late // self.period)
+                if missed:
+                    self.skipped += missed
+                    deadline += missed * self.period
+                logging.debug('tick %d overran by %.2f ms (%d skipped)', self.ticks, late * 1e3, missed)
+                # Still yield, or sustained overruns starve the other coroutines and the stop condition
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(-late)
+            self.ticks += 1
+            yield deadline
+
+    def stats(self):
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'max_late_ms': self.max_late * 1e3,
+        }
+
+
+class DFControlRuntime:
+    """ Runs sense / control / actuate as independent coroutines at a fixed control rate.
+
+    sense()               -> latest state, or None when nothing new arrived (must not block)
+    control(state, dt)    -> output for the actuators, or None to skip this tick
+    actuate(output)       -> sends the output; set actuate_in_thread for blocking senders
+
+    triggered: step on every state notify() brings in instead of polling sense() at sense_rate
+    and stepping at rate. Stats then count a tick per step, an overrun per step longer than
+    1/rate, a skip per state replaced before control took it, and max_late is the longest
+    wait from notify() to the control step.
+    """
+    def __init__(self, sense, control, actuate, rate=100, sense_rate=None, actuate_in_thread=False, triggered=False):
+        self.sense = sense
+        self.control = control
+        self.actuate = actuate
+        self.rate = rate
+        self.sense_period = 1.0 / (sense_rate or 2 * rate)
+        self.actuate_in_thread = actuate_in_thread
+        self.triggered = triggered
+        self.scheduler = DFDeadlineScheduler(rate)
+        self.alive = False
+        self.loop = None
+        self.t_sensed = None
+
+    def poll(self):
+        state = self.sense()
+        if state is not None:
+            self.t_sensed = time.perf_counter()
+            self.state.put(state)
+
+    def notify(self):
+        ''' A new sample arrived: run sense() on the loop as soon as possible. Thread safe. '''
+        loop = self.loop
+        if loop is not None and self.alive:
+            loop.call_soon_threadsafe(self.poll)
+
+    async def telemetry_task(self):
+        while self.alive:
+            self.poll()
+            await asyncio.sleep(self.sense_period)
+
+    async def control_task(self):
+        last = None
+        async for deadline in self.scheduler:
+            if not self.alive:
+                break
+            state = self.state.get()
+            if state is None:
+                continue
+            dt = self.scheduler.period if last is None else deadline - last
+            last = deadline
+            output = self.control(state, dt)
+            if output is not None:
+                self.output.put(output)
+
+    async def triggered_control_task(self):
+        scheduler = self.scheduler
+        last = None
+        while self.alive:
+            state = await self.state.next()
+            if state is None:
+                continue
+            start = time.perf_counter()
+            scheduler.max_late = max(scheduler.max_late, start - self.t_sensed)
+            dt = scheduler.period if last is None else start - last
+            last = start
+            output = self.control(state, dt)
+            if output is not None:
+                self.output.put(output)
+            scheduler.ticks += 1
+            if time.perf_counter() - start > scheduler.period:
+                scheduler.overruns += 1
+
+    async def actuator_task(self):
+        while self.alive:
+            output = await self.output.next()
+            if self.actuate_in_thread:
+                await asyncio.to_thread(self.actuate, output)
+            else:
+                self.actuate(output)
+
+    async def main(self, duration=None):
+        self.alive = True
+        self.state = DFLatest()
+        self.output = DFLatest()
+        control = asyncio.create_task(self.triggered_control_task() if self.triggered else self.control_task())
+        tasks = [control, asyncio.create_task(self.actuator_task())]
+        if not self.triggered:
+            tasks.append(asyncio.create_task(self.telemetry_task()))
+        self.loop = asyncio.get_running_loop()
+        try:
+            if duration is None:
+                # Runs until stop() ends the control coroutine
+                await control
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            self.alive = False
+            self.loop = None
+            if self.triggered:
+                self.scheduler.skipped = self.state.overwritten
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logging.info('control loop stats: %s, outputs dropped: %d', self.scheduler.stats(), self.output.overwritten)
+        return self.scheduler.stats()
+
+    def run(self, duration=None):
+        return asyncio.run(self.main(duration))
+
+    def stop(self):
+        self.alive = False
+        loop = self.loop
+        if self.triggered and loop is not None:
+            # Wake the control coroutine waiting for a sample
+            loop.call_soon_threadsafe(self.state.put, None)
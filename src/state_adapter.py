@@ -0,0 +1,142 @@
+"""
+State adapters: telemetry callbacks writing into preallocated state / setpoint vectors.
+
+The ROS scripts copy every odometry and setpoint field into PoseStamped / TwistStamped objects
+and rebuild arrays from them each tick (vector2Arrays). The adapters here write the incoming
+message fields straight into one float64 vector in the layout of src/dynamics/state.py, with
+views for each part, so neither the callback nor the control step allocates. Each callback packs
+its fields into the vector's buffer with one struct.pack_into call; a NumPy item assignment per
+field would cost several times the scripts' attribute copies.
+
+    odometry = DFOdometryAdapter()
+    target = DFSetpointAdapter(pos=(0.0, 0.0, 3.0))
+    rospy.Subscriber('mavros/local_position/odom', Odometry, odometry.odom)
+    rospy.Subscriber('new_pose', PoseStamped, target.pose)
+    rospy.Subscriber('command/trajectory', Mdjt, target.trajectory)
+    ...
+    odometry.snapshot(state)          # consistent copy, once per tick
+    target.snapshot(setpoint)
+    th_cmd, torq_cmd = cnt.step(state, setpoint, dt)
+
+rospy runs every Subscriber on its own thread, so a buffer can have several writers (new_pose and
+command/trajectory above): writers serialise on the buffer's lock, the control loop does not take it.
+Messages are only read by attribute, so the module does not import rospy.
+"""
+import math
+import struct
+import threading
+import time
+
+import numpy as np
+
+from src.dynamics.state import POS, VEL, QUAT, OMEGA, SP_POS, SP_VEL, SP_YAW, make_state, make_setpoint
+
+# Packers writing float64 fields into a vector's buffer at a byte offset
+_PACK_STATE = struct.Struct('=13d').pack_into
+_PACK_6 = struct.Struct('=6d').pack_into
+_PACK_4 = struct.Struct('=4d').pack_into
+_PACK_3 = struct.Struct('=3d').pack_into
+_PACK_1 = struct.Struct('=d').pack_into
+
+# Lock-free copies snapshot() tries before copying under the writers' lock
+SNAPSHOT_RETRIES = 100
+
+
+class DFStateBuffer:
+    """ Preallocated vector written by callback threads and read by the control loop.
+
+    Writers hold lock and bump seq before and after writing (odd while a write is in progress);
+    snapshot() copies without the lock and copies again when it saw seq change. Only after
+    retries failed copies does it take the lock, so a steady stream of writes cannot starve it.
+    """
+    def __init__(self, array, retries=SNAPSHOT_RETRIES):
+        self.array = array
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.retries = retries
+        # time.monotonic() of the newest message
+        self.t = None
+
+    def snapshot(self, out):
+        ''' Copy a consistent vector into out; returns the receive time of its newest message. '''
+        retries = self.retries
+        while retries:
+            retries -= 1
+            seq = self.seq
+            if seq & 1:
+                # A callback is halfway through; let its thread finish it
+                time.sleep(0)
+                continue
+            np.copyto(out, self.array)
+            t = self.t
+            if self.seq == seq:
+                return t
+        with self.lock:
+            np.copyto(out, self.array)
+            return self.t
+
+
+class DFOdometryAdapter(DFStateBuffer):
+    """ mavros local position callbacks -> state vector (ENU position / velocity, FLU rates). """
+    def __init__(self):
+        super().__init__(make_state())
+        self.state = self.array
+        self.pos = self.state[POS]
+        self.vel = self.state[VEL]
+        self.quat = self.state[QUAT]
+        self.omega = self.state[OMEGA]
+
+    def odom(self, msg):
+        ''' nav_msgs/Odometry (mavros/local_position/odom): the whole state. '''
+        p = msg.pose.pose.position
+        q = msg.pose.pose.orientation
+        v = msg.twist.twist.linear
+        w = msg.twist.twist.angular
+        with self.lock:
+            self.seq += 1
+            _PACK_STATE(self.state, 0, p.x, p.y, p.z, v.x, v.y, v.z, q.x, q.y, q.z, q.w, w.x, w.y, w.z)
+            self.t = time.monotonic()
+            self.seq += 1
+
+    def pose(self, msg):
+        ''' geometry_msgs/PoseStamped (mavros/local_position/pose): position and attitude. '''
+        p = msg.pose.position
+        q = msg.pose.orientation
+        with self.lock:
+            self.seq += 1
+            _PACK_3(self.state, POS.start * 8, p.x, p.y, p.z)
+            _PACK_4(self.state, QUAT.start * 8, q.x, q.y, q.z, q.w)
+            self.t = time.monotonic()
+            self.seq += 1
+
+
+class DFSetpointAdapter(DFStateBuffer):
+    """ Setpoint callbacks (new_pose, command/trajectory) -> setpoint vector. """
+    def __init__(self, pos=(0, 0, 0), vel=(0, 0, 0), yaw=0.0):
+        super().__init__(make_setpoint(pos, vel, yaw))
+        self.setpoint = self.array
+        self.pos = self.setpoint[SP_POS]
+        self.vel = self.setpoint[SP_VEL]
+
+    def pose(self, msg):
+        ''' geometry_msgs/PoseStamped: desired position and the yaw of its orientation. '''
+        p = msg.pose.position
+        q = msg.pose.orientation
+        yaw = math.atan2(2.0 * (q.w * q.z + q.x * q.y), 1.0 - 2.0 * (q.y * q.y + q.z * q.z))
+        with self.lock:
+            self.seq += 1
+            _PACK_3(self.setpoint, SP_POS.start * 8, p.x, p.y, p.z)
+            _PACK_1(self.setpoint, SP_YAW * 8, yaw)
+            self.t = time.monotonic()
+            self.seq += 1
+
+    def trajectory(self, msg):
+        ''' trajectory_msgs/MultiDOFJointTrajectory: position and velocity of the first point. '''
+        pt = msg.points[0]
+        p = pt.transforms[0].translation
+        v = pt.velocities[0].linear
+        with self.lock:
+            self.seq += 1
+            _PACK_6(self.setpoint, SP_POS.start * 8, p.x, p.y, p.z, v.x, v.y, v.z)
+            self.t = time.monotonic()
+            self.seq += 1
@@ -0,0 +1,195 @@
+"""
+Controller gain sweeps against the headless simulator (src/dynamics/simulator.py).
+
+Each configuration is a dict of controller attributes (e.g. {'kPos': [1, 1, 16], 'kInt': 0.01})
+flown through the same scenario: hover, a position step, optionally wind and a motor fault.
+Configurations are spread over a ProcessPoolExecutor; workers write their metrics straight into
+a shared-memory result array and the parent checkpoints finished rows to disk, so an interrupted
+sweep picks up where it stopped.
+
+    configs = grid(kPos=[[1, 1, 16], [2, 2, 16]], kVel=[0.5, 1.0])
+    runner = DFSweepRunner(configs, controller='pid', path='sweep-pid.npz', fault=(10, 1, 0.85))
+    runner.run()
+    print(runner.table())
+"""
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.controller.asmc_controller import ASMC_Controller
+from src.controller.pid_controller import PID_Controller
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.inertia import DFInertia
+from src.dynamics.mass import DFMass
+from src.dynamics.simulator import DFSimulator
+from src.dynamics.state import POS, make_state, make_setpoint
+from src.utility.map_range import torques_to_pwm
+
+import logging
+
+CONTROLLERS = {
+    'pid': PID_Controller,
+    'asmc': ASMC_Controller,
+}
+
+METRICS = ('rms_err', 'max_err', 'final_err', 'crashed')
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+
+
+def grid(**axes):
+    ''' Every combination of the given values, e.g. grid(kInt=[0.01, 0.05], kVel=[0.5, 1]). '''
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def random_samples(n, seed=0, **ranges):
+    ''' n configurations drawn uniformly from (low, high) per gain; low/high may be per-axis lists. '''
+    rng = np.random.default_rng(seed)
+    configs = [{} for _ in range(n)]
+    for name, (low, high) in ranges.items():
+        values = rng.uniform(low, high, (n,) + np.shape(low))
+        for config, value in zip(configs, values):
+            config[name] = value.tolist()
+    return configs
+
+
+def evaluate(controller, gains, frame='Quad_X', duration=20.0, rate=30.0, step_time=5.0,
+             target=(2.0, 1.0, 4.0), fault=None, wind=(0.0, 0.0, 0.0)):
+    ''' Fly one configuration and return its metrics in METRICS order.
+
+    The vehicle starts hovering at (0, 0, 3), the setpoint moves to target at step_time.
+    fault is (time, motor_num, effectiveness) or None.
+    '''
+    frame = DFFrame(frame_type=Frames[frame])
+    n_motors = len(frame.motors)
+    sim = DFSimulator(frame, DFMass(0.375 * n_motors), DFInertia(0.029, 0.029, 0.055),
+                      state=make_state(pos=(0, 0, 3.0)))
+    sim.wind[:] = wind
+    cnt = CONTROLLERS[controller](**gains)
+
+    setpoint = make_setpoint(pos=(0.0, 0.0, 3.0))
+    dt = 1.0 / rate
+    n_ticks = int(round(duration * rate))
+    pwm = np.empty(n_motors, dtype=np.int16)
+    errors = np.empty(n_ticks)
+    crashed = False
+    for k in range(n_ticks):
+        if sim.t >= step_time:
+            setpoint[0:3] = target
+        if fault is not None and sim.t >= fault[0]:
+            sim.set_effectiveness(fault[1], fault[2])
+
+        th_cmd, torq_cmd = cnt.step(sim.state, setpoint, dt)
+        u_input = np.matmul(frame.CA_inv, [torq_cmd[0], torq_cmd[1], torq_cmd[2], th_cmd])
+        torques_to_pwm(u_input, LIMITS, out=pwm)
+        sim.step(pwm, dt)
+
+        errors[k] = np.linalg.norm(sim.state[POS] - setpoint[0:3])
+        if sim.on_ground or not np.isfinite(errors[k]):
+            crashed = True
+            errors[k:] = errors[k] if np.isfinite(errors[k]) else np.inf
+            break
+
+    return np.array([np.sqrt(np.mean(errors**2)), np.max(errors), errors[-1], float(crashed)])
+
+
+# Worker side: the shared result array is attached once per process
+_results = None
+
+def _attach(shm_name, shape):
+    global _results, _shm
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _results = np.ndarray(shape, dtype=float, buffer=_shm.buf)
+
+def _run_chunk(indices, configs, controller, scenario):
+    for i, gains in zip(indices, configs):
+        _results[i] = evaluate(controller, gains, **scenario)
+    return indices
+
+
+class DFSweepRunner:
+    """ Runs configurations over a process pool with a shared result array and on-disk resume. """
+    def __init__(self, configs, controller='pid', path=None, processes=None, chunk_size=2, **scenario):
+        if controller not in CONTROLLERS:
+            raise ValueError(f'unknown controller {controller!r}, expected one of {sorted(CONTROLLERS)}')
+        self.configs = [{name: np.asarray(value).tolist() for name, value in c.items()} for c in configs]
+        self.controller = controller
+        self.path = path
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.scenario = scenario
+        self.results = np.full((len(self.configs), len(METRICS)), np.nan)
+        self.done = np.zeros(len(self.configs), dtype=bool)
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def signature(self):
+        return json.dumps({'controller': self.controller, 'scenario': self.scenario, 'configs': self.configs},
+                          sort_keys=True)
+
+    def load(self):
+        with np.load(self.path) as data:
+            if str(data['signature']) != self.signature():
+                raise ValueError(f'{self.path} holds a different sweep, remove it or choose another path')
+            self.results[:] = data['results']
+            self.done[:] = data['done']
+        logging.info('resuming sweep: %d/%d configurations already done', self.done.sum(), len(self.done))
+
+    def save(self):
+        # Write then rename, so a crash mid-save never leaves a truncated checkpoint
+        tmp = self.path + '.tmp.npz'
+        np.savez(tmp, results=self.results, done=self.done, signature=self.signature())
+        os.replace(tmp, self.path)
+
+    def run(self, checkpoint_every=5.0):
+        ''' Evaluate every configuration not done yet; returns the (n_configs, len(METRICS)) results. '''
+        todo = np.flatnonzero(~self.done)
+        if not len(todo):
+            return self.results
+        shm = shared_memory.SharedMemory(create=True, size=self.results.nbytes)
+        try:
+            shared = np.ndarray(self.results.shape, dtype=float, buffer=shm.buf)
+            shared[:] = self.results
+            chunks = [todo[i:i+self.chunk_size].tolist() for i in range(0, len(todo), self.chunk_size)]
+            last_save = time.monotonic()
+            with ProcessPoolExecutor(self.processes, initializer=_attach,
+                                     initargs=(shm.name, self.results.shape)) as pool:
+                futures = [pool.submit(_run_chunk, chunk, [self.configs[i] for i in chunk], self.controller,
+                                       self.scenario) for chunk in chunks]
+                for future in as_completed(futures):
+                    indices = future.result()
+                    self.results[indices] = shared[indices]
+                    self.done[indices] = True
+                    if self.path is not None and time.monotonic() - last_save > checkpoint_every:
+                        self.save()
+                        last_save = time.monotonic()
+        finally:
+            if self.path is not None:
+                self.save()
+            del shared
+            shm.close()
+            shm.unlink()
+        return self.results
+
+    def ranked(self, metric='rms_err'):
+        ''' Indices of the finished configurations, best first; crashed runs go last. '''
+        col = METRICS.index(metric)
+        idx = np.flatnonzero(self.done)
+        order = np.lexsort((self.results[idx, col], self.results[idx, METRICS.index('crashed')]))
+        return idx[order]
+
+    def table(self, metric='rms_err', top=20):
+        names = sorted({name for c in self.configs for name in c})
+        lines = ['rank  ' + '  '.join(f'{m:>9}' for m in METRICS) + '  ' + '  '.join(names)]
+        for rank, i in enumerate(self.ranked(metric)[:top], 1):
+            metrics = '  '.join(f'{v:9.3f}' for v in self.results[i])
+            gains = '  '.join(f'{name}={np.round(self.configs[i].get(name), 3).tolist()}' for name in names)
+            lines.append(f'{rank:4d}  {metrics}  {gains}')
+        return '\n'.join(lines)
@@ -0,0 +1,160 @@
+"""
+Event-driven MAVLink telemetry: one receiver on the DFAutopilot link, demultiplexed by message type.
+
+Instead of one polling thread per message type (recv_match(type=..., blocking=False) + sleep),
+every message read by the transport's receiver goes through a single dispatch:
+
+    telemetry = DFTelemetry(drone.transport)
+    telemetry.subscribe('ATTITUDE', on_attitude)               # callback(msg) for every message
+    telemetry.subscribe('SERVO_OUTPUT_RAW', decimation=10)     # latest-value slot only
+    telemetry.start()
+    ...
+    servo = telemetry.latest('SERVO_OUTPUT_RAW')
+
+The dronekit transport already reads the link on its own thread; the lean mavlink transport is
+switched to its background receiver (DFMavlinkTransport.start_receiver). Callbacks run on that
+thread and must return quickly.
+
+Counters per type: received, delivered (callbacks run after decimation), errors (callbacks that
+raised). For the link: dropped (gaps in the MAVLink packet sequence of each sender) and parse_errors
+(BAD_DATA frames).
+"""
+import time
+
+import logging
+
+
+class DFMessageSlot:
+    """ Latest message of one type, its receive time and counters. """
+    def __init__(self, name, decimation=1):
+        self.name = name
+        self.decimation = decimation
+        self.callbacks = []
+        self.msg = None
+        self.t = None
+        self.received = 0
+        self.delivered = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'delivered': self.delivered,
+            'errors': self.errors,
+        }
+
+
+class DFTelemetry:
+    """ Single-receiver demultiplexer of MAVLink messages into per-type callbacks and latest-value slots. """
+    def __init__(self, transport):
+        self.transport = transport
+        self.slots = {}
+        # Last packet sequence number per (system, component)
+        self.seq = {}
+        self.dropped = 0
+        self.parse_errors = 0
+        self.running = False
+        self.receiver = False
+
+    def subscribe(self, name, callback=None, decimation=1):
+        ''' Keep the latest `name` message; call callback(msg) on every decimation-th one. '''
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = DFMessageSlot(name, decimation)
+        else:
+            slot.decimation = decimation
+        if callback is not None:
+            slot.callbacks = slot.callbacks + [callback]
+        self.slots[name] = slot
+        return slot
+
+    def unsubscribe(self, name, callback=None):
+        ''' Remove one callback, or the whole slot when callback is None. '''
+        if callback is None:
+            self.slots.pop(name, None)
+        elif name in self.slots:
+            self.slots[name].callbacks = [fn for fn in self.slots[name].callbacks if fn is not callback]
+
+    def latest(self, name):
+        ''' Newest message of this type, None before the first one. '''
+        slot = self.slots.get(name)
+        return None if slot is None else slot.msg
+
+    def age(self, name):
+        ''' Seconds since the newest message of this type arrived, None before the first one. '''
+        slot = self.slots.get(name)
+        return None if slot is None or slot.t is None else time.monotonic() - slot.t
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.transport.add_listener('*', self.dispatch)
+        if hasattr(self.transport, 'start_receiver') and self.transport.receiver is None:
+            self.transport.start_receiver()
+            self.receiver = True
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.transport.remove_listener('*', self.dispatch)
+        if self.receiver:
+            # Back to reading the link on the caller's thread
+            self.transport.stop_receiver()
+            self.receiver = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def dispatch(self, _transport, name, msg):
+        if name == 'BAD_DATA':
+            self.parse_errors += 1
+            return
+        self.count_sequence(msg)
+        slot = self.slots.get(name)
+        if slot is None:
+            return
+        slot.msg = msg
+        slot.t = time.monotonic()
+        slot.received += 1
+        if (slot.received - 1) % slot.decimation:
+            return
+        slot.delivered += 1
+        for fn in slot.callbacks:
+            try:
+                fn(msg)
+            except Exception:
+                slot.errors += 1
+                logging.exception('%s callback %r failed', name, fn)
+
+    def count_sequence(self, msg):
+        source = (msg.get_srcSystem(), msg.get_srcComponent())
+        seq = msg.get_seq()
+        last = self.seq.get(source)
+        if last is not None:
+            self.dropped += (seq - last - 1) & 0xFF
+        self.seq[source] = seq
+
+    def measure_rates(self, names, duration=2.0):
+        ''' {name: Hz} of the messages received during the next `duration` seconds. '''
+        slots = [self.subscribe(name) if name not in self.slots else self.slots[name] for name in names]
+        started = not self.running
+        self.start()
+        before = [slot.received for slot in slots]
+        time.sleep(duration)
+        rates = {slot.name: (slot.received - n) / duration for slot, n in zip(slots, before)}
+        if started:
+            self.stop()
+        return rates
+
+    def stats(self):
+        ''' {'link': {...}, message type: {...}} counters. '''
+        stats = {'link': {'dropped': self.dropped, 'parse_errors': self.parse_errors}}
+        for name, slot in self.slots.items():
+            stats[name] = slot.stats()
+        return stats
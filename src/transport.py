@@ -0,0 +1,225 @@
+"""
+MAVLink transport backends for DFAutopilot.
+
+Both backends expose the same small surface:
+    mav                     - MAVLink encoder (``mav.command_long_encode(...)`` etc.)
+    send(msg)               - write one encoded message
+    request(...)            - send messages and collect the matching replies
+    add/remove_listener     - per-message-type callbacks, ``fn(transport, name, msg)``
+    get_param/set_param     - single parameter access
+    cached_param(name)      - last known value of a parameter without touching the link (or None)
+    target_system/component - ids of the vehicle on the other end
+    armed, disarm(), close()
+"""
+import threading
+import time
+
+from pymavlink import mavutil
+
+import logging
+
+
+def request_by_listener(transport, msgs, reply_type, keys, key_of, timeout=1.0):
+    ''' request() for transports whose messages arrive on a receiver thread: collect the replies
+    with a temporary listener while this thread waits. '''
+    pending = set(keys)
+    replies = {}
+    done = threading.Event()
+
+    def reply_listener(_self, name, msg):
+        key = key_of(msg)
+        if key in pending:
+            replies[key] = msg
+            pending.discard(key)
+            if not pending:
+                done.set()
+
+    transport.add_listener(reply_type, reply_listener)
+    try:
+        for msg in msgs:
+            transport.send(msg)
+        if pending:
+            done.wait(timeout)
+    finally:
+        transport.remove_listener(reply_type, reply_listener)
+    return replies
+
+
+class DFDronekitTransport:
+    """ Dronekit backed transport (attribute cache thread, full parameter download on connect). """
+    def __init__(self, connection_string, rate=20, *args, **kwargs):
+        from dronekit import connect
+        self.vehicle = connect(connection_string, wait_ready=True, rate=rate)
+        self.mav = self.vehicle.message_factory
+        self.target_system = self.vehicle._master.target_system
+        self.target_component = self.vehicle._master.target_component
+
+    def send(self, msg):
+        self.vehicle.send_mavlink(msg)
+
+    def request(self, msgs, reply_type, keys, key_of, timeout=1.0):
+        ''' Send msgs and wait (up to timeout) for one reply_type message per key. '''
+        return request_by_listener(self, msgs, reply_type, keys, key_of, timeout)
+
+    def add_listener(self, name, fn):
+        self.vehicle.add_message_listener(name, fn)
+
+    def remove_listener(self, name, fn):
+        self.vehicle.remove_message_listener(name, fn)
+
+    def get_param(self, name):
+        return self.vehicle.parameters[name]
+
+    def set_param(self, name, value):
+        self.vehicle.parameters[name] = value
+
+    def cached_param(self, name):
+        # Dronekit keeps the whole table downloaded at connect time up to date
+        return self.vehicle.parameters.get(name, wait_ready=False)
+
+    @property
+    def armed(self):
+        return self.vehicle.armed
+
+    def disarm(self):
+        self.vehicle.armed = False
+
+    def close(self):
+        self.vehicle.close()
+
+
+class DFMavlinkTransport:
+    """ Lean pymavlink transport: no background threads, no parameter download, non-blocking sends.
+
+    Incoming messages are only read when the owner pumps the link (poll/recv/request), so
+    listeners run on the caller's thread. start_receiver() moves the reading to one background
+    thread instead (used by src/telemetry.py); request() then waits for its replies.
+    """
+    def __init__(self, connection_string, source_system=255, timeout=10, *args, **kwargs):
+        self.conn = mavutil.mavlink_connection(connection_string, source_system=source_system)
+        self.mav = self.conn.mav
+        self.listeners = {}
+        self.last_gcs_heartbeat = 0.0
+        self.receiver = None
+        self.receiving = False
+        if self.conn.wait_heartbeat(timeout=timeout) is None:
+            self.conn.close()
+            raise ConnectionError(f'no heartbeat on {connection_string} after {timeout}s')
+        self.target_system = self.conn.target_system
+        self.target_component = self.conn.target_component
+        logging.debug('heartbeat from system %d component %d', self.target_system, self.target_component)
+
+    def send(self, msg):
+        # UDP sockets are non-blocking in pymavlink; a full socket buffer drops the packet
+        self.mav.send(msg)
+
+    def recv(self, timeout=0):
+        ''' Read and dispatch one message, waiting up to timeout seconds for it. '''
+        msg = self.conn.recv_msg()
+        if msg is None and timeout > 0:
+            self.conn.select(timeout)
+            msg = self.conn.recv_msg()
+        if msg is not None:
+            self.dispatch(msg)
+        return msg
+
+    def poll(self):
+        ''' Drain every message waiting on the link and keep the GCS heartbeat going. '''
+        now = time.monotonic()
+        if now - self.last_gcs_heartbeat > 1.0:
+            self.last_gcs_heartbeat = now
+            self.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+        while self.recv() is not None:
+            pass
+
+    def start_receiver(self, timeout=0.1):
+        ''' Read the link on a background thread, woken by incoming data (select), not a sleep loop. '''
+        if self.receiver is not None:
+            return
+        self.receiving = True
+
+        def receive():
+            while self.receiving:
+                self.poll()
+                self.conn.select(timeout)
+
+        self.receiver = threading.Thread(target=receive, daemon=True)
+        self.receiver.start()
+
+    def stop_receiver(self):
+        if self.receiver is not None:
+            self.receiving = False
+            self.receiver.join()
+            self.receiver = None
+
+    def dispatch(self, msg):
+        name = msg.get_type()
+        for fn in self.listeners.get(name, ()):
+            fn(self, name, msg)
+        for fn in self.listeners.get('*', ()):
+            fn(self, name, msg)
+
+    def request(self, msgs, reply_type, keys, key_of, timeout=1.0):
+        ''' Send msgs and pump the link (up to timeout) for one reply_type message per key. '''
+        if self.receiver is not None:
+            # The receiver thread owns the socket
+            return request_by_listener(self, msgs, reply_type, keys, key_of, timeout)
+        pending = set(keys)
+        replies = {}
+        for msg in msgs:
+            self.send(msg)
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            msg = self.recv(remaining)
+            if msg is None or msg.get_type() != reply_type:
+                continue
+            key = key_of(msg)
+            if key in pending:
+                replies[key] = msg
+                pending.discard(key)
+        return replies
+
+    # Copy on write, so a receiver thread dispatching meanwhile iterates over a stable list
+    def add_listener(self, name, fn):
+        self.listeners[name] = self.listeners.get(name, []) + [fn]
+
+    def remove_listener(self, name, fn):
+        if fn in self.listeners.get(name, ()):
+            listeners = list(self.listeners[name])
+            listeners.remove(fn)
+            self.listeners[name] = listeners
+
+    def get_param(self, name, timeout=1.0):
+        msg = self.mav.param_request_read_encode(self.target_system, self.target_component, name.encode('ascii'), -1)
+        self.request([msg], 'PARAM_VALUE', [name], lambda m: m.param_id, timeout)
+        return self.conn.params.get(name)
+
+    def set_param(self, name, value, timeout=1.0):
+        msg = self.mav.param_set_encode(self.target_system, self.target_component,
+                                        name.encode('ascii'), value, mavutil.mavlink.MAV_PARAM_TYPE_REAL32)
+        if not self.request([msg], 'PARAM_VALUE', [name], lambda m: m.param_id, timeout):
+            logging.warning('no PARAM_VALUE ack for %s after %ss', name, timeout)
+
+    def cached_param(self, name):
+        # pymavlink records every PARAM_VALUE that goes through the link
+        return self.conn.params.get(name)
+
+    @property
+    def armed(self):
+        return self.conn.motors_armed()
+
+    def disarm(self):
+        self.conn.arducopter_disarm()
+
+    def close(self):
+        self.stop_receiver()
+        self.conn.close()
+
+
+TRANSPORTS = {
+    'dronekit': DFDronekitTransport,
+    'mavlink': DFMavlinkTransport,
+}
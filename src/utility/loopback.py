@@ -0,0 +1,169 @@
+"""
+Local MAVLink stand-in for an ArduCopter vehicle, so DFAutopilot can be exercised without SITL.
+
+It behaves like `mavproxy.py --out=udp:127.0.0.1:14554`: it sends to the DFAutopilot port and
+answers on the same socket. Supported:
+    - HEARTBEAT, ATTITUDE, GPS_RAW_INT and SERVO_OUTPUT_RAW streamed at `rate` Hz
+    - MAV_CMD_SET_MESSAGE_INTERVAL for those and ATTITUDE_QUATERNION / LOCAL_POSITION_NED
+      (interval in us, -1 stops the message, 0 restores the default)
+    - PARAM_REQUEST_LIST / PARAM_REQUEST_READ / PARAM_SET with PARAM_VALUE replies
+    - COMMAND_LONG with COMMAND_ACK (MAV_CMD_DO_SET_SERVO and arm/disarm are applied)
+    - RC_CHANNELS_OVERRIDE, passed through to servos in RCPassThru (SERVOn_FUNCTION = 1)
+"""
+import threading
+import time
+
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+# Sent every stream cycle unless given their own interval
+DEFAULT_STREAMS = ('ATTITUDE', 'GPS_RAW_INT', 'SERVO_OUTPUT_RAW')
+MESSAGES = DEFAULT_STREAMS + ('ATTITUDE_QUATERNION', 'LOCAL_POSITION_NED')
+
+
+class DFLoopbackAutopilot:
+    """ Minimal ArduCopter stand-in speaking MAVLink on a local UDP port. """
+    def __init__(self, connection_string='udpout:127.0.0.1:14554', rate=20, n_servos=8, extra_params=0):
+        self.conn = mavutil.mavlink_connection(connection_string, source_system=1, source_component=1)
+        self.rate = rate
+        self.alive = False
+        self.armed = False
+        self.thread = None
+        self.start_time = time.monotonic()
+
+        # Hexa layout: SERVO1..6 drive Motor1..6 (33..38), remaining outputs disabled
+        self.params = {}
+        for i in range(1, n_servos+1):
+            self.params[f'SERVO{i}_FUNCTION'] = float(32+i) if i <= 6 else 0.0
+            self.params[f'SERVO{i}_REVERSED'] = 0.0
+        # Pad the table to mimic the size of a real ArduPilot parameter download
+        for i in range(extra_params):
+            self.params[f'DF_PAD_{i}'] = 0.0
+        self.param_index = {name: i for i, name in enumerate(self.params)}
+        self.servos = [1000] * n_servos
+        # Stream cycles sent so far (one message of each default stream per cycle)
+        self.streamed = 0
+        # Messages with an interval set by MAV_CMD_SET_MESSAGE_INTERVAL: name -> [interval s, next send]
+        self.intervals = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.alive = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.alive = False
+        if self.thread is not None:
+            self.thread.join()
+        self.conn.close()
+
+    def time_boot_ms(self):
+        return int((time.monotonic() - self.start_time) * 1e3)
+
+    def run(self):
+        period = 1.0 / self.rate
+        next_stream = time.monotonic()
+        next_heartbeat = next_stream
+        while self.alive:
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self.send_heartbeat()
+                next_heartbeat = now + 1.0
+            if now >= next_stream:
+                self.send_streams()
+                next_stream += period
+            wake = min(next_stream, next_heartbeat)
+            for name, schedule in list(self.intervals.items()):
+                if schedule[0] <= 0:
+                    continue
+                if now >= schedule[1]:
+                    self.send_message(name, self.time_boot_ms())
+                    # Keep the phase, skip the sends that are already late
+                    schedule[1] = max(schedule[1] + schedule[0], now)
+                wake = min(wake, schedule[1])
+            msg = self.conn.recv_msg()
+            if msg is None:
+                self.conn.select(max(0.0, wake - time.monotonic()))
+                continue
+            self.handle(msg)
+
+    def send_heartbeat(self):
+        base_mode = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+        if self.armed:
+            base_mode |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+        # custom_mode 4 = GUIDED
+        self.conn.mav.heartbeat_send(mavlink.MAV_TYPE_HEXAROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                                     base_mode, 4, mavlink.MAV_STATE_ACTIVE)
+
+    def send_streams(self):
+        t_ms = self.time_boot_ms()
+        for name in DEFAULT_STREAMS:
+            if name not in self.intervals:
+                self.send_message(name, t_ms)
+        self.streamed += 1
+
+    def send_message(self, name, t_ms):
+        if name == 'ATTITUDE':
+            self.conn.mav.attitude_send(t_ms, 0, 0, 0, 0, 0, 0)
+        elif name == 'GPS_RAW_INT':
+            self.conn.mav.gps_raw_int_send(t_ms*1000, 3, 0, 0, 0, 100, 100, 0, 0, 10)
+        elif name == 'SERVO_OUTPUT_RAW':
+            servos = (self.servos + [0]*8)[:8]
+            self.conn.mav.servo_output_raw_send(t_ms*1000, 0, *servos)
+        elif name == 'ATTITUDE_QUATERNION':
+            self.conn.mav.attitude_quaternion_send(t_ms, 1, 0, 0, 0, 0, 0, 0)
+        elif name == 'LOCAL_POSITION_NED':
+            self.conn.mav.local_position_ned_send(t_ms, 0, 0, -3, 0, 0, 0)
+
+    def send_param(self, name):
+        self.conn.mav.param_value_send(name.encode('ascii'), self.params[name], mavlink.MAV_PARAM_TYPE_REAL32,
+                                       len(self.params), self.param_index[name])
+
+    def handle(self, msg):
+        m_type = msg.get_type()
+        if m_type == 'PARAM_REQUEST_LIST':
+            for name in list(self.params):
+                self.send_param(name)
+        elif m_type == 'PARAM_REQUEST_READ':
+            name = msg.param_id if msg.param_index < 0 else list(self.params)[msg.param_index]
+            if name in self.params:
+                self.send_param(name)
+        elif m_type == 'PARAM_SET':
+            if msg.param_id in self.params:
+                self.params[msg.param_id] = msg.param_value
+                self.send_param(msg.param_id)
+        elif m_type == 'COMMAND_LONG':
+            self.handle_command(msg)
+        elif m_type == 'RC_CHANNELS_OVERRIDE':
+            for i in range(min(8, len(self.servos))):
+                pwm = getattr(msg, f'chan{i+1}_raw')
+                if pwm not in (0, 65535) and self.params.get(f'SERVO{i+1}_FUNCTION') == 1:
+                    self.servos[i] = pwm
+
+    def handle_command(self, msg):
+        if msg.command == mavlink.MAV_CMD_DO_SET_SERVO:
+            i = int(msg.param1) - 1
+            if 0 <= i < len(self.servos):
+                self.servos[i] = int(msg.param2)
+        elif msg.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            self.armed = msg.param1 == 1
+        elif msg.command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+            message = mavlink.mavlink_map.get(int(msg.param1))
+            name = message.msgname if message is not None else None
+            if name not in MESSAGES:
+                self.conn.mav.command_ack_send(msg.command, mavlink.MAV_RESULT_DENIED)
+                return
+            if msg.param2 == 0:
+                self.intervals.pop(name, None)
+            else:
+                # -1 (stopped) keeps a non-positive interval, which the scheduler skips
+                self.intervals[name] = [msg.param2 * 1e-6, time.monotonic()]
+        self.conn.mav.command_ack_send(msg.command, mavlink.MAV_RESULT_ACCEPTED)
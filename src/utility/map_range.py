@@ -1,3 +1,8 @@
+import numpy as np
+
+# Preset maps for Torque to PWM: fromMin, fromMax, toMin, toMax
+TORQUE_PWM_LIMITS = (-10, 10, 1000, 2000)
+
 def map_range(value, leftMin, leftMax, rightMin, rightMax):
     # Figure out how 'wide' each range is
     leftSpan = leftMax - leftMin
@@ -28,5 +33,40 @@ def torque_to_PWM(value, motor):
     val = int(toMin + (valueScaled * toSpan))
     return val
 
+# Longest single motor vector mapped with a Python loop: below this, per-ufunc overhead costs more
+SMALL_VECTOR = 8
+
+def torques_to_pwm(u, limits=TORQUE_PWM_LIMITS, out=None, work=None):
+    """ Clip, scale and round a motor vector (n,) or a batch of them (..., n) to PWM.
+
+    limits is (fromMin, fromMax, toMin, toMax); each entry is a scalar or a per-motor array of
+    length n. Results are written to out (int16, allocated if not given), rounded half to even;
+    batches use work as float scratch space, so a control loop can reuse both buffers every tick.
+    A single vector of up to SMALL_VECTOR motors with scalar limits (one control tick) is mapped
+    in a Python loop, which beats the NumPy call overhead at that size; both paths give the same PWMs.
+    """
+    fromMin, fromMax, toMin, toMax = limits
+    scale = (toMax - toMin) / (fromMax - fromMin)
+    if type(u) is not np.ndarray:
+        u = np.asarray(u, dtype=np.float64)
+    if out is None:
+        out = np.empty(u.shape, dtype=np.int16)
+    if u.ndim == 1 and len(u) <= SMALL_VECTOR and type(scale) is float and type(fromMin) is not np.ndarray:
+        # Snap input values to the torque range, then into the to range
+        out[:] = [round(toMin + ((fromMax if value > fromMax else fromMin if value < fromMin else value) - fromMin) * scale)
+                  for value in u.tolist()]
+        return out
+    if work is None:
+        work = np.empty(u.shape)
+    # Snap input values to the torque range
+    np.maximum(u, fromMin, out=work)
+    np.minimum(work, fromMax, out=work)
+    # Convert the from range into the to range
+    work -= fromMin
+    work *= scale
+    work += toMin
+    np.rint(work, out=out, casting='unsafe')
+    return out
+
 def map_pid_value(des):
     return map_range(des, 0, des, 1, 5)
\ No newline at end of file
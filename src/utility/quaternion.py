@@ -0,0 +1,350 @@
+"""
+Quaternion and rotation helpers with the tf.transformations API, without ROS.
+
+Quaternions are ordered (x, y, z, w) and Euler axes strings follow tf ('sxyz' = static x, y, z),
+so `import src.utility.quaternion as transformations` is a drop-in for the functions the scripts
+use. On top of tf:
+    - quaternion_matrix3 returns the 3x3 rotation directly (no 4x4 + np.delete)
+    - every function also takes stacks of shape (..., 4) / (..., 3, 3) and returns stacks
+    - results can be written into a preallocated `out`
+
+Only numpy and math are imported, so this loads in milliseconds. A single quaternion is handled
+with Python floats, where numpy call overhead on 4-element arrays would dominate.
+Attitude kernels for the control loop itself are in src/dynamics/kinematics.py.
+"""
+import math
+
+import numpy as np
+
+_EPS = np.finfo(float).eps * 4.0
+
+# Euler axes as (firstaxis, parity, repetition, frame), as in tf.transformations
+_NEXT_AXIS = [1, 2, 0, 1]
+_AXES2TUPLE = {
+    'sxyz': (0, 0, 0, 0), 'sxyx': (0, 0, 1, 0), 'sxzy': (0, 1, 0, 0),
+    'sxzx': (0, 1, 1, 0), 'syzx': (1, 0, 0, 0), 'syzy': (1, 0, 1, 0),
+    'syxz': (1, 1, 0, 0), 'syxy': (1, 1, 1, 0), 'szxy': (2, 0, 0, 0),
+    'szxz': (2, 0, 1, 0), 'szyx': (2, 1, 0, 0), 'szyz': (2, 1, 1, 0),
+    'rzyx': (0, 0, 0, 1), 'rxyx': (0, 0, 1, 1), 'ryzx': (0, 1, 0, 1),
+    'rxzx': (0, 1, 1, 1), 'rxzy': (1, 0, 0, 1), 'ryzy': (1, 0, 1, 1),
+    'rzxy': (1, 1, 0, 1), 'ryxy': (1, 1, 1, 1), 'ryxz': (2, 0, 0, 1),
+    'rzxz': (2, 0, 1, 1), 'rxyz': (2, 1, 0, 1), 'rzyz': (2, 1, 1, 1)}
+
+
+class _Scalar:
+    """ Math for single values; _Array is the same interface over numpy arrays. """
+    sqrt = staticmethod(math.sqrt)
+    sin = staticmethod(math.sin)
+    cos = staticmethod(math.cos)
+    atan2 = staticmethod(math.atan2)
+    acos = staticmethod(math.acos)
+
+    @staticmethod
+    def where(cond, a, b):
+        return a if cond else b
+
+class _Array:
+    sqrt = staticmethod(np.sqrt)
+    sin = staticmethod(np.sin)
+    cos = staticmethod(np.cos)
+    atan2 = staticmethod(np.arctan2)
+    acos = staticmethod(np.arccos)
+    where = staticmethod(np.where)
+
+
+def _axes(axes):
+    try:
+        return _AXES2TUPLE[axes.lower()]
+    except (AttributeError, KeyError):
+        if tuple(axes) not in _AXES2TUPLE.values():
+            raise ValueError(f'unknown Euler axes {axes!r}')
+        return tuple(axes)
+
+def _is_scalar(*values):
+    # np.ndim converts its argument first, which costs more than the math on a single value
+    for v in values:
+        if not isinstance(v, (int, float)) and getattr(v, 'ndim', None) != 0:
+            return False
+    return True
+
+def _split(q):
+    """ Components of a (4,) quaternion as floats, or of a (..., 4) stack as arrays. """
+    q = np.asarray(q, dtype=float)
+    if q.ndim == 1:
+        return q.tolist(), _Scalar
+    return (q[..., 0], q[..., 1], q[..., 2], q[..., 3]), _Array
+
+def _join(components, out):
+    """ Inverse of _split: write the components into out (allocated if None) along the last axis. """
+    if _is_scalar(components[0]):
+        if out is None:
+            out = np.empty(len(components))
+        for i, c in enumerate(components):
+            out[i] = c
+        return out
+    if out is None:
+        out = np.empty(np.shape(components[0]) + (len(components),))
+    for i, c in enumerate(components):
+        out[..., i] = c
+    return out
+
+
+def rotation_entries(x, y, z, w, s):
+    """ Row-major entries of the rotation matrix of quaternion (x, y, z, w); floats or arrays.
+
+    The one rotation kernel, also compiled for the control loop by src/dynamics/kinematics.py.
+    Normalisation contract: the matrix is a rotation when s = 2 / |q|^2. quaternion_matrix3 computes
+    that s like tf, so any quaternion works and a near-zero one (s = 0) gives the identity;
+    kinematics.quat_to_rot passes s = 2, which takes a unit quaternion (the state vectors of
+    src/dynamics/state.py are kept normalised) and saves the division.
+    """
+    return (1.0 - s*(y*y + z*z), s*(x*y - z*w), s*(x*z + y*w),
+            s*(x*y + z*w), 1.0 - s*(x*x + z*z), s*(y*z - x*w),
+            s*(x*z - y*w), s*(y*z + x*w), 1.0 - s*(x*x + y*y))
+
+def quaternion_matrix3(quaternion, out=None):
+    """ 3x3 rotation matrix from a quaternion; (..., 4) -> (..., 3, 3), normalised as tf does
+    (see rotation_entries). """
+    (x, y, z, w), m = _split(quaternion)
+    nq = x*x + y*y + z*z + w*w
+    if m is _Scalar:
+        R = rotation_entries(x, y, z, w, 0.0 if nq < _EPS else 2.0 / nq)
+        if out is None:
+            return np.array(R).reshape(3, 3)
+        out[:] = (R[0:3], R[3:6], R[6:9])
+        return out
+
+    if out is None:
+        out = np.empty(np.shape(x) + (3, 3))
+    R = rotation_entries(x, y, z, w, np.where(nq < _EPS, 0.0, 2.0 / np.where(nq < _EPS, 1.0, nq)))
+    for k in range(9):
+        out[..., k // 3, k % 3] = R[k]
+    return out
+
+def quaternion_matrix(quaternion, out=None):
+    """ 4x4 homogeneous rotation matrix from a quaternion, as tf.transformations.quaternion_matrix. """
+    shape = np.shape(quaternion)[:-1]
+    if out is None:
+        out = np.zeros(shape + (4, 4))
+    else:
+        out[...] = 0.0
+    if shape:
+        quaternion_matrix3(quaternion, out[..., :3, :3])
+    else:
+        out[:3, :3] = quaternion_matrix3(quaternion)
+    out[..., 3, 3] = 1.0
+    return out
+
+# Trace branch and the three diagonal branches of quaternion_from_matrix, as (i, j, k)
+_BRANCHES = ((0, 1, 2), (1, 2, 0), (2, 0, 1))
+
+def quaternion_from_matrix(matrix, out=None):
+    """ Quaternion from a 3x3 rotation or 4x4 homogeneous matrix; (..., 3, 3) -> (..., 4).
+
+    Same branches and sign as tf.transformations.quaternion_from_matrix, so results match tf
+    exactly rather than up to sign.
+    """
+    M = np.asarray(matrix, dtype=float)
+    m33 = M[..., 3, 3] if M.shape[-1] == 4 else 1.0
+    if M.ndim == 2:
+        m33 = float(m33)
+        R = M[:3, :3].tolist()
+        q = [0.0, 0.0, 0.0, 0.0]
+        t = R[0][0] + R[1][1] + R[2][2] + m33
+        if t > m33:
+            q[3] = t
+            q[2] = R[1][0] - R[0][1]
+            q[1] = R[0][2] - R[2][0]
+            q[0] = R[2][1] - R[1][2]
+        else:
+            i, j, k = 0, 1, 2
+            if R[1][1] > R[0][0]:
+                i, j, k = 1, 2, 0
+            if R[2][2] > R[i][i]:
+                i, j, k = 2, 0, 1
+            t = R[i][i] - (R[j][j] + R[k][k]) + m33
+            q[i] = t
+            q[j] = R[i][j] + R[j][i]
+            q[k] = R[k][i] + R[i][k]
+            q[3] = R[k][j] - R[j][k]
+        s = 0.5 / math.sqrt(t * m33)
+        return _join([v * s for v in q], out)
+
+    R = M[..., :3, :3]
+    m33 = np.broadcast_to(m33, R.shape[:-2])
+    d = np.diagonal(R, axis1=-2, axis2=-1)
+    t = d.sum(axis=-1) + m33
+    # Branch per matrix: 3 for the trace branch, else the index i of the largest diagonal, as tf picks it
+    i1 = (d[..., 1] > d[..., 0]).astype(int)
+    i = np.where(d[..., 2] > np.where(i1, d[..., 1], d[..., 0]), 2, i1)
+    branch = np.where(t > m33, 3, i)
+
+    if out is None:
+        out = np.empty(R.shape[:-2] + (4,))
+    sel = branch == 3
+    Rs = R[sel]
+    ts = t[sel]
+    out[sel] = np.stack((Rs[:, 2, 1] - Rs[:, 1, 2], Rs[:, 0, 2] - Rs[:, 2, 0], Rs[:, 1, 0] - Rs[:, 0, 1], ts),
+                        axis=-1) * (0.5 / np.sqrt(ts * m33[sel]))[:, None]
+    for i, j, k in _BRANCHES:
+        sel = branch == i
+        Rs = R[sel]
+        ts = Rs[:, i, i] - (Rs[:, j, j] + Rs[:, k, k]) + m33[sel]
+        q = np.empty((len(ts), 4))
+        q[:, i] = ts
+        q[:, j] = Rs[:, i, j] + Rs[:, j, i]
+        q[:, k] = Rs[:, k, i] + Rs[:, i, k]
+        q[:, 3] = Rs[:, k, j] - Rs[:, j, k]
+        out[sel] = q * (0.5 / np.sqrt(ts * m33[sel]))[:, None]
+    return out
+
+def quaternion_from_euler(ai, aj, ak, axes='sxyz', out=None):
+    """ Quaternion from Euler angles (radians); array angles broadcast to a (..., 4) stack. """
+    firstaxis, parity, repetition, frame = _axes(axes)
+    i = firstaxis
+    j = _NEXT_AXIS[i+parity]
+    k = _NEXT_AXIS[i-parity+1]
+    m = _Scalar if _is_scalar(ai, aj, ak) else _Array
+    if m is _Array:
+        ai, aj, ak = (np.asarray(a, dtype=float) for a in (ai, aj, ak))
+
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        aj = -aj
+    ai = ai / 2.0
+    aj = aj / 2.0
+    ak = ak / 2.0
+    ci, si = m.cos(ai), m.sin(ai)
+    cj, sj = m.cos(aj), m.sin(aj)
+    ck, sk = m.cos(ak), m.sin(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    q = [None] * 4
+    if repetition:
+        q[i] = cj*(cs + sc)
+        q[j] = sj*(cc + ss)
+        q[k] = sj*(cs - sc)
+        q[3] = cj*(cc - ss)
+    else:
+        q[i] = cj*sc - sj*cs
+        q[j] = cj*ss + sj*cc
+        q[k] = cj*cs - sj*sc
+        q[3] = cj*cc + sj*ss
+    if parity:
+        q[j] = -q[j]
+    if m is _Array:
+        q = np.broadcast_arrays(*q)
+    return _join(q, out)
+
+def euler_from_matrix(matrix, axes='sxyz'):
+    """ Euler angles (ax, ay, az) from a 3x3 or 4x4 rotation matrix; stacks give arrays of angles. """
+    firstaxis, parity, repetition, frame = _axes(axes)
+    i = firstaxis
+    j = _NEXT_AXIS[i+parity]
+    k = _NEXT_AXIS[i-parity+1]
+    M = np.asarray(matrix, dtype=float)
+    if M.ndim == 2:
+        M = M[:3, :3].tolist()
+        m = _Scalar
+        get = lambda a, b: M[a][b]
+    else:
+        m = _Array
+        get = lambda a, b: M[..., a, b]
+
+    if repetition:
+        sy = m.sqrt(get(i, j)*get(i, j) + get(i, k)*get(i, k))
+        regular = sy > _EPS
+        ax = m.where(regular, m.atan2(get(i, j), get(i, k)), m.atan2(-get(j, k), get(j, j)))
+        ay = m.atan2(sy, get(i, i))
+        az = m.where(regular, m.atan2(get(j, i), -get(k, i)), 0.0)
+    else:
+        cy = m.sqrt(get(i, i)*get(i, i) + get(j, i)*get(j, i))
+        regular = cy > _EPS
+        ax = m.where(regular, m.atan2(get(k, j), get(k, k)), m.atan2(-get(j, k), get(j, j)))
+        ay = m.atan2(-get(k, i), cy)
+        az = m.where(regular, m.atan2(get(j, i), get(i, i)), 0.0)
+
+    if parity:
+        ax, ay, az = -ax, -ay, -az
+    if frame:
+        ax, az = az, ax
+    return ax, ay, az
+
+def euler_from_quaternion(quaternion, axes='sxyz'):
+    """ Euler angles (ax, ay, az) from a quaternion or a (..., 4) stack. """
+    return euler_from_matrix(quaternion_matrix3(quaternion), axes)
+
+def quaternion_multiply(quaternion1, quaternion0, out=None):
+    """ Hamilton product quaternion1 * quaternion0 (apply quaternion0 first), as in tf. """
+    (x1, y1, z1, w1), m1 = _split(quaternion1)
+    (x0, y0, z0, w0), m0 = _split(quaternion0)
+    q = (w1*x0 + x1*w0 + y1*z0 - z1*y0,
+         w1*y0 - x1*z0 + y1*w0 + z1*x0,
+         w1*z0 + x1*y0 - y1*x0 + z1*w0,
+         w1*w0 - x1*x0 - y1*y0 - z1*z0)
+    if m1 is _Array or m0 is _Array:
+        q = np.broadcast_arrays(*q)
+    return _join(q, out)
+
+def quaternion_conjugate(quaternion, out=None):
+    (x, y, z, w), _ = _split(quaternion)
+    return _join((-x, -y, -z, w), out)
+
+def quaternion_inverse(quaternion, out=None):
+    (x, y, z, w), _ = _split(quaternion)
+    nq = x*x + y*y + z*z + w*w
+    return _join((-x/nq, -y/nq, -z/nq, w/nq), out)
+
+def quaternion_slerp(quat0, quat1, fraction, spin=0, shortestpath=True, out=None):
+    """ Spherical linear interpolation between unit quaternions, as tf.transformations.quaternion_slerp.
+
+    quat0, quat1 and fraction broadcast, e.g. (N, 4), (N, 4), (N,) for N interpolations at once.
+    """
+    q0, m0 = _split(quat0)
+    q1, m1 = _split(quat1)
+    if m0 is _Scalar and m1 is _Scalar and _is_scalar(fraction):
+        x0, y0, z0, w0 = q0
+        x1, y1, z1, w1 = q1
+        n0 = math.sqrt(x0*x0 + y0*y0 + z0*z0 + w0*w0)
+        n1 = math.sqrt(x1*x1 + y1*y1 + z1*z1 + w1*w1)
+        fraction = float(fraction)
+        if fraction == 1.0:
+            return _join((x1/n1, y1/n1, z1/n1, w1/n1), out)
+        d = (x0*x1 + y0*y1 + z0*z1 + w0*w1) / (n0*n1)
+        angle = 0.0
+        if fraction != 0.0 and abs(abs(d) - 1.0) >= _EPS:
+            if shortestpath and d < 0.0:
+                d = -d
+                n1 = -n1
+            angle = math.acos(min(d, 1.0)) + spin * math.pi
+        if abs(angle) < _EPS:
+            return _join((x0/n0, y0/n0, z0/n0, w0/n0), out)
+        isin = 1.0 / math.sin(angle)
+        a = math.sin((1.0 - fraction) * angle) * isin / n0
+        b = math.sin(fraction * angle) * isin / n1
+        return _join((a*x0 + b*x1, a*y0 + b*y1, a*z0 + b*z1, a*w0 + b*w1), out)
+
+    q0 = np.asarray(quat0, dtype=float)
+    q1 = np.asarray(quat1, dtype=float)
+    q0 = q0 / np.linalg.norm(q0, axis=-1, keepdims=True)
+    q1 = q1 / np.linalg.norm(q1, axis=-1, keepdims=True)
+    fraction = np.asarray(fraction, dtype=float)
+    d = np.sum(q0 * q1, axis=-1)
+    flip = (d < 0.0) if shortestpath else np.zeros(d.shape, dtype=bool)
+    d = np.where(flip, -d, d)
+    angle = np.arccos(np.clip(d, -1.0, 1.0)) + spin * np.pi
+    # Where tf returns q0 unchanged (parallel quaternions or no rotation), and the exact end points
+    keep0 = (np.abs(np.abs(d) - 1.0) < _EPS) | (np.abs(angle) < _EPS)
+    isin = 1.0 / np.sin(np.where(keep0, 1.0, angle))
+    a = np.sin((1.0 - fraction) * angle) * isin
+    b = np.where(flip, -1.0, 1.0) * np.sin(fraction * angle) * isin
+    q = a[..., None] * q0 + b[..., None] * q1
+    q = np.where(keep0[..., None], q0, q)
+    q = np.where((fraction == 1.0)[..., None], q1, q)
+    q = np.where((fraction == 0.0)[..., None], q0, q)
+    if out is None:
+        return q
+    out[...] = q
+    return out
@@ -3,35 +3,26 @@ import os
 import sys
 import time
 
-import pandas as pd
-
-import bagpy
-from bagpy import bagreader
-
-
 cur_path=os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, cur_path+"/..")
 
-from src.utility.map_range import map_range, torque_to_PWM
+from src.analysis.bag import load_bag
 
 import numpy as np
 import matplotlib.pyplot as plt
 
 if __name__ == '__main__':
     start_time = time.time() 
-    b = bagreader('dist/2023-01-24-18-34-05.bag')
-
-    # get the list of topics
-    # print(b.topic_table)
-    x = list(b.topics)[0]
-    print(f"Topic: {x}")
-
-    csvfiles = []
-    for t in b.topics:
-        data = b.message_by_topic(t)
-        csvfiles.append(data)
-
-    vel = pd.read_csv(csvfiles[0])
-    fig, ax = bagpy.create_fig(1)
-    ax[0].scatter(x='position.y', y='position.x', data=vel)
-    plt.show()
\ No newline at end of file
+    path = sys.argv[1] if len(sys.argv) > 1 else 'dist/2023-02-03-17-12-17.bag'
+    # Columns of the pose, desired position, fault and odometry topics, cached after the first run
+    topics = load_bag(path)
+    print(f"Loaded {path} in {time.time() - start_time:.3f} s")
+
+    pose = topics['/mavros/local_position/pose']
+    desired = topics['/desired_position']
+    fig, ax = plt.subplots(1)
+    ax.scatter(pose['y'], pose['x'], s=4, label='/mavros/local_position/pose')
+    ax.plot(desired['y'], desired['x'], 'r', label='/desired_position')
+    ax.set_aspect('equal')
+    ax.legend()
+    plt.show()
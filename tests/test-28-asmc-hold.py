@@ -21,9 +21,6 @@ import time
 # ROS python API
 import rospy
 
-import tf.transformations as transformations
-# from tf.transformations import euler_from_quaternion, quaternion_from_euler
-
 from std_msgs.msg import Float64, Bool
 # from std_msgs.msg import Float64MultiArray
 
@@ -38,7 +35,6 @@ from trajectory_msgs.msg import MultiDOFJointTrajectory as Mdjt
 
 
 import numpy as np
-from tf.transformations import *
 #import RPi.GPIO as GPIO
 
 
@@ -48,6 +44,7 @@ cur_path=os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, cur_path+"/..")
 
 from src.autopilot import DFAutopilot
+from src.utility.quaternion import quaternion_matrix3
                
 class Controller:
     # initialization method
@@ -276,13 +273,10 @@ class Controller:
 
     def geo_con_new(self):
 
-        pose = transformations.quaternion_matrix(  
-                numpy.array([self.cur_pose.pose.orientation.x, 
-                             self.cur_pose.pose.orientation.y, 
-                             self.cur_pose.pose.orientation.z, 
-                             self.cur_pose.pose.orientation.w]))  #4*4 matrix
-        pose_temp1 = np.delete(pose, -1, axis=1)
-        rot_curr = np.delete(pose_temp1, -1, axis=0)   #3*3 current rotation matrix
+        rot_curr = quaternion_matrix3([self.cur_pose.pose.orientation.x,
+                                       self.cur_pose.pose.orientation.y,
+                                       self.cur_pose.pose.orientation.z,
+                                       self.cur_pose.pose.orientation.w])   #3*3 current rotation matrix
 
         des_th = self.th_des()    
         rot_des = self.acc2quat(des_th, 0)   #desired yaw = 0
@@ -0,0 +1,98 @@
+"""
+Latency benchmark: per-motor set_servo (MAV_CMD_DO_SET_SERVO) vs batched set_servos (RC_CHANNELS_OVERRIDE).
+
+For every tick a new PWM pattern is written to all motors and two things are measured:
+    - send cost: time spent inside the DFAutopilot call(s) on this machine
+    - output latency: time until SERVO_OUTPUT_RAW reports the whole pattern on every motor
+      (this also captures the motor-to-motor skew of the per-motor path)
+
+How to run:
+1. mavproxy.py --master 127.0.0.1:14551 --out=udp:127.0.0.1:14552 --out=udp:127.0.0.1:14553 --out=udp:127.0.0.1:14554
+2. cd ~/df_ws/src/ardupilot/Tools/autotest
+python3 sim_vehicle.py -v ArduCopter -f hexa -m --mav10
+3. cd ~/df_ws/src/DroneForce/tests
+python3 test-29-set-servos-latency.py --motors 6
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot
+from src.utility.logger import *
+
+
+def run(commander, n_motors, ticks, batched):
+    target = [0] * n_motors
+    reached = threading.Event()
+
+    def servo_listener(_self, name, msg):
+        outputs = [getattr(msg, f'servo{i+1}_raw') for i in range(n_motors)]
+        if outputs == target:
+            reached.set()
+
+    commander.master.add_message_listener('SERVO_OUTPUT_RAW', servo_listener)
+    send_cost = []
+    latency = []
+    try:
+        for k in range(ticks):
+            # Alternate between two patterns so every tick is a visible change
+            base = 1300 if k % 2 == 0 else 1400
+            target[:] = [base + 10*i for i in range(n_motors)]
+            reached.clear()
+
+            t0 = time.perf_counter()
+            if batched:
+                commander.set_servos(target)
+            else:
+                i=1
+                for PWM in target:
+                    commander.set_servo(i, PWM)
+                    i = i+1
+            t1 = time.perf_counter()
+
+            if reached.wait(timeout=1.0):
+                latency.append(time.perf_counter() - t0)
+            send_cost.append(t1 - t0)
+    finally:
+        commander.master.remove_message_listener('SERVO_OUTPUT_RAW', servo_listener)
+    return np.array(send_cost), np.array(latency)
+
+
+def report(name, send_cost, latency, ticks):
+    print(f"{name}")
+    print(f"    send cost   mean {np.mean(send_cost)*1e6:9.1f} us   p99 {np.percentile(send_cost, 99)*1e6:9.1f} us")
+    if len(latency):
+        print(f"    output lat. mean {np.mean(latency)*1e3:9.2f} ms   p99 {np.percentile(latency, 99)*1e3:9.2f} ms   ({len(latency)}/{ticks} ticks observed)")
+    else:
+        print(f"    output lat. no SERVO_OUTPUT_RAW match observed")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare per-motor and batched actuator output latency.')
+    parser.add_argument('--connect', default='127.0.0.1:14554', help="Vehicle connection target string.")
+    parser.add_argument('--motors', type=int, default=4, help="Number of motors to drive.")
+    parser.add_argument('--ticks', type=int, default=200, help="Number of PWM patterns to send per path.")
+    args = parser.parse_args()
+
+    with DFAutopilot(connection_string=args.connect) as commander:
+        for i in range(1, args.motors+1):
+            commander.set_motor_mode(i, 1)
+
+        per_motor = run(commander, args.motors, args.ticks, batched=False)
+        batched = run(commander, args.motors, args.ticks, batched=True)
+
+        print(f"\n{args.motors} motors, {args.ticks} ticks")
+        report(f"set_servo x{args.motors} (COMMAND_LONG per motor)", *per_motor, args.ticks)
+        report("set_servos (one RC_CHANNELS_OVERRIDE)", *batched, args.ticks)
+
+        # Hand the motors back to ArduPilot (Motor1 = 33, ...)
+        for i in range(1, args.motors+1):
+            commander.set_motor_mode(i, 32+i)
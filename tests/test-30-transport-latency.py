@@ -0,0 +1,76 @@
+"""
+Round-trip latency of the DFAutopilot transports against a local UDP loopback stand-in.
+
+For each backend ('mavlink', 'dronekit') this measures:
+    - connect time: DFAutopilot(...) until it is ready to command the vehicle
+    - round trip: MAV_CMD_DO_SET_SERVO COMMAND_LONG until its COMMAND_ACK arrives
+
+No SITL is needed, src/utility/loopback.py plays the vehicle. The dronekit backend is skipped
+if dronekit is not installed.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-30-transport-latency.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+from pymavlink import mavutil
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot
+from src.utility.loopback import DFLoopbackAutopilot
+from src.utility.logger import *
+
+
+def round_trips(commander, n):
+    transport = commander.transport
+    rtt = []
+    for k in range(n):
+        msg = transport.mav.command_long_encode(
+                    0, 0,
+                    mavutil.mavlink.MAV_CMD_DO_SET_SERVO,
+                    0,
+                    1,
+                    1100 + k % 2 * 100,
+                    0,0,0,0,0
+                    )
+        t0 = time.perf_counter()
+        acks = transport.request([msg], 'COMMAND_ACK', [mavutil.mavlink.MAV_CMD_DO_SET_SERVO], lambda m: m.command, timeout=1.0)
+        if acks:
+            rtt.append(time.perf_counter() - t0)
+    return np.array(rtt)
+
+
+def bench(backend, port, n, extra_params):
+    with DFLoopbackAutopilot(f'udpout:127.0.0.1:{port}', extra_params=extra_params):
+        t0 = time.perf_counter()
+        try:
+            commander = DFAutopilot(f'127.0.0.1:{port}', transport=backend)
+        except ImportError as e:
+            print(f"{backend:9s} skipped ({e})")
+            return
+        connect = time.perf_counter() - t0
+        with commander:
+            rtt = round_trips(commander, n)
+        print(f"{backend:9s} connect {connect*1e3:8.1f} ms   "
+              f"rtt mean {np.mean(rtt)*1e6:8.1f} us   p50 {np.percentile(rtt, 50)*1e6:8.1f} us   "
+              f"p99 {np.percentile(rtt, 99)*1e6:8.1f} us   ({len(rtt)}/{n} acked)")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare DFAutopilot transport latency on a loopback stand-in.')
+    parser.add_argument('--port', type=int, default=14580, help="Local UDP port for the stand-in link.")
+    parser.add_argument('--count', type=int, default=500, help="Number of command round trips per backend.")
+    parser.add_argument('--params', type=int, default=800, help="Extra parameters the stand-in reports (ArduCopter has ~1000).")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bench('mavlink', args.port, args.count, args.params)
+    bench('dronekit', args.port + 1, args.count, args.params)
@@ -0,0 +1,89 @@
+"""
+Runs the asyncio control runtime (src/runtime.py) against the loopback stand-in and reports
+how well it holds the requested rate.
+
+Telemetry is ATTITUDE from the lean pymavlink transport, the controller is a stand-in
+P attitude loop through the Quad_X allocation, and actuation is a single set_servos per tick.
+Before that, a control step slower than the period (--overrun-ms) checks that a loop in sustained
+overrun still actuates and stops on time.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-31-runtime-loopback.py --rate 100
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot
+from src.dynamics.frame import DFFrame, Frames
+from src.runtime import DFControlRuntime
+from src.utility.loopback import DFLoopbackAutopilot
+from src.utility.map_range import torque_to_PWM
+from src.utility.logger import *
+
+
+def check_overrun(rate, step_ms, duration=0.5):
+    ''' Every tick late: sense / actuate still have to run and run(duration) has to return. '''
+    actuated = []
+
+    def control(state, dt):
+        time.sleep(step_ms / 1e3)
+        return state
+
+    runtime = DFControlRuntime(lambda: 0, control, actuated.append, rate=rate)
+    start = time.perf_counter()
+    stats = runtime.run(duration=duration)
+    elapsed = time.perf_counter() - start
+    assert actuated, 'nothing actuated while overrunning'
+    assert elapsed < duration + 0.5, f'overrunning loop took {elapsed:.2f} s to stop'
+    print(f"{step_ms:.0f} ms step at {rate:.0f} Hz: stopped after {elapsed:.2f} s, {len(actuated)} actuated, "
+          f"{stats['overruns']} overruns, {stats['skipped']} skipped")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Hold a control rate with the asyncio runtime on a loopback link.')
+    parser.add_argument('--port', type=int, default=14582, help="Local UDP port for the stand-in link.")
+    parser.add_argument('--rate', type=float, default=100, help="Control rate in Hz.")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds to run.")
+    parser.add_argument('--overrun-ms', type=float, default=12, help="Control step time of the overrun check (ms).")
+    args = parser.parse_args()
+
+    check_overrun(args.rate, args.overrun_ms)
+
+    frame = DFFrame(frame_type=Frames.Quad_X)
+    Kp = np.array([0.5, 0.5, 0.2])
+
+    with DFLoopbackAutopilot(f'udpout:127.0.0.1:{args.port}', rate=50):
+        with DFAutopilot(f'127.0.0.1:{args.port}', transport='mavlink') as commander:
+            commander.configure_motors({1: 1, 2: 1, 3: 1, 4: 1})
+            attitude = {}
+
+            def attitude_listener(_self, name, msg):
+                attitude['rpy'] = np.array([msg.roll, msg.pitch, msg.yaw])
+
+            commander.transport.add_listener('ATTITUDE', attitude_listener)
+
+            def sense():
+                commander.transport.poll()
+                return attitude.pop('rpy', None)
+
+            def control(rpy, dt):
+                Torq = np.append(-Kp*rpy, 0.5)
+                u_input = np.matmul(frame.CA_inv, Torq)
+                return [torque_to_PWM(input, None) for input in u_input]
+
+            runtime = DFControlRuntime(sense, control, commander.set_servos, rate=args.rate)
+            stats = runtime.run(duration=args.duration)
+
+            expected = int(args.rate * args.duration)
+            print(f"rate {args.rate:.0f} Hz for {args.duration:.0f} s: {stats['ticks']}/{expected} ticks, "
+                  f"{stats['overruns']} overruns, {stats['skipped']} skipped, max late {stats['max_late_ms']:.2f} ms")
+            commander.configure_motors({1: 33, 2: 34, 3: 35, 4: 36})
@@ -0,0 +1,69 @@
+"""
+Microbenchmark: scalar torque_to_PWM loop vs vectorized torques_to_pwm.
+
+The scalar path is the one used in the controller scripts (one call per motor, appended to
+a list); torques_to_pwm writes a whole motor vector, or a batch of them, into a preallocated
+int16 buffer, rounding instead of truncating (so PWMs differ by at most 1). The 4 and 6 motor
+rows are the per-tick shapes of the controllers and src/pipeline.py.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-32-torques-to-pwm.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.utility.map_range import torque_to_PWM, torques_to_pwm, TORQUE_PWM_LIMITS
+
+
+def scalar_path(u_input):
+    PWM_out_values = []
+    for input in u_input:
+        PWM = torque_to_PWM(input, None)
+        PWM_out_values.append(PWM)
+    return PWM_out_values
+
+
+def interleaved(fns, number, repeat=7):
+    ''' Best time per call of each function, alternating between them so load spikes hit all. '''
+    best = [float('inf')] * len(fns)
+    for _ in range(repeat):
+        for k, fn in enumerate(fns):
+            best[k] = min(best[k], timeit.timeit(fn, number=number) / number)
+    return best
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    repeat = 20000
+
+    for n in (4, 6):
+        u = rng.uniform(-12, 12, n)
+        out = np.empty(n, dtype=np.int16)
+        work = np.empty(n)
+        pwm = torques_to_pwm(u, out=out, work=work)
+        fromMin, fromMax, toMin, toMax = TORQUE_PWM_LIMITS
+        assert list(pwm) == [round(toMin + (min(max(x, fromMin), fromMax) - fromMin) / (fromMax - fromMin) * (toMax - toMin)) for x in u]
+        assert np.abs(pwm - np.array(scalar_path(u))).max() <= 1
+        assert (torques_to_pwm(u[None, :]) == pwm).all(), 'per-tick and batch paths disagree'
+
+        t_scalar, t_vector = interleaved([lambda: scalar_path(u), lambda: torques_to_pwm(u, out=out, work=work)], repeat)
+        print(f"{n} motors      scalar {t_scalar*1e6:7.2f} us   vectorized {t_vector*1e6:7.2f} us   x{t_scalar/t_vector:5.1f}")
+
+    # A batch of motor vectors with per-motor ranges (e.g. a weaker motor 1)
+    batch, n = 10000, 6
+    u = rng.uniform(-12, 12, (batch, n))
+    fromMin, fromMax, toMin, toMax = TORQUE_PWM_LIMITS
+    limits = (np.full(n, fromMin), np.full(n, fromMax), np.full(n, toMin), np.array([1800] + [toMax]*(n-1)))
+    out = np.empty((batch, n), dtype=np.int16)
+    work = np.empty((batch, n))
+    t_scalar = min(timeit.repeat(lambda: [scalar_path(row) for row in u], number=1, repeat=3))
+    t_vector = min(timeit.repeat(lambda: torques_to_pwm(u, limits, out=out, work=work), number=1, repeat=3))
+    print(f"{batch}x{n} batch  scalar {t_scalar*1e3:7.2f} ms   vectorized {t_vector*1e3:7.2f} ms   x{t_scalar/t_vector:5.1f}")
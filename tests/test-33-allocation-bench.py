@@ -0,0 +1,142 @@
+"""
+Benchmark: clipped pseudo-inverse allocation vs bounded WLS allocation (src/dynamics/allocation.py).
+
+A saturating roll/pitch/yaw/thrust command sequence is allocated on Quad_X and Hexa_X (healthy
+and with motor 1 dead). For each we report the time per call against the 10 ms budget and the
+RMS error between the commanded and the achieved roll/pitch and yaw.
+
+First the precomputed failure tables (DFFrame(max_failed=2)) are checked: for every subset of
+failed motors whose remaining effectiveness still has full rank, CA @ CA_inv reproduces the command.
+Failing motors on one frame must not show up on another frame of the same type, and a
+loss-of-effectiveness update close to singular has to keep the allocation exact.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-33-allocation-bench.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics.allocation import DFAllocator
+from src.dynamics.frame import DFFrame, Frames
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+
+
+def commands(n_ticks, rate=100):
+    # Aggressive roll/pitch manoeuvre with a large yaw demand on top of hover thrust
+    t = np.arange(n_ticks) / rate
+    return np.stack([
+        1.2*np.sin(2*np.pi*0.5*t),
+        1.2*np.cos(2*np.pi*0.3*t),
+        0.9*np.sin(2*np.pi*0.2*t),
+        0.6 + 0.5*np.sin(2*np.pi*0.1*t),
+    ], axis=1)
+
+
+def check_failure_tables(name, frame_type, v_seq, max_failed=2):
+    ''' B_f @ CA_inv @ v == v for every feasible k-motor-out subset of the precomputed tables,
+    B_f being the nominal effectiveness with the failed motors' columns zeroed. '''
+    frame = DFFrame(frame_type=frame_type, max_failed=max_failed)
+    B = np.linalg.pinv(np.array(frame.nominal_EA(), dtype=float))
+    feasible = 0
+    for mask, row in enumerate(frame.failure_index):
+        if row < 0:
+            continue
+        B_f = B * np.array([not mask >> i & 1 for i in range(len(frame.motors))])
+        if np.linalg.matrix_rank(B_f) < 4:
+            continue
+        feasible += 1
+        achieved = (B_f @ frame.CA_inv_table[row] @ v_seq.T).T
+        assert np.allclose(achieved, v_seq, atol=1e-4), f'{name}: failure table misses the command'
+    print(f"{name}: {feasible}/{len(frame.CA_table)} failure subsets (up to {max_failed} out) reach every command")
+
+
+def check_independent_frames(frame_type):
+    ''' Failing motors on one frame leaves another frame of the same type (and Frames) untouched. '''
+    failed = DFFrame(frame_type=frame_type, max_failed=1)
+    healthy = DFFrame(frame_type=frame_type)
+    failed.set_failed_motors([1])
+    failed.set_effectiveness(2, 0.0)
+    failed.inject_fault(3)
+    assert failed.failed == {1, 2, 3} and healthy.failed == frozenset()
+    assert not any(getattr(motor, 'faulty', False) for motor in frame_type.value)
+    assert np.array_equal(healthy.CA_inv, DFFrame(frame_type=frame_type).CA_inv)
+    failed.eliminate_fault(3)
+    failed.set_effectiveness(2, 1.0)
+    assert failed.failed == {1}
+    print(f"{frame_type.name}: failed motors are kept per frame, Frames.{frame_type.name} is not modified")
+
+
+def check_near_singular_update(frame_type, eta=1e-4):
+    ''' Degrading a motor the frame can barely do without takes the gram_inverse() fallback: M_inv
+    matches a fresh inverse, and restoring the motor gives back the nominal allocation. '''
+    frame = DFFrame(frame_type=frame_type)
+    nominal = frame.CA_inv.copy()
+    frame.set_effectiveness(1, eta)
+    reference = frame.gram_inverse()
+    assert np.allclose(frame.M_inv, reference, rtol=1e-12, atol=0), 'M_inv drifted on a near-singular update'
+    assert np.allclose(frame.CA @ frame.CA_inv, np.eye(4), atol=1e-3)
+    frame.set_effectiveness(1, 1.0)
+    assert np.array_equal(frame.CA_inv, nominal)
+    for bad in (np.nan, np.inf, [0.5, 0.5], np.ones((1, 1))):
+        try:
+            frame.set_effectiveness(1, bad)
+        except ValueError:
+            continue
+        raise AssertionError(f'set_effectiveness accepted eta={bad!r}')
+    print(f"{frame_type.name}: near-singular update (eta {eta:g}) recomputes M_inv, bad eta rejected")
+
+
+def run(name, frame, v_seq):
+    allocator = DFAllocator.from_frame(frame, limits=LIMITS)
+    u_min, u_max = allocator.u_min, allocator.u_max
+
+    clip_err = []
+    for v in v_seq:
+        u = np.clip(np.matmul(frame.CA_inv, v), u_min, u_max)
+        clip_err.append(frame.CA @ u - v)
+
+    wls_err = []
+    times = []
+    iterations = []
+    for v in v_seq:
+        t0 = time.perf_counter()
+        u = allocator.allocate(v)
+        times.append(time.perf_counter() - t0)
+        iterations.append(allocator.iterations)
+        wls_err.append(frame.CA @ u - v)
+
+    clip_err = np.array(clip_err)
+    wls_err = np.array(wls_err)
+    times = np.array(times)
+    rms = lambda e: np.sqrt(np.mean(e**2))
+    print(f"{name}")
+    print(f"    clipped pinv  roll/pitch rms {rms(clip_err[:, :2]):.4f}   yaw rms {rms(clip_err[:, 2]):.4f}   thrust rms {rms(clip_err[:, 3]):.4f}")
+    print(f"    bounded WLS   roll/pitch rms {rms(wls_err[:, :2]):.4f}   yaw rms {rms(wls_err[:, 2]):.4f}   thrust rms {rms(wls_err[:, 3]):.4f}")
+    print(f"    WLS time mean {np.mean(times)*1e6:7.1f} us  p99 {np.percentile(times, 99)*1e6:7.1f} us  "
+          f"max {np.max(times)*1e6:7.1f} us  (budget 10000 us)   iterations mean {np.mean(iterations):.2f} max {np.max(iterations)}")
+
+
+if __name__ == '__main__':
+    v_seq = commands(3000)
+
+    check_failure_tables("Quad_X", Frames.Quad_X, v_seq)
+    check_failure_tables("Hexa_X", Frames.Hexa_X, v_seq)
+    check_independent_frames(Frames.Hexa_X)
+    check_near_singular_update(Frames.Quad_X)
+
+    run("Quad_X", DFFrame(frame_type=Frames.Quad_X), v_seq)
+    run("Hexa_X", DFFrame(frame_type=Frames.Hexa_X), v_seq)
+
+    hexa = DFFrame(frame_type=Frames.Hexa_X, max_failed=1)
+    hexa.set_failed_motors([1])
+    run("Hexa_X, motor 1 failed", hexa, v_seq)
@@ -0,0 +1,87 @@
+"""
+Closed-loop PID (or --controller asmc) flight against the headless simulator (src/dynamics/simulator.py), no SITL,
+Gazebo or mavros needed.
+
+Same loop as test-26-pid-hold.py: PID -> Torq -> CA_inv mixer -> torque_to_PWM (-2..2) -> PWM,
+with motor 1 optionally losing effectiveness (--fault-time).
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-34-sim-pid-hold.py --rate 30 --duration 60
+python3 test-34-sim-pid-hold.py --fault-time 30 --log /tmp/hold.dflog   # record every tick (src/flightlog.py)
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.inertia import DFInertia
+from src.dynamics.mass import DFMass
+from src.dynamics.simulator import DFSimulator
+from src.dynamics.state import POS, make_state, make_setpoint
+from src.flightlog import DFLogWriter
+from src.sweep import CONTROLLERS
+from src.utility.map_range import torques_to_pwm
+from src.utility.logger import *
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fly a ROS-free controller against the headless simulator.')
+    parser.add_argument('--controller', default='pid', choices=sorted(CONTROLLERS))
+    parser.add_argument('--rate', type=float, default=30, help="Control rate in Hz.")
+    parser.add_argument('--duration', type=float, default=60, help="Simulated seconds.")
+    parser.add_argument('--fault-time', type=float, default=None, help="Time at which motor 1 loses effectiveness (off by default).")
+    parser.add_argument('--eff', type=float, default=0.85, help="Effectiveness of motor 1 after the fault.")
+    parser.add_argument('--log', default=None, help="Record every control tick to this flight log file.")
+    args = parser.parse_args()
+
+    frame = DFFrame(frame_type=Frames.Quad_X)
+    sim = DFSimulator(frame, DFMass(1.5), DFInertia(0.029, 0.029, 0.055), state=make_state(pos=(0, 0, 3.0)))
+    cnt = CONTROLLERS[args.controller]()
+
+    setpoint = make_setpoint(pos=(0.0, 0.0, 3.0))
+    dt = 1.0 / args.rate
+    pwm = np.empty(len(frame.motors), dtype=np.int16)
+    errors = []
+    log = None
+    if args.log:
+        log = DFLogWriter(args.log, len(frame.motors), meta={'script': os.path.basename(__file__), 'controller': args.controller,
+                                                            'rate': args.rate, 'fault_time': args.fault_time, 'eff': args.eff})
+
+    start_time = time.perf_counter()
+    while sim.t < args.duration:
+        if sim.t > 10:
+            setpoint[0:3] = (2.0, 1.0, 4.0)
+        fault = bool(args.fault_time) and sim.t >= args.fault_time
+        if fault:
+            sim.set_effectiveness(1, args.eff)
+
+        th_cmd, torq_cmd = cnt.step(sim.state, setpoint, dt)
+        Torq = [torq_cmd[0], torq_cmd[1], torq_cmd[2], th_cmd]
+        u_input = np.matmul(frame.CA_inv, Torq)
+        torques_to_pwm(u_input, LIMITS, out=pwm)
+        if log is not None:
+            log.append(sim.t, sim.state, setpoint, th_cmd, torq_cmd, u_input, pwm, fault)
+        sim.step(pwm, dt)
+        errors.append(np.linalg.norm(sim.state[POS] - setpoint[0:3]))
+    wall = time.perf_counter() - start_time
+    if log is not None:
+        log.close()
+
+    errors = np.array(errors)
+    settled = errors[int(20*args.rate):]
+    print(f"final position {np.round(sim.state[POS], 3)}  setpoint {setpoint[0:3]}")
+    print(f"position error after 20 s: rms {np.sqrt(np.mean(settled**2)):.3f} m  max {np.max(settled):.3f} m")
+    print(f"{args.duration:.0f} s simulated in {wall:.2f} s wall ({args.duration/wall:.1f}x real time)")
+    if log is not None:
+        print(f"{log.n} ticks logged to {args.log}")
@@ -0,0 +1,123 @@
+"""
+Monte Carlo fault/wind sweep with the batched simulator (src/dynamics/batch_simulator.py).
+
+N vehicles hold a position with the PID controller while each one gets its own fault time,
+faulty motor, loss-of-effectiveness level and wind. Control, allocation (CA_inv mixer) and
+dynamics are one NumPy call per step for the whole batch. Reports runs per second as N scales,
+against the one-vehicle-at-a-time DFSimulator, and how many runs stayed within --tolerance.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-35-batch-montecarlo.py --sizes 1 10 100 1000 4000 --duration 10
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.controller.pid_controller import PID_Controller, PID_BatchController
+from src.dynamics.batch_simulator import DFBatchSimulator
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.inertia import DFInertia
+from src.dynamics.mass import DFMass
+from src.dynamics.simulator import DFSimulator
+from src.dynamics.state import POS, make_state, make_setpoint
+from src.utility.map_range import torques_to_pwm
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+
+
+def scenarios(N, n_motors, duration, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'fault_time': rng.uniform(0.2, 0.8, N) * duration,
+        'fault_motor': rng.integers(1, n_motors+1, N),
+        'fault_eta': rng.uniform(0.5, 1.0, N),
+        'wind': rng.normal(0.0, 2.0, (N, 3)) * np.array([1, 1, 0.2]),
+    }
+
+
+def vehicle_mass(frame):
+    # 1.5 kg on Quad_X, scaled with the motor count so every frame hovers at the scripts' thrust constant
+    return DFMass(0.375 * len(frame.motors))
+
+
+def run_batch(frame, N, duration, rate, sc):
+    start = make_state(pos=(0, 0, 3.0))
+    setpoint = make_setpoint(pos=(0, 0, 3.0))
+    sim = DFBatchSimulator(frame, vehicle_mass(frame), DFInertia(0.029, 0.029, 0.055), N, states=start)
+    sim.wind[:] = sc['wind']
+    sim.set_faults(sc['fault_time'], sc['fault_motor'], sc['fault_eta'])
+    cnt = PID_BatchController(N)
+
+    dt = 1.0 / rate
+    states = np.empty((N, 13))
+    Torq = np.empty((N, 4))
+    pwm = np.empty((N, len(frame.motors)), dtype=np.int16)
+    max_err = np.zeros(N)
+    for _ in range(int(round(duration * rate))):
+        th_cmd, torq_cmd = cnt.step(sim.states(states), setpoint, dt)
+        Torq[:, :3] = torq_cmd
+        Torq[:, 3] = th_cmd
+        torques_to_pwm(Torq @ frame.CA_inv.T, LIMITS, out=pwm)
+        sim.step(pwm, dt)
+        np.maximum(max_err, np.linalg.norm(sim.pos - setpoint[0:3], axis=1), out=max_err)
+    return max_err
+
+
+def run_serial(frame, N, duration, rate, sc):
+    setpoint = make_setpoint(pos=(0, 0, 3.0))
+    dt = 1.0 / rate
+    pwm = np.empty(len(frame.motors), dtype=np.int16)
+    max_err = np.zeros(N)
+    for i in range(N):
+        sim = DFSimulator(frame, vehicle_mass(frame), DFInertia(0.029, 0.029, 0.055), state=make_state(pos=(0, 0, 3.0)))
+        sim.wind[:] = sc['wind'][i]
+        cnt = PID_Controller()
+        for _ in range(int(round(duration * rate))):
+            if sim.t >= sc['fault_time'][i]:
+                sim.set_effectiveness(sc['fault_motor'][i], sc['fault_eta'][i])
+            th_cmd, torq_cmd = cnt.step(sim.state, setpoint, dt)
+            torques_to_pwm(frame.CA_inv @ [torq_cmd[0], torq_cmd[1], torq_cmd[2], th_cmd], LIMITS, out=pwm)
+            sim.step(pwm, dt)
+            max_err[i] = max(max_err[i], np.linalg.norm(sim.state[POS] - setpoint[0:3]))
+    return max_err
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(description='Batched Monte Carlo fault/wind sweep.')
+    parser.add_argument('--frame', default='Hexa_X', choices=[f.name for f in Frames])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 4000])
+    parser.add_argument('--serial', type=int, default=4, help="Runs for the one-at-a-time reference.")
+    parser.add_argument('--duration', type=float, default=10, help="Simulated seconds per run.")
+    parser.add_argument('--rate', type=float, default=30, help="Control rate in Hz.")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="Max position error of a passing run (m).")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    frame = DFFrame(frame_type=Frames[args.frame])
+    n_motors = len(frame.motors)
+
+    if args.serial:
+        sc = scenarios(args.serial, n_motors, args.duration)
+        t0 = time.perf_counter()
+        run_serial(frame, args.serial, args.duration, args.rate, sc)
+        wall = time.perf_counter() - t0
+        print(f"serial DFSimulator   N={args.serial:5d}  {wall:7.2f} s  {args.serial/wall:8.2f} runs/s")
+
+    for N in args.sizes:
+        sc = scenarios(N, n_motors, args.duration)
+        t0 = time.perf_counter()
+        max_err = run_batch(frame, N, args.duration, args.rate, sc)
+        wall = time.perf_counter() - t0
+        ok = np.count_nonzero(max_err < args.tolerance)
+        print(f"DFBatchSimulator     N={N:5d}  {wall:7.2f} s  {N/wall:8.2f} runs/s  "
+              f"within {args.tolerance} m: {ok}/{N}")
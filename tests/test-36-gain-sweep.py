@@ -0,0 +1,67 @@
+"""
+Gain sweep for the ROS-free controllers against the headless simulator (src/sweep.py).
+
+Spreads a grid (or random samples) of gains over a process pool and prints the configurations
+ranked by tracking error. Results are checkpointed to --out: rerun the same command after a crash
+or Ctrl-C and only the missing configurations are flown.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-36-gain-sweep.py --out sweep-pid.npz
+python3 test-36-gain-sweep.py --random 64 --fault 10 1 0.85 --out sweep-pid-fault.npz
+python3 test-36-gain-sweep.py --controller asmc --out sweep-asmc.npz
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.sweep import DFSweepRunner, grid, random_samples
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(description='Parallel controller gain sweep.')
+    parser.add_argument('--controller', default='pid', choices=['pid', 'asmc'])
+    parser.add_argument('--frame', default='Quad_X')
+    parser.add_argument('--random', type=int, default=0, help="Number of random samples instead of the grid.")
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--rate', type=float, default=30)
+    parser.add_argument('--fault', type=float, nargs=3, metavar=('TIME', 'MOTOR', 'EFF'), default=None)
+    parser.add_argument('--wind', type=float, nargs=3, default=(0.0, 0.0, 0.0))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default=None, help="Checkpoint file (.npz) for resuming.")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.controller == 'asmc':
+        if args.random:
+            configs = random_samples(args.random, Lam=([0.5, 0.5, 2], [2, 2, 8]), Phi=([0.5]*3, [1.5]*3),
+                                     Lam_q=([1]*3, [4]*3), Phi_q=([1]*3, [2]*3))
+        else:
+            configs = grid(Lam=[[0.95, 0.95, 5.0], [1.5, 1.5, 5.0]], Phi=[[1.0, 1.0, 1.1], [1.5, 1.5, 1.1]],
+                           Lam_q=[[2.0]*3, [3.0]*3], alpha_0_=[1.0, 10.0])
+    elif args.random:
+        configs = random_samples(args.random, kPos=([0.5, 0.5, 8], [3, 3, 24]), kVel=([0.5]*3, [3]*3),
+                                 kPos_q=([2, 2, 0.5], [8, 8, 2]))
+    else:
+        configs = grid(kPos=[[1, 1, 16], [2, 2, 16]], kVel=[[0.5]*3, [1]*3, [2]*3],
+                       kPos_q=[[4, 4, 1], [6, 6, 1]], kInt=[[0.01]*3, [0.1]*3])
+
+    fault = None if args.fault is None else (args.fault[0], int(args.fault[1]), args.fault[2])
+    runner = DFSweepRunner(configs, controller=args.controller, path=args.out, processes=args.processes,
+                           frame=args.frame, duration=args.duration, rate=args.rate, fault=fault,
+                           wind=list(args.wind))
+    print(f"{len(configs)} configurations, {np.count_nonzero(runner.done)} already done")
+    t0 = time.perf_counter()
+    runner.run()
+    wall = time.perf_counter() - t0
+    print(f"finished in {wall:.1f} s on {args.processes or os.cpu_count()} processes\n")
+    print(runner.table(top=args.top))
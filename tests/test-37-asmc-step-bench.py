@@ -0,0 +1,214 @@
+"""
+Benchmark: library ASMC_Controller.step (src/controller/asmc_controller.py) vs the per-tick code
+copied between test-20 ... test-28 (rospy/tf removed, otherwise as in test-28-asmc-hold.py).
+
+Both controllers are fed the same states from a closed-loop flight in the headless simulator;
+we check that their thrust and moment outputs agree and report the microseconds per step.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-37-asmc-step-bench.py --ticks 20000
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.controller.asmc_controller import ASMC_Controller
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.inertia import DFInertia
+from src.dynamics.mass import DFMass
+from src.dynamics.simulator import DFSimulator
+from src.dynamics.kinematics import quat_to_rot
+from src.dynamics.state import make_state, make_setpoint
+from src.utility.map_range import torques_to_pwm
+
+# Torque to PWM range used by the controller scripts
+LIMITS = (-2, 2, 1000, 2000)
+
+
+class ScriptASMC:
+    """ test-28-asmc-hold.py Controller.th_des/geo_con_new/moment_des, reading arrays instead of ROS messages. """
+    def __init__(self):
+        self.Kp0_ = 0.1
+        self.Kp1_ = 0.1
+        self.alpha_0_ = 10.0
+        self.alpha_1_ = 10.0
+        self.Lam = np.array([0.95, 0.95, 5.0])
+        self.Phi = np.array([1.0, 1.0, 1.1])
+        self.M = 0.5
+        self.alpha_m = 0.01
+        self.norm_thrust_const = 0.06
+        self.max_th = 18.0
+        self.max_throttle = 0.95
+        self.Kp0_q_ = 0.1
+        self.Kp1_q_ = 0.1
+        self.Kp2_q_ = 0.1
+        self.alpha_0_q_ = 1
+        self.alpha_1_q_ = 1
+        self.alpha_2_q_ = 1
+        self.Lam_q = np.array([2.0, 2.0, 2.0])
+        self.Phi_q = np.array([1.5, 1.5, 1.5])
+        self.norm_moment_const = 0.05
+        self.max_mom = 10
+        self.max_mom_throttle = 0.5
+        self.epsilon = 0.001
+        self.epsilon_q = 0.01
+        self.kPos_q = np.array([4.0, 4.0, 1.0])
+        self.kVel_q = np.array([1.0, 1.0, 1.0])
+        self.kInt_q = np.array([0.01, 0.01, 0.01])
+        self.errInt_q = np.zeros(3)
+        self.gravity = np.array([0, 0, 9.8])
+        self.armed = True
+
+    def th_des(self, state, setpoint, dt):
+        dt = min(dt, 0.02)
+        errPos = state[0:3] - setpoint[0:3]
+        errVel = state[3:6] - setpoint[3:6]
+        sv = errVel + np.multiply(self.Phi, errPos)
+        zi = np.concatenate([errPos, errVel])
+        zi_norm = np.linalg.norm(zi)
+        sv_norm = np.linalg.norm(sv)
+        if zi_norm > 5:
+            zi_norm = 5
+        if self.armed:
+            self.Kp0_ += (sv_norm - (self.alpha_0_*self.Kp0_))*dt
+            self.Kp1_ += (sv_norm*zi_norm - (self.alpha_1_*self.Kp1_))*dt
+            self.Kp0_ = np.maximum(self.Kp0_, 0.0001)
+            self.Kp1_ = np.maximum(self.Kp1_, 0.0001)
+            self.M += (-sv[2] - self.alpha_m*self.M)*dt
+            self.M = np.maximum(self.M, 0.1)
+        Rho = self.Kp0_ + self.Kp1_*zi_norm
+        delTau = np.zeros(3)
+        if(sv_norm >= self.epsilon):
+            delTau = np.multiply(Rho, sv)/sv_norm
+        if(sv_norm < self.epsilon):
+            delTau = np.multiply(Rho, sv)/self.epsilon
+        des_th = -np.multiply(self.Lam, sv) - np.array([0.1, 0.1, 0.1])*(delTau*Rho) + self.M*self.gravity
+        if np.linalg.norm(des_th) > self.max_th:
+            des_th = (self.max_th/np.linalg.norm(des_th))*des_th
+        return des_th
+
+    def acc2quat(self, des_th, des_yaw):
+        proj_xb_des = np.array([np.cos(des_yaw), np.sin(des_yaw), 0.0])
+        if np.linalg.norm(des_th) == 0.0:
+            zb_des = np.array([0,0,1])
+        else:
+            zb_des = des_th / np.linalg.norm(des_th)
+        yb_des = np.cross(zb_des, proj_xb_des) / np.linalg.norm(np.cross(zb_des, proj_xb_des))
+        xb_des = np.cross(yb_des, zb_des) / np.linalg.norm(np.cross(yb_des, zb_des))
+        return np.transpose(np.array([xb_des, yb_des, zb_des]))
+
+    def geo_con_new(self, state, setpoint, dt):
+        rot_curr = quat_to_rot(state[6:10], np.empty((3, 3)))
+        des_th = self.th_des(state, setpoint, dt)
+        rot_des = self.acc2quat(des_th, 0)
+        zb = rot_des[:,2]
+        thrust = self.norm_thrust_const * des_th.dot(zb)
+        thrust = np.maximum(0.0, np.minimum(thrust, self.max_throttle))
+        angle_error_matrix = 0.5* (np.dot(np.transpose(rot_des), rot_curr) -
+                                    np.dot(np.transpose(rot_curr), rot_des) )
+        self.euler_err = np.array([-angle_error_matrix[1,2], -angle_error_matrix[0,2], angle_error_matrix[0,1]])
+        self.des_q_dot = np.array([0 ,0, 0])
+        des_euler_rate = np.dot(np.multiply(np.transpose(rot_des), rot_curr), self.des_q_dot)
+        curr_euler_rate = np.array([state[10], -state[11], -state[12]])
+        self.euler_rate_err = curr_euler_rate - des_euler_rate
+        self.th_cmd = thrust
+
+    def moment_des(self, state, setpoint, dt):
+        self.geo_con_new(state, setpoint, dt)
+        dt = min(dt, 0.04)
+        sv_q = self.euler_rate_err + np.multiply(self.Phi_q, self.euler_err)
+        zi_q = np.concatenate([self.euler_err, self.euler_rate_err])
+        zi_norm_q = np.linalg.norm(zi_q)
+        sv_norm_q = np.linalg.norm(sv_q)
+        if zi_norm_q > 5:
+            zi_norm_q = 5
+        if self.armed:
+            self.Kp0_q_ += (sv_norm_q - (self.alpha_0_q_*self.Kp0_q_))*dt
+            self.Kp1_q_ += (sv_norm_q*zi_norm_q - (self.alpha_1_q_*self.Kp1_q_))*dt
+            self.Kp2_q_ += (sv_norm_q*np.power(zi_norm_q, 2) - (self.alpha_2_q_*self.Kp2_q_))*dt
+            self.Kp0_q_ = np.maximum(self.Kp0_q_, 0.0001)
+            self.Kp1_q_ = np.maximum(self.Kp1_q_, 0.0001)
+            self.Kp2_q_ = np.maximum(self.Kp2_q_, 0.0001)
+            self.M += (-sv_q[2] - self.alpha_m*self.M)*dt
+            self.M = np.maximum(self.M, 0.1)
+        Rho_q = self.Kp0_q_ + self.Kp1_q_*zi_norm_q + self.Kp2_q_*zi_norm_q
+        delTau_q = np.zeros(3)
+        if(sv_norm_q >= self.epsilon_q):
+            delTau_q = np.multiply(Rho_q, sv_q)/sv_norm_q
+        if(sv_norm_q < self.epsilon_q):
+            delTau_q = np.multiply(Rho_q, sv_q)/self.epsilon_q
+        # PID inner, computed and discarded like in the script
+        self.errInt_q += self.euler_err*dt
+        des_mom = -(self.kPos_q*self.euler_err) - (self.kVel_q*self.euler_rate_err) - (self.kInt_q*self.errInt_q)
+        if np.linalg.norm(des_mom) > self.max_mom:
+            des_mom = (self.max_mom/np.linalg.norm(des_mom))*des_mom
+        des_mom = self.norm_moment_const * des_mom
+        moment = np.maximum(-self.max_mom_throttle, np.minimum(des_mom, self.max_mom_throttle))
+        des_mom_asmc = - np.multiply(self.Lam_q, sv_q) - np.array([0.1, 0.1, 0.1])*(delTau_q*Rho_q)
+        if np.linalg.norm(des_mom_asmc) > self.max_mom:
+            des_mom_asmc = (self.max_mom/np.linalg.norm(des_mom_asmc))*des_mom_asmc
+        des_mom_asmc = self.norm_moment_const * des_mom_asmc
+        self.torq_cmd = np.maximum(-self.max_mom_throttle, np.minimum(des_mom_asmc, self.max_mom_throttle))
+
+    def step(self, state, setpoint, dt):
+        self.moment_des(state, setpoint, dt)
+        return self.th_cmd, self.torq_cmd
+
+
+def record_states(n_ticks, rate):
+    ''' Closed-loop ASMC flight with setpoint steps: the states and setpoints each tick saw. '''
+    frame = DFFrame(frame_type=Frames.Quad_X)
+    sim = DFSimulator(frame, DFMass(1.5), DFInertia(0.029, 0.029, 0.055), state=make_state(pos=(0, 0, 3.0)))
+    cnt = ASMC_Controller()
+    rng = np.random.default_rng(0)
+    setpoint = make_setpoint(pos=(0.0, 0.0, 3.0))
+    pwm = np.empty(len(frame.motors), dtype=np.int16)
+    states = np.empty((n_ticks, 13))
+    setpoints = np.empty((n_ticks, 7))
+    for k in range(n_ticks):
+        if k % int(5*rate) == 0:
+            setpoint[0:3] = rng.uniform((-2, -2, 2), (2, 2, 5))
+        states[k] = sim.state
+        setpoints[k] = setpoint
+        th_cmd, torq_cmd = cnt.step(sim.state, setpoint, 1/rate)
+        torques_to_pwm(frame.CA_inv @ [torq_cmd[0], torq_cmd[1], torq_cmd[2], th_cmd], LIMITS, out=pwm)
+        sim.step(pwm, 1/rate)
+    return states, setpoints
+
+
+def run(cnt, states, setpoints, dt):
+    out = np.empty((len(states), 4))
+    t0 = time.perf_counter()
+    for k in range(len(states)):
+        th_cmd, torq_cmd = cnt.step(states[k], setpoints[k], dt)
+        out[k, 0] = th_cmd
+        out[k, 1:] = torq_cmd
+    return out, (time.perf_counter() - t0) / len(states)
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(description='ASMC step cost: library vs script copy.')
+    parser.add_argument('--ticks', type=int, default=20000)
+    parser.add_argument('--rate', type=float, default=30)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    states, setpoints = record_states(args.ticks, args.rate)
+    dt = 1.0 / args.rate
+
+    ref, t_ref = run(ScriptASMC(), states, setpoints, dt)
+    lib, t_lib = run(ASMC_Controller(), states, setpoints, dt)
+    diff = np.abs(ref - lib).max()
+
+    print(f"script copy (test-28)   {t_ref*1e6:7.1f} us/step")
+    print(f"ASMC_Controller.step    {t_lib*1e6:7.1f} us/step   ({t_ref/t_lib:.1f}x faster)")
+    print(f"max |output difference| over {args.ticks} steps: {diff:.2e}")
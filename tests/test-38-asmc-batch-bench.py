@@ -0,0 +1,112 @@
+"""
+Benchmark: ASMC_BatchController (one call for N vehicles) vs a loop over N ASMC_Controller objects.
+
+Random but flyable states (position/velocity errors, tilted attitudes, body rates) and per-vehicle
+setpoints are stepped through both for a few ticks, with adaptation on; we check that thrust and
+moment outputs (and the adapted gains) agree and report the time per tick and the speedup.
+The tick sequence is flown --repeat times, alternating between the two and resetting the
+controllers in between, and the fastest run of each is compared. From N = --min-n (1000) on,
+the batch has to be at least --min-speedup (50x) faster.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-38-asmc-batch-bench.py --sizes 10 100 1000 10000
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.controller.asmc_controller import ASMC_Controller, ASMC_BatchController
+
+
+def random_inputs(N, rng):
+    states = np.zeros((N, 13))
+    states[:, 0:3] = rng.uniform(-3, 3, (N, 3))
+    states[:, 3:6] = rng.normal(0, 1, (N, 3))
+    # Small random attitudes around level
+    q = np.concatenate([rng.normal(0, 0.15, (N, 3)), np.ones((N, 1))], axis=1)
+    states[:, 6:10] = q / np.linalg.norm(q, axis=1)[:, None]
+    states[:, 10:13] = rng.normal(0, 0.5, (N, 3))
+    setpoints = np.zeros((N, 7))
+    setpoints[:, 0:3] = rng.uniform(-3, 3, (N, 3))
+    setpoints[:, 6] = rng.uniform(-np.pi, np.pi, N)
+    return states, setpoints
+
+
+def fly(controllers, inputs, dt, th, torq):
+    ''' Step the whole tick sequence; returns the time spent in the controllers and the max output
+    difference against th, torq (one row of outputs per tick, filled in when fly is given None). '''
+    elapsed = 0.0
+    diff = 0.0
+    for k, (states, setpoints) in enumerate(inputs):
+        if isinstance(controllers, ASMC_BatchController):
+            t0 = time.perf_counter()
+            th_cmd, torq_cmd = controllers.step(states, setpoints, dt)
+            elapsed += time.perf_counter() - t0
+        else:
+            th_cmd = np.empty(len(controllers))
+            torq_cmd = np.empty((len(controllers), 3))
+            t0 = time.perf_counter()
+            for i, cnt in enumerate(controllers):
+                th_cmd[i], torq_cmd[i] = cnt.step(states[i], setpoints[i], dt)
+            elapsed += time.perf_counter() - t0
+        if th[k] is None:
+            th[k], torq[k] = th_cmd.copy(), torq_cmd.copy()
+        diff = max(diff, np.abs(th_cmd - th[k]).max(), np.abs(torq_cmd - torq[k]).max())
+    return elapsed, diff
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(description='Batched vs looped ASMC evaluation.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs of the tick sequence per path, interleaved.")
+    parser.add_argument('--dt', type=float, default=1/30)
+    parser.add_argument('--min-n', type=int, default=1000, help="Smallest N held to --min-speedup.")
+    parser.add_argument('--min-speedup', type=float, default=50.0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = np.random.default_rng(0)
+    for N in args.sizes:
+        inputs = [random_inputs(N, rng) for _ in range(args.ticks)]
+        scalar = [ASMC_Controller() for _ in range(N)]
+        batch = ASMC_BatchController(N)
+        # One throwaway step each, so numba compilation (src/dynamics/kinematics.py) is not timed
+        scalar[0].step(inputs[0][0][0], inputs[0][1][0], args.dt)
+        batch.step(*inputs[0], args.dt)
+
+        # Outputs of the first looped run are the reference for every other run
+        th = [None] * args.ticks
+        torq = [None] * args.ticks
+        t_loop = t_batch = float('inf')
+        diff = 0.0
+        for _ in range(args.repeat):
+            for cnt in scalar:
+                cnt.reset()
+            elapsed, d = fly(scalar, inputs, args.dt, th, torq)
+            t_loop = min(t_loop, elapsed)
+            diff = max(diff, d)
+            batch.reset()
+            elapsed, d = fly(batch, inputs, args.dt, th, torq)
+            t_batch = min(t_batch, elapsed)
+            diff = max(diff, d)
+        gains = np.array([[c.Kp0_, c.Kp1_, c.M, c.Kp0_q_, c.Kp1_q_, c.Kp2_q_] for c in scalar])
+        gain_diff = np.abs(gains - np.column_stack([batch.Kp0_, batch.Kp1_, batch.M, batch.Kp0_q_,
+                                                    batch.Kp1_q_, batch.Kp2_q_])).max()
+
+        t_loop /= args.ticks
+        t_batch /= args.ticks
+        print(f"N={N:6d}  loop {t_loop*1e3:9.3f} ms  batch {t_batch*1e3:8.3f} ms  "
+              f"speedup {t_loop/t_batch:7.1f}x  max |diff| outputs {diff:.1e} gains {gain_diff:.1e}")
+        assert diff < 1e-12 and gain_diff < 1e-12, f'N={N}: batch and looped controllers disagree'
+        if N >= args.min_n:
+            assert t_loop/t_batch >= args.min_speedup, f'N={N}: speedup under {args.min_speedup}x'
@@ -0,0 +1,136 @@
+"""
+Benchmark: attitude kinematics kernels (src/dynamics/kinematics.py) vs the per-tick code of the
+controller scripts (tf quaternion_matrix + np.delete, np.cross acc2quat, full skew matrix).
+
+For random attitudes and thrust vectors we check that both give the same rotation matrices and
+attitude errors, and report the time per tick and the memory allocated by each path.
+Run once with numba installed and once with DF_NO_JIT=1 to compare compiled and plain kernels.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-39-kinematics-bench.py
+DF_NO_JIT=1 python3 test-39-kinematics-bench.py
+"""
+
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics import kinematics
+from src.dynamics.kinematics import quat_to_rot, rot_to_quat, desired_frame, attitude_error
+
+
+def quaternion_matrix(quaternion):
+    # tf.transformations.quaternion_matrix
+    q = np.array(quaternion[:4], dtype=np.float64, copy=True)
+    nq = np.dot(q, q)
+    if nq < np.finfo(float).eps * 4.0:
+        return np.identity(4)
+    q *= math.sqrt(2.0 / nq)
+    q = np.outer(q, q)
+    return np.array((
+        (1.0-q[1, 1]-q[2, 2],     q[0, 1]-q[2, 3],     q[0, 2]+q[1, 3], 0.0),
+        (    q[0, 1]+q[2, 3], 1.0-q[0, 0]-q[2, 2],     q[1, 2]-q[0, 3], 0.0),
+        (    q[0, 2]-q[1, 3],     q[1, 2]+q[0, 3], 1.0-q[0, 0]-q[1, 1], 0.0),
+        (                0.0,                 0.0,                 0.0, 1.0)
+        ), dtype=np.float64)
+
+
+def acc2quat(des_th, des_yaw):
+    proj_xb_des = np.array([np.cos(des_yaw), np.sin(des_yaw), 0.0])
+    if np.linalg.norm(des_th) == 0.0:
+        zb_des = np.array([0,0,1])
+    else:
+        zb_des = des_th / np.linalg.norm(des_th)
+    yb_des = np.cross(zb_des, proj_xb_des) / np.linalg.norm(np.cross(zb_des, proj_xb_des))
+    xb_des = np.cross(yb_des, zb_des) / np.linalg.norm(np.cross(yb_des, zb_des))
+    return np.transpose(np.array([xb_des, yb_des, zb_des]))
+
+
+def script_tick(q, des_th, des_yaw):
+    pose = quaternion_matrix(q)
+    pose_temp1 = np.delete(pose, -1, axis=1)
+    rot_curr = np.delete(pose_temp1, -1, axis=0)
+    rot_des = acc2quat(des_th, des_yaw)
+    angle_error_matrix = 0.5* (np.dot(np.transpose(rot_des), rot_curr) -
+                                np.dot(np.transpose(rot_curr), rot_des) )
+    euler_err = np.array([-angle_error_matrix[1,2], -angle_error_matrix[0,2], angle_error_matrix[0,1]])
+    des_q_dot = np.array([0 ,0, 0])
+    des_euler_rate = np.dot(np.multiply(np.transpose(rot_des), rot_curr), des_q_dot)
+    return rot_curr, rot_des, euler_err
+
+
+class KernelTick:
+    def __init__(self):
+        self.rot_curr = np.empty((3, 3))
+        self.rot_des = np.empty((3, 3))
+        self.euler_err = np.empty(3)
+
+    def __call__(self, q, des_th, des_yaw):
+        quat_to_rot(q, self.rot_curr)
+        desired_frame(des_th, des_yaw, self.rot_des)
+        attitude_error(self.rot_des, self.rot_curr, self.euler_err)
+        return self.rot_curr, self.rot_des, self.euler_err
+
+
+def timed(fn, inputs):
+    t0 = time.perf_counter()
+    for q, des_th, yaw in inputs:
+        fn(q, des_th, yaw)
+    return (time.perf_counter() - t0) / len(inputs)
+
+
+def allocated(fn, inputs):
+    tracemalloc.start()
+    for q, des_th, yaw in inputs:
+        fn(q, des_th, yaw)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Kinematics kernels vs script code.')
+    parser.add_argument('--ticks', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    inputs = []
+    for _ in range(args.ticks):
+        q = rng.normal(size=4)
+        q /= np.linalg.norm(q)
+        inputs.append((q, rng.normal(0, 3, 3) + (0, 0, 9.8), rng.uniform(-np.pi, np.pi)))
+
+    kernel = KernelTick()
+    kernel(*inputs[0])  # compile outside the timing when numba is used
+
+    diff = 0.0
+    q_diff = 0.0
+    q_out = np.empty(4)
+    for q, des_th, yaw in inputs:
+        ref = script_tick(q, des_th, yaw)
+        out = kernel(q, des_th, yaw)
+        diff = max(diff, *(np.abs(a - b).max() for a, b in zip(ref, out)))
+        # rot_to_quat recovers q up to sign
+        rot_to_quat(out[0], q_out)
+        q_diff = max(q_diff, min(np.abs(q_out - q).max(), np.abs(q_out + q).max()))
+
+    t_script = timed(script_tick, inputs)
+    t_kernel = timed(kernel, inputs)
+    n = min(1000, len(inputs))
+    a_script = allocated(script_tick, inputs[:n])
+    a_kernel = allocated(kernel, inputs[:n])
+
+    print(f"kernels: {'numba' if kinematics.JIT else 'plain Python/NumPy'}")
+    print(f"script tick   {t_script*1e6:7.2f} us   peak traced memory over {n} ticks {a_script:6d} B")
+    print(f"kernel tick   {t_kernel*1e6:7.2f} us   peak traced memory over {n} ticks {a_kernel:6d} B"
+          f"   ({t_script/t_kernel:.1f}x faster)")
+    print(f"max |difference| rot_curr/rot_des/euler_err {diff:.1e}, rot_to_quat round trip {q_diff:.1e}")
@@ -0,0 +1,141 @@
+"""
+Check src/utility/quaternion.py against tf.transformations and benchmark import time and calls.
+
+The reference is tf.transformations when a ROS environment is sourced. Otherwise the standalone
+`transformations` package (pip install transformations, the upstream tf copied its module from)
+is used; it orders quaternions (w, x, y, z) and picks its own sign in quaternion_from_matrix, so
+that one function is then compared up to sign. Its pure NumPy functions (the `_py` variants, the
+code tf ships) are timed rather than its C extension.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-40-quaternion-bench.py
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+import src.utility.quaternion as quaternion
+
+try:
+    import tf.transformations as reference
+    REFERENCE = 'tf.transformations'
+    to_ref = from_ref = lambda q: q
+except ImportError:
+    import transformations as reference
+    REFERENCE = 'transformations'
+    to_ref = lambda q: np.roll(q, 1, axis=-1)
+    from_ref = lambda q: np.roll(q, -1, axis=-1)
+
+def ref(name):
+    return getattr(reference, name + '_py', getattr(reference, name))
+
+
+def import_time(module, repeat=5):
+    ''' Best time to import module in a fresh interpreter that has already imported numpy. '''
+    code = f'import time, numpy; t0 = time.perf_counter(); import {module}; print(time.perf_counter() - t0)'
+    return min(float(subprocess.run([sys.executable, '-c', code], check=True, cwd=cur_path+"/..",
+                                    capture_output=True, text=True).stdout) for _ in range(repeat))
+
+
+def per_call(fn, args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for a in args:
+            fn(*a)
+        best = min(best, (time.perf_counter() - t0) / len(args))
+    return best
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Quaternion library vs tf.transformations.')
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    q = rng.normal(size=(args.samples, 4))
+    q1 = rng.normal(size=(args.samples, 4))
+    q_unit = q / np.linalg.norm(q, axis=1, keepdims=True)
+    angles = rng.uniform(-np.pi, np.pi, (args.samples, 3))
+    fraction = rng.uniform(0, 1, args.samples)
+    fraction[:10] = 0.0
+    fraction[10:20] = 1.0
+    R = quaternion.quaternion_matrix3(q)
+
+    print(f"reference: {REFERENCE}")
+    print("max |difference|, single calls / one batched call:")
+    def check(name, ours_single, ours_batch, ref, up_to_sign=False):
+        if up_to_sign:
+            diff = lambda a: np.minimum(np.abs(a - ref).max(axis=-1), np.abs(a + ref).max(axis=-1)).max()
+        else:
+            diff = lambda a: np.abs(a - ref).max()
+        print(f"  {name:24s} {diff(ours_single):.1e} / {diff(ours_batch):.1e}")
+
+    check('quaternion_matrix', np.array([quaternion.quaternion_matrix(v) for v in q]),
+          quaternion.quaternion_matrix(q), np.array([ref('quaternion_matrix')(to_ref(v)) for v in q]))
+    check('quaternion_from_matrix', np.array([quaternion.quaternion_from_matrix(M) for M in R]),
+          quaternion.quaternion_from_matrix(R),
+          np.array([from_ref(ref('quaternion_from_matrix')(quaternion.quaternion_matrix(v))) for v in q]),
+          up_to_sign=REFERENCE != 'tf.transformations')
+    for axes in ('sxyz', 'rzyx', 'szxz'):
+        check(f'quaternion_from_euler {axes}',
+              np.array([quaternion.quaternion_from_euler(*a, axes=axes) for a in angles]),
+              quaternion.quaternion_from_euler(*angles.T, axes=axes),
+              np.array([from_ref(ref('quaternion_from_euler')(*a, axes=axes)) for a in angles]))
+        check(f'euler_from_quaternion {axes}',
+              np.array([quaternion.euler_from_quaternion(v, axes) for v in q_unit]),
+              np.array(quaternion.euler_from_quaternion(q_unit, axes)).T,
+              np.array([ref('euler_from_quaternion')(to_ref(v), axes=axes) for v in q_unit]))
+    check('quaternion_multiply', np.array([quaternion.quaternion_multiply(a, b) for a, b in zip(q, q1)]),
+          quaternion.quaternion_multiply(q, q1),
+          np.array([from_ref(ref('quaternion_multiply')(to_ref(a), to_ref(b))) for a, b in zip(q, q1)]))
+    check('quaternion_slerp', np.array([quaternion.quaternion_slerp(a, b, f) for a, b, f in zip(q, q1, fraction)]),
+          quaternion.quaternion_slerp(q, q1, fraction),
+          np.array([from_ref(ref('quaternion_slerp')(to_ref(a), to_ref(b), f)) for a, b, f in zip(q, q1, fraction)]))
+
+    print("import time (fresh interpreter, numpy already counted out):")
+    print(f"  src.utility.quaternion   {import_time('src.utility.quaternion')*1e3:7.1f} ms")
+    print(f"  {REFERENCE:24s} {import_time(reference.__name__)*1e3:7.1f} ms")
+
+    print("per call, single quaternion (us): this module / reference")
+    n = min(args.samples, 2000)
+    qr = [to_ref(v) for v in q[:n]]
+    rows = [
+        ('quaternion_matrix3', per_call(quaternion.quaternion_matrix3, [(v,) for v in q[:n]]),
+         # what the scripts do with tf for a 3x3 rotation
+         per_call(lambda v: np.delete(np.delete(ref('quaternion_matrix')(v), -1, axis=1), -1, axis=0),
+                  [(v,) for v in qr])),
+        ('quaternion_matrix', per_call(quaternion.quaternion_matrix, [(v,) for v in q[:n]]),
+         per_call(ref('quaternion_matrix'), [(v,) for v in qr])),
+        ('quaternion_from_matrix', per_call(quaternion.quaternion_from_matrix, [(M,) for M in R[:n]]),
+         # tf only takes the 4x4 form
+         per_call(ref('quaternion_from_matrix'), [(quaternion.quaternion_matrix(v),) for v in q[:n]])),
+        ('quaternion_from_euler', per_call(quaternion.quaternion_from_euler, [tuple(a) for a in angles[:n].tolist()]),
+         per_call(ref('quaternion_from_euler'), [tuple(a) for a in angles[:n].tolist()])),
+        ('quaternion_multiply', per_call(quaternion.quaternion_multiply, list(zip(q[:n], q1[:n]))),
+         per_call(ref('quaternion_multiply'), list(zip(qr, [to_ref(v) for v in q1[:n]])))),
+        ('quaternion_slerp', per_call(quaternion.quaternion_slerp, list(zip(q[:n], q1[:n], fraction[:n].tolist()))),
+         per_call(ref('quaternion_slerp'), list(zip(qr, [to_ref(v) for v in q1[:n]], fraction[:n].tolist())))),
+    ]
+    for name, ours, theirs in rows:
+        print(f"  {name:24s} {ours*1e6:6.2f} / {theirs*1e6:6.2f}")
+
+    qb = rng.normal(size=(args.batch, 4))
+    t0 = time.perf_counter()
+    Rb = quaternion.quaternion_matrix3(qb)
+    t_batch = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    quaternion.quaternion_from_matrix(Rb)
+    t_back = time.perf_counter() - t0
+    print(f"batch of {args.batch}: quaternion_matrix3 {t_batch/args.batch*1e9:.0f} ns/quaternion, "
+          f"quaternion_from_matrix {t_back/args.batch*1e9:.0f} ns/matrix")
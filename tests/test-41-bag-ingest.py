@@ -0,0 +1,50 @@
+"""
+Benchmark: rosbag ingestion (src/analysis/bag.py) over every bag in a directory.
+
+For each bag: one-pass read into NumPy columns, first load_bag (read + write cache) and a second
+load_bag (cache hit). The cache goes to a temporary directory unless --cache-dir is given.
+
+How to run:
+cd ~/df_ws/src/DroneForce
+python3 tests/test-41-bag-ingest.py dist
+python3 tests/test-41-bag-ingest.py dist --format parquet
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.analysis.bag import read_bag, load_bag
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Bag ingestion and cache timing.')
+    parser.add_argument('directory', nargs='?', default=cur_path+"/../dist")
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz')
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='df-bags-')
+    paths = sorted(glob.glob(os.path.join(args.directory, '*.bag')))
+    total = [0.0, 0.0, 0.0]
+    for path in paths:
+        t0 = time.perf_counter()
+        topics = read_bag(path)
+        t1 = time.perf_counter()
+        load_bag(path, cache_dir=cache_dir, format=args.format)
+        t2 = time.perf_counter()
+        load_bag(path, cache_dir=cache_dir, format=args.format)
+        t3 = time.perf_counter()
+        for k, t in enumerate((t1 - t0, t2 - t1, t3 - t2)):
+            total[k] += t
+        rows = '  '.join(f'{topic.split("/")[-1]}={len(array)}' for topic, array in topics.items())
+        print(f"{os.path.basename(path)}  {os.path.getsize(path)/1e6:4.1f} MB  read {(t1-t0)*1e3:6.1f} ms"
+              f"  cold {(t2-t1)*1e3:6.1f} ms  cached {(t3-t2)*1e3:5.1f} ms  {rows}")
+    print(f"{len(paths)} bags: read {total[0]:.2f} s, first load {total[1]:.2f} s, cached load {total[2]:.2f} s"
+          f"  (cache in {cache_dir})")
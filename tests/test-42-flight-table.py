@@ -0,0 +1,54 @@
+"""
+Tracking metrics for every bag in a directory, joined with the run metadata (src/analysis/flights.py).
+
+Bags are analysed over a process pool against /desired_position: RMSE, max deviation, error before
+and after /fault fired and settling time (after the fault when there is one). The metadata CSV has
+one row per bag (dist/rosbag.csv by default); bags without a row are listed with empty metadata
+and named in a warning.
+
+How to run:
+cd ~/df_ws/src/DroneForce
+python3 tests/test-42-flight-table.py dist
+python3 tests/test-42-flight-table.py dist --sort rmse --csv flights.csv
+"""
+
+import os
+import sys
+import time
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.analysis.bag import CACHE_DIR
+from src.analysis.flights import METRICS, analyse_directory, table, write_csv
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    parser = argparse.ArgumentParser(description='Flight comparison table for a directory of bags.')
+    parser.add_argument('directory')
+    parser.add_argument('--metadata', default=os.path.join(cur_path, '..', 'dist', 'rosbag.csv'),
+                        help="CSV with a 'bag' column ('' for none).")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--settle-tol', type=float, default=0.5, help="Settling band (m).")
+    parser.add_argument('--align', default='asof', choices=['asof', 'linear'],
+                        help="Setpoint in force (asof) or interpolated between setpoints (linear).")
+    parser.add_argument('--sort', default='bag', choices=('bag',) + METRICS)
+    parser.add_argument('--csv', default=None, help="Also write the table to this CSV file.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    t0 = time.perf_counter()
+    rows = analyse_directory(args.directory, metadata=args.metadata or None, processes=args.processes,
+                             cache_dir=args.cache_dir, settle_tol=args.settle_tol, align=args.align)
+    wall = time.perf_counter() - t0
+    if args.sort != 'bag':
+        rows.sort(key=lambda row: (row[args.sort] != row[args.sort], row[args.sort]))
+    print(table(rows))
+    print(f"\n{len(rows)} bags in {wall:.2f} s on {args.processes or os.cpu_count()} processes")
+    if any(row['error'] for row in rows):
+        print("failed: " + ", ".join(f"{row['bag']} ({row['error']})" for row in rows if row['error']))
+    if args.csv:
+        write_csv(rows, args.csv)
@@ -0,0 +1,100 @@
+"""
+Benchmark: time alignment of topics (src/analysis/timeindex.py) vs a per-sample Python loop.
+
+Aligns /desired_position to the pose samples of a bag (as-of and linear) and the odometry attitude
+to the setpoint times (SLERP), checks the vectorized result against a straightforward loop, then
+times both on a synthetic flight of --samples pose samples.
+
+How to run:
+cd ~/df_ws/src/DroneForce
+python3 tests/test-43-time-align.py dist/2023-02-03-17-12-17.bag
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.analysis.bag import load_bag
+from src.analysis.timeindex import DFTimeIndex, asof_join, interpolate_join, quaternions
+from src.utility.quaternion import quaternion_slerp
+
+
+# Reference merges in plain Python: both time lists sorted, one pointer walks the right stream
+
+def loop_asof(t_right, t_left):
+    ''' Last right sample at or before each left time. '''
+    out = []
+    k = -1
+    for t in t_left:
+        while k + 1 < len(t_right) and t_right[k+1] <= t:
+            k += 1
+        out.append(k)
+    return np.array(out)
+
+def loop_interpolate(t_right, values, t_left):
+    out = []
+    j = 0
+    for t in t_left:
+        if t < t_right[0] or t > t_right[-1]:
+            out.append(np.nan)
+            continue
+        while j < len(t_right) - 2 and t_right[j+1] <= t:
+            j += 1
+        w = (t - t_right[j]) / (t_right[j+1] - t_right[j])
+        out.append(values[j] + w * (values[j+1] - values[j]))
+    return np.array(out)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Vectorized topic alignment vs Python loops.')
+    parser.add_argument('bag', nargs='?', default=cur_path+"/../dist/2023-02-03-17-12-17.bag")
+    parser.add_argument('--samples', type=int, default=20000, help="Pose samples of the synthetic flight.")
+    args = parser.parse_args()
+
+    topics = load_bag(args.bag)
+    pose = topics['/mavros/local_position/pose']
+    desired = topics['/desired_position']
+    odom = topics['/mavros/local_position/odom']
+
+    joined = asof_join(pose, desired, ['x', 'y', 'z'], suffix='_des')
+    k = loop_asof(desired['t'], pose['t'])
+    ref = np.where(k >= 0, desired['x'][np.maximum(k, 0)], np.nan)
+    print(f"as-of:  {len(pose)} pose x {len(desired)} setpoints, "
+          f"max |diff| vs loop {np.nanmax(np.abs(joined['x_des'] - ref)):.1e}")
+
+    lin = interpolate_join(pose, desired, ['x'], suffix='_des')
+    ref = loop_interpolate(desired['t'], desired['x'], pose['t'])
+    print(f"linear: max |diff| vs loop {np.nanmax(np.abs(lin['x_des'] - ref)):.1e}")
+
+    att = interpolate_join(desired[['t']], odom, ['qx', 'qy', 'qz', 'qw'])
+    index = DFTimeIndex(odom['t'])
+    q = quaternions(odom)
+    kk, w, valid = index.bracket(desired['t'])
+    ref = np.array([quaternion_slerp(q[a], q[a+1], b) for a, b in zip(kk[valid], w[valid])])
+    print(f"slerp:  {valid.sum()} setpoint times, max |diff| vs per-sample slerp "
+          f"{np.abs(quaternions(att)[valid] - ref).max():.1e}")
+
+    # Synthetic flight: 50 Hz pose against a 15 Hz setpoint stream with jitter
+    rng = np.random.default_rng(0)
+    n = args.samples
+    t_pose = np.cumsum(rng.uniform(0.015, 0.025, n))
+    t_des = np.cumsum(rng.uniform(0.06, 0.07, int(t_pose[-1] / 0.065)))
+    x_des = np.sin(t_des)
+    index = DFTimeIndex(t_des)
+    t0 = time.perf_counter()
+    index.asof(t_pose)
+    t_vec = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.interpolate(x_des, t_pose)
+    t_lin = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    loop_interpolate(t_des.tolist(), x_des.tolist(), t_pose.tolist())
+    t_loop = time.perf_counter() - t0
+    print(f"{n} pose x {len(t_des)} setpoints: as-of {t_vec*1e3:.2f} ms, linear {t_lin*1e3:.2f} ms, "
+          f"Python merge loop {t_loop*1e3:.1f} ms")
@@ -0,0 +1,127 @@
+"""
+Benchmark: memory-mapped flight log (src/flightlog.py) vs growing Python lists.
+
+Records --ticks control ticks (state, setpoint, commands, u, PWM, fault) both ways and reports
+the append cost per tick, the Python heap the recording holds (tracemalloc) and the time until the
+data is a NumPy array again. A reader follows the file while it is being written and the records
+read back are checked against what was appended.
+
+How to run:
+cd ~/df_ws/src/DroneForce
+python3 tests/test-44-flight-log.py --ticks 200000
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics.state import STATE_SIZE, SETPOINT_SIZE
+from src.flightlog import DFLogReader, DFLogWriter, read_log, record_dtype
+
+N_MOTORS = 4
+
+
+def flight(n, seed=0):
+    ''' Random signals for n ticks, one row per tick. '''
+    rng = np.random.default_rng(seed)
+    return rng.random((n, STATE_SIZE + SETPOINT_SIZE + 3 + N_MOTORS))
+
+def ticks(data):
+    ''' The per-tick values a control loop hands to the log, in buffers reused between ticks. '''
+    state = np.empty(STATE_SIZE)
+    setpoint = np.empty(SETPOINT_SIZE)
+    torq = np.empty(3)
+    u = np.empty(N_MOTORS)
+    pwm = np.empty(N_MOTORS, dtype=np.int16)
+    for i, row in enumerate(data):
+        state[:] = row[:STATE_SIZE]
+        setpoint[:] = row[STATE_SIZE:STATE_SIZE+SETPOINT_SIZE]
+        torq[:] = row[-3-N_MOTORS:-N_MOTORS]
+        u[:] = row[-N_MOTORS:]
+        pwm[:] = 1000 + 1000 * u
+        yield i / 30.0, state, setpoint, 9.81, torq, u, pwm, i > len(data) // 2
+
+
+def record_lists(values):
+    ''' What the scripts do today: one list per signal, copies appended every tick. '''
+    logs = [[] for _ in range(8)]
+    for tick in values:
+        for log, value in zip(logs, tick):
+            log.append(value.copy() if isinstance(value, np.ndarray) else value)
+    return logs
+
+def record_file(values, path):
+    with DFLogWriter(path, N_MOTORS, meta={'script': 'test-44'}) as log:
+        for tick in values:
+            log.append(*tick)
+
+
+def measure(record, data, *args):
+    ''' (result, seconds, heap held, heap peak); timed without tracemalloc, which slows every allocation. '''
+    start = time.perf_counter()
+    result = record(ticks(data), *args)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = record(ticks(data), *args)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, held, peak
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Memory-mapped flight log vs Python lists.')
+    parser.add_argument('--ticks', type=int, default=100000, help="Control ticks to record (30 Hz: 100000 is ~55 min).")
+    parser.add_argument('--path', default=None, help="Log file (a temporary file by default).")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'bench.dflog')
+    n = args.ticks
+
+    # Reader following the writer: every refresh sees exactly the records appended so far
+    writer = DFLogWriter(path, N_MOTORS, capacity=1000)
+    reader = DFLogReader(path)
+    for i, tick in enumerate(ticks(flight(2500))):
+        writer.append(*tick)
+        if i % 500 == 499:
+            assert reader.refresh() == i + 1 and reader.records['t'][-1] == tick[0]
+    writer.close()
+    reader.close()
+    print(f"reader follows the writer: {len(read_log(path)[0])} records, file grown twice and trimmed on close")
+
+    data = flight(n)
+    start = time.perf_counter()
+    for _ in ticks(data):
+        pass
+    t_ticks = time.perf_counter() - start
+    logs, t_lists, held_lists, peak_lists = measure(record_lists, data)
+    _, t_file, held_file, peak_file = measure(record_file, data, path)
+
+    start = time.perf_counter()
+    records = np.empty(n, dtype=record_dtype(N_MOTORS))
+    for name, log in zip(records.dtype.names, logs):
+        records[name] = log
+    t_convert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mapped, meta = read_log(path)
+    t_open = time.perf_counter() - start
+    assert meta == {'script': 'test-44'}
+    for name in records.dtype.names:
+        assert np.array_equal(mapped[name], records[name]), name
+    assert os.path.getsize(path) == 4096 + n * records.dtype.itemsize
+
+    print(f"\n{n} ticks, {records.dtype.itemsize} bytes per record, {os.path.getsize(path)/1e6:.1f} MB on disk")
+    print(f"producing the tick values alone: {t_ticks/n*1e6:.2f} us/tick (included below)")
+    print(f"{'':<16}{'append/tick':>14}{'heap held':>12}{'heap peak':>12}{'to array':>12}")
+    print(f"{'lists':<16}{t_lists/n*1e6:>11.2f} us{held_lists/1e6:>9.1f} MB{peak_lists/1e6:>9.1f} MB{t_convert*1e3:>9.1f} ms")
+    print(f"{'flight log':<16}{t_file/n*1e6:>11.2f} us{held_file/1e6:>9.1f} MB{peak_file/1e6:>9.1f} MB{t_open*1e3:>9.1f} ms")
+    print("records read back identical")
@@ -0,0 +1,115 @@
+"""
+Benchmark: cost and jitter of logging inside the control tick.
+
+Flies the headless simulator loop of test-34-sim-pid-hold.py and times only the logging call of
+every tick, for:
+    lists      - one growing list per signal (what the scripts do today)
+    flight log - DFLogWriter.append straight into the memory-mapped file (src/flightlog.py)
+    recorder   - DFRingRecorder.append, saved by a DFRecorderSnapshot thread (src/recorder.py)
+The three are flown in turn `--repeat` times; for each we report the median / p99 / p99.9 / max
+logging time per tick (median over the repeats), check that the recorder's p99 and p99.9 are no
+worse than the lists', then check the snapshot file against the direct flight log.
+
+How to run:
+cd ~/df_ws/src/DroneForce
+python3 tests/test-45-ring-recorder.py --ticks 50000
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.inertia import DFInertia
+from src.dynamics.mass import DFMass
+from src.dynamics.simulator import DFSimulator
+from src.dynamics.state import make_state, make_setpoint
+from src.controller.pid_controller import PID_Controller
+from src.flightlog import DFLogWriter, read_log, record_dtype
+from src.recorder import DFRingRecorder, DFRecorderSnapshot
+from src.utility.map_range import torques_to_pwm
+
+LIMITS = (-2, 2, 1000, 2000)
+
+
+class ListLog:
+    def __init__(self):
+        self.logs = [[] for _ in range(8)]
+
+    def append(self, *values):
+        for log, value in zip(self.logs, values):
+            log.append(value.copy() if isinstance(value, np.ndarray) else value)
+
+
+def fly(log, ticks, rate=100):
+    ''' Simulated hover with a step at 10 s; returns the logging time of every tick (s). '''
+    frame = DFFrame(frame_type=Frames.Quad_X)
+    sim = DFSimulator(frame, DFMass(1.5), DFInertia(0.029, 0.029, 0.055), state=make_state(pos=(0, 0, 3.0)))
+    cnt = PID_Controller()
+    setpoint = make_setpoint(pos=(0.0, 0.0, 3.0))
+    dt = 1.0 / rate
+    pwm = np.empty(len(frame.motors), dtype=np.int16)
+    cost = np.empty(ticks)
+    clock = time.perf_counter
+    for i in range(ticks):
+        if i == 10 * rate:
+            setpoint[0:3] = (1.0, 0.5, 3.5)
+        th_cmd, torq_cmd = cnt.step(sim.state, setpoint, dt)
+        u_input = np.matmul(frame.CA_inv, [torq_cmd[0], torq_cmd[1], torq_cmd[2], th_cmd])
+        torques_to_pwm(u_input, LIMITS, out=pwm)
+        start = clock()
+        log.append(sim.t, sim.state, setpoint, th_cmd, torq_cmd, u_input, pwm, False)
+        cost[i] = clock() - start
+        sim.step(pwm, dt)
+    return cost
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Logging cost per control tick: lists vs flight log vs ring recorder.')
+    parser.add_argument('--ticks', type=int, default=20000, help="Control ticks (100 Hz).")
+    parser.add_argument('--period', type=float, default=0.5, help="Snapshot period of the recorder (s).")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of each logger, interleaved.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    n_motors = len(DFFrame(frame_type=Frames.Quad_X).motors)
+    fly(ListLog(), 200)
+
+    results = {'lists': [], 'flight log': [], 'recorder': []}
+    for k in range(args.repeat):
+        results['lists'].append(fly(ListLog(), args.ticks))
+
+        with DFLogWriter(os.path.join(directory, 'direct.dflog'), n_motors) as log:
+            results['flight log'].append(fly(log, args.ticks))
+
+        recorder = DFRingRecorder(record_dtype(n_motors))
+        path = os.path.join(directory, 'snapshot.dflog')
+        with DFRecorderSnapshot(recorder, path, period=args.period) as snapshot:
+            results['recorder'].append(fly(recorder, args.ticks))
+
+    print(f"{args.ticks} ticks, logging time per tick (median of {args.repeat} runs)")
+    print(f"{'':<12}{'median':>10}{'p99':>10}{'p99.9':>10}{'max':>10}")
+    summary = {}
+    for name, costs in results.items():
+        median, p99, p999, worst = np.median([(*np.percentile(cost, (50, 99, 99.9)), cost.max()) for cost in costs], axis=0) * 1e6
+        summary[name] = (p99, p999, worst)
+        print(f"{name:<12}{median:>7.2f} us{p99:>7.2f} us{p999:>7.1f} us{worst:>7.0f} us")
+    print(f"recorder buffer: {recorder.capacity} records, {recorder.buffer.nbytes/1e6:.1f} MB allocated once")
+    (p99, p999, worst), (list_p99, list_p999, list_worst) = summary['recorder'], summary['lists']
+    print(f"recorder vs lists: p99 {p99:.2f} / {list_p99:.2f} us, p99.9 {p999:.1f} / {list_p999:.1f} us, max {worst:.0f} / {list_worst:.0f} us")
+    # The max of either is a scheduler preemption more often than not, so only the percentiles are held to it
+    assert p99 <= list_p99 and p999 <= list_p999, 'recorder write path is slower than the lists'
+
+    records, _ = read_log(path)
+    direct, _ = read_log(os.path.join(directory, 'direct.dflog'))
+    assert snapshot.lost == 0 and len(records) == args.ticks
+    for name in records.dtype.names:
+        assert np.array_equal(records[name], direct[name]), name
+    print(f"recorder snapshots: {snapshot.written} records saved, {snapshot.lost} lost, identical to the direct log")
@@ -0,0 +1,113 @@
+"""
+Benchmark: polling threads vs the event-driven telemetry subscriber (src/telemetry.py).
+
+The loopback stand-in (src/utility/loopback.py) streams ATTITUDE, GPS_RAW_INT and SERVO_OUTPUT_RAW
+at --rate Hz. Both ways of reading them are run for --duration seconds:
+    polling    - what trajectory-ftc-video.py did: one thread per type on a shared pymavlink
+                 connection, recv_match(type=..., blocking=False) and 2 x 10 ms sleeps per loop
+    subscriber - DFAutopilot(transport='mavlink').telemetry, one receiver thread, per-type callbacks
+and the messages received per type (out of those streamed) and the ATTITUDE delay are reported.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-46-telemetry-subscriber.py --rate 50 --duration 5
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from pymavlink import mavutil
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot
+from src.utility.loopback import DFLoopbackAutopilot
+from src.utility.logger import *
+
+TYPES = ('ATTITUDE', 'GPS_RAW_INT', 'SERVO_OUTPUT_RAW')
+
+
+class Counter:
+    """ Messages and ATTITUDE delays (receive time - time_boot_ms of the stand-in). """
+    def __init__(self, vehicle):
+        self.vehicle = vehicle
+        self.counts = dict.fromkeys(TYPES, 0)
+        self.delays = []
+
+    def __call__(self, msg):
+        name = msg.get_type()
+        self.counts[name] += 1
+        if name == 'ATTITUDE':
+            self.delays.append(time.monotonic() - self.vehicle.start_time - msg.time_boot_ms * 1e-3)
+
+
+def polling(port, rate, duration):
+    with DFLoopbackAutopilot(f'udpout:127.0.0.1:{port}', rate=rate) as vehicle:
+        conn = mavutil.mavlink_connection(f'127.0.0.1:{port}')
+        conn.wait_heartbeat(timeout=5)
+        counter = Counter(vehicle)
+        alive = True
+
+        def poll(name):
+            while alive:
+                msg = conn.recv_match(type=name, blocking=False)
+                time.sleep(0.01)
+                if msg is not None and msg.get_type() != 'BAD_DATA':
+                    counter(msg)
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=poll, args=(name,)) for name in TYPES]
+        start = vehicle.streamed
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        alive = False
+        for thread in threads:
+            thread.join()
+        streamed = vehicle.streamed - start
+        conn.close()
+    return counter, streamed, None
+
+
+def subscriber(port, rate, duration, decimation):
+    with DFLoopbackAutopilot(f'udpout:127.0.0.1:{port}', rate=rate) as vehicle:
+        with DFAutopilot(f'127.0.0.1:{port}', transport='mavlink') as drone:
+            counter = Counter(vehicle)
+            drone.telemetry.subscribe('ATTITUDE', counter)
+            drone.telemetry.subscribe('GPS_RAW_INT', counter)
+            drone.telemetry.subscribe('SERVO_OUTPUT_RAW', counter, decimation=decimation)
+            start = vehicle.streamed
+            drone.telemetry.start()
+            time.sleep(duration)
+            drone.telemetry.stop()
+            streamed = vehicle.streamed - start
+            stats = drone.telemetry.stats()
+    return counter, streamed, stats
+
+
+def report(name, counter, streamed):
+    counts = '  '.join(f"{t} {counter.counts[t]:5d}" for t in TYPES)
+    delays = np.array(counter.delays) * 1e3
+    delay = f"p50 {np.percentile(delays, 50):5.1f} ms  max {delays.max():5.1f} ms" if len(delays) else "-"
+    print(f"{name:<11}streamed {streamed:5d}  {counts}  ATTITUDE delay {delay}")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Polling threads vs the event-driven telemetry subscriber.')
+    parser.add_argument('--port', type=int, default=14590, help="Local UDP port for the stand-in link.")
+    parser.add_argument('--rate', type=float, default=50, help="Stream rate of the stand-in (Hz).")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds per run.")
+    parser.add_argument('--decimation', type=int, default=5, help="Callback decimation for SERVO_OUTPUT_RAW.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    counter, streamed, _ = polling(args.port, args.rate, args.duration)
+    report('polling', counter, streamed)
+    counter, streamed, stats = subscriber(args.port + 1, args.rate, args.duration, args.decimation)
+    report('subscriber', counter, streamed)
+    print(f"subscriber counters: {stats}")
@@ -0,0 +1,75 @@
+"""
+Stream-rate negotiation with MAV_CMD_SET_MESSAGE_INTERVAL (DFAutopilot.configure_streams).
+
+The loopback stand-in (src/utility/loopback.py) floods the link with its default streams at --flood Hz,
+like `mavsys rate --all 100` in temp/apm.launch. The script then stops the streams no controller
+reads, requests exactly the control telemetry (ATTITUDE_QUATERNION, LOCAL_POSITION_NED,
+SERVO_OUTPUT_RAW) for a controller at --rate Hz, and reports requested vs achieved rates and the
+link load before and after.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-47-stream-rates.py --rate 30
+python3 test-47-stream-rates.py --connect 127.0.0.1:14552 --rate 30    # SITL / vehicle
+"""
+
+import os
+import sys
+import time
+
+from pymavlink import mavutil
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot, control_stream_rates
+from src.utility.loopback import DFLoopbackAutopilot
+from src.utility.logger import *
+
+# Default streams of the stand-in that no controller reads
+UNUSED = ('ATTITUDE', 'GPS_RAW_INT')
+
+
+def link_load(transport, duration):
+    ''' (messages/s, bytes/s) arriving on a running receiver. '''
+    mav = transport.conn.mav
+    packets, size = mav.total_packets_received, mav.total_bytes_received
+    time.sleep(duration)
+    return (mav.total_packets_received - packets) / duration, (mav.total_bytes_received - size) / duration
+
+
+def negotiate(connection_string, rate, window):
+    with DFAutopilot(connection_string, transport='mavlink') as drone:
+        drone.telemetry.start()
+        before = link_load(drone.transport, window)
+
+        streams = control_stream_rates(rate)
+        streams.update(dict.fromkeys(UNUSED, 0))
+        report = drone.configure_streams(streams, verify=window)
+        after = link_load(drone.transport, window)
+
+    print(f"{'message':<22}{'requested':>10}{'achieved':>10}  result")
+    for name, stream in report.items():
+        achieved = '-' if stream['achieved'] is None else f"{stream['achieved']:.1f}"
+        result = 'no ack' if stream['result'] is None else mavutil.mavlink.enums['MAV_RESULT'][stream['result']].name
+        print(f"{name:<22}{stream['requested']:>7} Hz{achieved:>7} Hz  {result}")
+    print(f"link load before {before[0]:6.0f} msg/s {before[1]/1e3:6.1f} kB/s")
+    print(f"link load after  {after[0]:6.0f} msg/s {after[1]/1e3:6.1f} kB/s")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Request the control telemetry at chosen rates and verify them.')
+    parser.add_argument('--connect', default=None, help="Vehicle connection string; the loopback stand-in is used if not given.")
+    parser.add_argument('--port', type=int, default=14600, help="Local UDP port for the stand-in link.")
+    parser.add_argument('--flood', type=float, default=100, help="Default stream rate of the stand-in (Hz).")
+    parser.add_argument('--rate', type=float, default=30, help="Control rate the streams are chosen for (Hz).")
+    parser.add_argument('--window', type=float, default=2.0, help="Measurement window (s).")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.connect:
+        negotiate(args.connect, args.rate, args.window)
+    else:
+        with DFLoopbackAutopilot(f'udpout:127.0.0.1:{args.port}', rate=args.flood):
+            negotiate(f'127.0.0.1:{args.port}', args.rate, args.window)
@@ -0,0 +1,170 @@
+"""
+ROS-free control pipeline (src/pipeline.py): state from the MAVLink link, PWM back over the same link.
+
+Checks the NED/FRD -> ENU/FLU conversion of DFMavlinkState against src/utility/quaternion.py,
+then flies --controller at --rate Hz against the loopback stand-in (or a vehicle with --connect):
+motors to RCPassThru, control streams negotiated, and the sensor-to-PWM latency (receive time of
+the state sample -> PWM sent) reported together with the loop's tick statistics for each --modes:
+    - triggered : the pipeline, every attitude sample triggers the control step (default)
+    - tick      : the pipeline at a fixed rate on the newest sample
+    - script    : the loop of the ROS scripts (test-28-asmc-hold.py) on the same samples: rospy.Rate
+                  style sleep, arrays rebuilt from message fields, scalar torque_to_PWM and one
+                  set_servo COMMAND_LONG per motor. Without ROS the mavros hop itself (mavros ->
+                  TCPROS -> rospy callback) is not included, so this is a lower bound for that path.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-48-mavlink-pipeline.py --rate 30 --duration 5
+python3 test-48-mavlink-pipeline.py --connect 127.0.0.1:14552 --controller asmc --modes triggered    # SITL
+"""
+
+import copy
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.autopilot import DFAutopilot, control_stream_rates
+from src.dynamics.frame import DFFrame, Frames
+from src.dynamics.state import POS, VEL, QUAT, OMEGA, STATE_SIZE, make_setpoint
+from src.flightlog import record_dtype
+from src.pipeline import LIMITS, DFMavlinkPipeline, DFMavlinkState
+from src.recorder import DFRingRecorder
+from src.sweep import CONTROLLERS
+from src.utility.loopback import DFLoopbackAutopilot
+from src.utility.quaternion import quaternion_multiply, quaternion_from_euler
+from src.utility.logger import *
+
+
+def check_frames(n=1000, seed=0):
+    ''' DFMavlinkState against the mavros transforms written with quaternion products. '''
+    rng = np.random.default_rng(seed)
+    telemetry = SimpleNamespace(subscribe=lambda *args, **kwargs: None)
+    source = DFMavlinkState(telemetry)
+    # mavros ftf: rpy (pi, 0, pi/2), i.e. yaw then roll on rotating axes, and rpy (pi, 0, 0)
+    ned_enu = quaternion_from_euler(np.pi/2, 0, np.pi, 'rzyx')
+    frd_flu = quaternion_from_euler(np.pi, 0, 0)
+    for _ in range(n):
+        q = rng.normal(size=4)
+        q /= np.linalg.norm(q)
+        p, v, w = rng.normal(size=(3, 3))
+        source.on_position(SimpleNamespace(x=p[0], y=p[1], z=p[2], vx=v[0], vy=v[1], vz=v[2]))
+        source.on_attitude(SimpleNamespace(q1=q[3], q2=q[0], q3=q[1], q4=q[2], rollspeed=w[0], pitchspeed=w[1], yawspeed=w[2]))
+        expected = quaternion_multiply(quaternion_multiply(ned_enu, q), frd_flu)
+        assert np.allclose(source.state[POS], (p[1], p[0], -p[2]))
+        assert np.allclose(source.state[QUAT], expected) or np.allclose(source.state[QUAT], -expected)
+        assert np.allclose(source.state[OMEGA], (w[0], -w[1], -w[2]))
+    print(f"NED/FRD -> ENU/FLU conversion matches the quaternion products ({n} random states)")
+
+
+def torque_to_PWM(value, limits=LIMITS):
+    ''' The scripts' scalar map (test-28-asmc-hold.py). '''
+    fromMin, fromMax, toMin, toMax = limits
+    value = min(max(value, fromMin), fromMax)
+    return int(toMin + float(value - fromMin) / float(fromMax - fromMin) * (toMax - toMin))
+
+
+def fly_script(drone, controller, frame, setpoint, rate, duration):
+    ''' The ROS scripts' loop on the pipeline's samples; returns (stats, latencies in s). '''
+    source = DFMavlinkState(drone.telemetry)
+    drone.telemetry.start()
+    snapshot = np.empty(STATE_SIZE)
+    # What odomCb copies into cur_pose / cur_vel
+    pose = SimpleNamespace(position=SimpleNamespace(x=0.0, y=0.0, z=0.0), orientation=SimpleNamespace(x=0.0, y=0.0, z=0.0, w=1.0))
+    twist = SimpleNamespace(linear=SimpleNamespace(x=0.0, y=0.0, z=0.0), angular=SimpleNamespace(x=0.0, y=0.0, z=0.0))
+    vector2Arrays = lambda v: np.array([v.x, v.y, v.z])
+    period = 1.0 / rate
+    # Same warm-up as DFMavlinkPipeline.run()
+    copy.deepcopy(controller).step(snapshot * 0, setpoint, period)
+    latency = []
+    ticks = overruns = 0
+    t_end = time.monotonic() + duration
+    deadline = time.monotonic()
+    while time.monotonic() < t_end:
+        deadline += period
+        if source.ready:
+            t_sample = source.snapshot(snapshot)
+            (pose.position.x, pose.position.y, pose.position.z, twist.linear.x, twist.linear.y, twist.linear.z,
+             pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w,
+             twist.angular.x, twist.angular.y, twist.angular.z) = snapshot.tolist()
+            state = np.concatenate([vector2Arrays(pose.position), vector2Arrays(twist.linear),
+                                    [pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w],
+                                    vector2Arrays(twist.angular)])
+            th_cmd, torq_cmd = controller.step(state, setpoint, period)
+            u_input = np.matmul(frame.CA_inv, [*torq_cmd, th_cmd])
+            for i, u in enumerate(u_input):
+                drone.set_servo(i+1, torque_to_PWM(u))
+            latency.append(time.monotonic() - t_sample)
+            ticks += 1
+        # rospy.Rate.sleep()
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        else:
+            overruns += 1
+    return {'ticks': ticks, 'overruns': overruns, 'skipped': 0, 'max_late_ms': float('nan')}, np.array(latency)
+
+
+def fly(connection_string, controller, rate, duration, mode='triggered'):
+    frame = DFFrame(frame_type=Frames.Quad_X)
+    n_motors = len(frame.motors)
+    passthru = {i: 1 for i in range(1, n_motors+1)}
+    motors = {i: 32+i for i in range(1, n_motors+1)}
+    setpoint = make_setpoint(pos=(0.0, 0.0, 3.0))
+    recorder = DFRingRecorder(record_dtype(n_motors))
+    with DFAutopilot(connection_string, transport='mavlink') as drone:
+        drone.configure_motors(passthru)
+        try:
+            # A triggered loop steps once per attitude sample
+            streams = control_stream_rates(rate, oversample=1 if mode == 'triggered' else 2)
+            streams = drone.configure_streams(streams, verify=1.0)
+            print(f'{mode} streams: ' + ', '.join(f"{name} {s['achieved']:.0f}/{s['requested']:.0f} Hz" for name, s in streams.items()))
+            if mode == 'script':
+                stats, latency = fly_script(drone, CONTROLLERS[controller](), frame, setpoint, rate, duration)
+            else:
+                pipeline = DFMavlinkPipeline(drone, CONTROLLERS[controller](), frame, setpoint, rate=rate,
+                                             recorder=recorder, triggered=mode == 'triggered')
+                stats = pipeline.run(duration=duration)
+                latency = pipeline.latency.latest(len(pipeline.latency))['latency']
+        finally:
+            drone.telemetry.stop()
+            drone.configure_motors(motors)
+
+    expected = int(rate * duration)
+    print(f"{mode}: {controller} at {rate:.0f} Hz for {duration:.0f} s: {stats['ticks']}/{expected} ticks, "
+          f"{stats['overruns']} overruns, {stats['skipped']} skipped, max late {stats['max_late_ms']:.2f} ms")
+    if len(recorder):
+        records = recorder.latest(len(recorder))
+        print(f"last state z {records['state'][-1, 2]:.2f} m, last PWM {records['pwm'][-1]}")
+    return latency * 1e3
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fly a controller on state read straight from MAVLink.')
+    parser.add_argument('--connect', default=None, help="Vehicle connection string; the loopback stand-in is used if not given.")
+    parser.add_argument('--port', type=int, default=14610, help="Local UDP port for the stand-in link (one per mode from there).")
+    parser.add_argument('--controller', default='pid', choices=sorted(CONTROLLERS))
+    parser.add_argument('--rate', type=float, default=30, help="Control rate in Hz.")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds to fly.")
+    parser.add_argument('--modes', nargs='+', default=['triggered', 'tick', 'script'], choices=['triggered', 'tick', 'script'])
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    check_frames()
+    latencies = {}
+    for k, mode in enumerate(args.modes):
+        if args.connect:
+            latencies[mode] = fly(args.connect, args.controller, args.rate, args.duration, mode)
+        else:
+            with DFLoopbackAutopilot(f'udpout:127.0.0.1:{args.port + k}'):
+                latencies[mode] = fly(f'127.0.0.1:{args.port + k}', args.controller, args.rate, args.duration, mode)
+
+    print(f"{'sensor-to-PWM':<14}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  commands")
+    for mode, latency in latencies.items():
+        print(f"{mode:<14}" + ''.join(f"{np.percentile(latency, q):>7.2f} ms" for q in (50, 90, 99, 100)) + f"  {len(latency)}")
@@ -0,0 +1,313 @@
+"""
+Benchmark: ROS callbacks through src/state_adapter.py vs the field-by-field copies of the scripts.
+
+Replays --messages odometry and setpoint messages through both paths and reports:
+    - callback cost  : odomCb / newPoseCB / multiDoFCb of test-28-asmc-hold.py vs the adapters
+    - tick cost      : vector2Arrays + quaternion/rate arrays of the scripts vs one snapshot()
+                       of the state and setpoint vectors
+    - total          : callbacks + one tick per odometry message
+    - GC pressure    : garbage collections during the replay and the largest transient
+                       allocation of a tick (tracemalloc)
+and checks both paths hand the controller the same numbers, and that two callback threads writing
+one adapter while the control loop snapshots it never tear a snapshot or stall it.
+
+The real genpy messages are used when ROS is sourced; otherwise slotted stand-ins with the same
+attribute layout.
+
+How to run:
+cd ~/df_ws/src/DroneForce/tests
+python3 test-49-state-adapter.py --messages 100000
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+cur_path=os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, cur_path+"/..")
+
+from src.dynamics.state import STATE_SIZE, SETPOINT_SIZE, POS, VEL, QUAT, OMEGA, SP_POS, SP_VEL
+from src.state_adapter import DFOdometryAdapter, DFSetpointAdapter
+
+try:
+    from geometry_msgs.msg import Point, PoseStamped, Transform, Twist, TwistStamped
+    from nav_msgs.msg import Odometry
+    from trajectory_msgs.msg import MultiDOFJointTrajectory, MultiDOFJointTrajectoryPoint
+    ROS = True
+except ImportError:
+    ROS = False
+
+    class _Msg:
+        __slots__ = ()
+        def __init__(self, **fields):
+            for name in self.__slots__:
+                setattr(self, name, fields.get(name, 0.0))
+
+    class Vector3(_Msg):
+        __slots__ = ('x', 'y', 'z')
+    Point = Vector3
+
+    class Quaternion(_Msg):
+        __slots__ = ('x', 'y', 'z', 'w')
+
+    class Pose(_Msg):
+        __slots__ = ('position', 'orientation')
+        def __init__(self):
+            self.position, self.orientation = Point(), Quaternion()
+
+    class Twist(_Msg):
+        __slots__ = ('linear', 'angular')
+        def __init__(self):
+            self.linear, self.angular = Vector3(), Vector3()
+
+    class PoseStamped(_Msg):
+        __slots__ = ('pose',)
+        def __init__(self):
+            self.pose = Pose()
+
+    class TwistStamped(_Msg):
+        __slots__ = ('twist',)
+        def __init__(self):
+            self.twist = Twist()
+
+    class _PoseWithCovariance(_Msg):
+        __slots__ = ('pose',)
+        def __init__(self):
+            self.pose = Pose()
+
+    class _TwistWithCovariance(_Msg):
+        __slots__ = ('twist',)
+        def __init__(self):
+            self.twist = Twist()
+
+    class Odometry(_Msg):
+        __slots__ = ('pose', 'twist')
+        def __init__(self):
+            self.pose, self.twist = _PoseWithCovariance(), _TwistWithCovariance()
+
+    class Transform(_Msg):
+        __slots__ = ('translation', 'rotation')
+        def __init__(self):
+            self.translation, self.rotation = Vector3(), Quaternion()
+
+    class MultiDOFJointTrajectoryPoint(_Msg):
+        __slots__ = ('transforms', 'velocities')
+        def __init__(self):
+            self.transforms, self.velocities = [Transform()], [Twist()]
+
+    class MultiDOFJointTrajectory(_Msg):
+        __slots__ = ('points',)
+        def __init__(self):
+            self.points = [MultiDOFJointTrajectoryPoint()]
+
+
+class ScriptCallbacks:
+    """ The callbacks and per-tick array building of test-28-asmc-hold.py. """
+    def __init__(self):
+        self.sp = PoseStamped()
+        self.cur_pose = PoseStamped()
+        self.cur_vel = TwistStamped()
+        self.desVel = np.zeros(3)
+
+    def multiDoFCb(self, msg):
+        pt = msg.points[0]
+        self.sp.pose.position.x = pt.transforms[0].translation.x
+        self.sp.pose.position.y = pt.transforms[0].translation.y
+        self.sp.pose.position.z = pt.transforms[0].translation.z
+        self.desVel = np.array([pt.velocities[0].linear.x, pt.velocities[0].linear.y, pt.velocities[0].linear.z])
+
+    def odomCb(self, msg):
+        self.cur_pose.pose.position.x = msg.pose.pose.position.x
+        self.cur_pose.pose.position.y = msg.pose.pose.position.y
+        self.cur_pose.pose.position.z = msg.pose.pose.position.z
+
+        self.cur_pose.pose.orientation.w = msg.pose.pose.orientation.w
+        self.cur_pose.pose.orientation.x = msg.pose.pose.orientation.x
+        self.cur_pose.pose.orientation.y = msg.pose.pose.orientation.y
+        self.cur_pose.pose.orientation.z = msg.pose.pose.orientation.z
+
+        self.cur_vel.twist.linear.x = msg.twist.twist.linear.x
+        self.cur_vel.twist.linear.y = msg.twist.twist.linear.y
+        self.cur_vel.twist.linear.z = msg.twist.twist.linear.z
+
+        self.cur_vel.twist.angular.x = msg.twist.twist.angular.x
+        self.cur_vel.twist.angular.y = msg.twist.twist.angular.y
+        self.cur_vel.twist.angular.z = msg.twist.twist.angular.z
+
+    def newPoseCB(self, msg):
+        self.sp.pose.position.x = msg.pose.position.x
+        self.sp.pose.position.y = msg.pose.position.y
+        self.sp.pose.position.z = msg.pose.position.z
+
+        self.sp.pose.orientation.x = msg.pose.orientation.x
+        self.sp.pose.orientation.y = msg.pose.orientation.y
+        self.sp.pose.orientation.z = msg.pose.orientation.z
+        self.sp.pose.orientation.w = msg.pose.orientation.w
+
+    def vector2Arrays(self, vector):
+        return np.array([vector.x, vector.y, vector.z])
+
+    def tick(self):
+        ''' What th_des() and geo_con_new() build before any control math. '''
+        curPos = self.vector2Arrays(self.cur_pose.pose.position)
+        desPos = self.vector2Arrays(self.sp.pose.position)
+        curVel = self.vector2Arrays(self.cur_vel.twist.linear)
+        quat = np.array([self.cur_pose.pose.orientation.x, self.cur_pose.pose.orientation.y,
+                         self.cur_pose.pose.orientation.z, self.cur_pose.pose.orientation.w])
+        rate = np.array([self.cur_vel.twist.angular.x, self.cur_vel.twist.angular.y, self.cur_vel.twist.angular.z])
+        return curPos, curVel, quat, rate, desPos, self.desVel
+
+
+class AdapterCallbacks:
+    """ The same subscriptions through the adapters; the controller gets state / setpoint vectors. """
+    def __init__(self):
+        self.odometry = DFOdometryAdapter()
+        self.target = DFSetpointAdapter()
+        self.state = np.empty(STATE_SIZE)
+        self.setpoint = np.empty(SETPOINT_SIZE)
+        self.odomCb = self.odometry.odom
+        self.newPoseCB = self.target.pose
+        self.multiDoFCb = self.target.trajectory
+
+    def tick(self):
+        self.odometry.snapshot(self.state)
+        self.target.snapshot(self.setpoint)
+        return self.state, self.setpoint
+
+
+def messages(n, seed=0):
+    ''' n odometry messages; a new_pose and a trajectory point every 10th. '''
+    rng = np.random.default_rng(seed)
+    odom, pose, traj = Odometry(), PoseStamped(), MultiDOFJointTrajectory()
+    for values in rng.normal(size=(n, 13 + 7 + 6)):
+        values = values.tolist()
+        p, q, v, w = odom.pose.pose.position, odom.pose.pose.orientation, odom.twist.twist.linear, odom.twist.twist.angular
+        p.x, p.y, p.z, q.x, q.y, q.z, q.w, v.x, v.y, v.z, w.x, w.y, w.z = values[:13]
+        p, q = pose.pose.position, pose.pose.orientation
+        p.x, p.y, p.z, q.x, q.y, q.z, q.w = values[13:20]
+        t, v = traj.points[0].transforms[0].translation, traj.points[0].velocities[0].linear
+        t.x, t.y, t.z, v.x, v.y, v.z = values[20:]
+        yield odom, pose, traj
+
+
+def check_concurrent_writers(duration=2.0):
+    ''' odom and pose (odometry), pose and trajectory (setpoint) from two threads each, like two
+    rospy Subscribers on one adapter. Every message sets all its fields to one value, so a snapshot
+    mixing two messages shows up as different values within a field group. '''
+    odometry, target = DFOdometryAdapter(), DFSetpointAdapter()
+    alive = True
+
+    def writer(callback, msg, fields, sign):
+        k = 0
+        while alive:
+            k += 1
+            for obj, names in fields(msg):
+                for name in names:
+                    setattr(obj, name, sign * k)
+            callback(msg)
+
+    odom_fields = lambda m: ((m.pose.pose.position, 'xyz'), (m.pose.pose.orientation, 'xyzw'),
+                             (m.twist.twist.linear, 'xyz'), (m.twist.twist.angular, 'xyz'))
+    pose_fields = lambda m: ((m.pose.position, 'xyz'), (m.pose.orientation, 'xyzw'))
+    traj_fields = lambda m: ((m.points[0].transforms[0].translation, 'xyz'), (m.points[0].velocities[0].linear, 'xyz'))
+    threads = [threading.Thread(target=writer, args=args, daemon=True) for args in (
+        (odometry.odom, Odometry(), odom_fields, 1.0),
+        (odometry.pose, PoseStamped(), pose_fields, -1.0),
+        (target.trajectory, MultiDOFJointTrajectory(), traj_fields, 1.0),
+        # identity orientation keeps the desired yaw at 0
+        (target.pose, PoseStamped(), lambda m: ((m.pose.position, 'xyz'),), -1.0),
+    )]
+
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    state, setpoint = np.empty(STATE_SIZE), np.empty(SETPOINT_SIZE)
+    snapshots = 0
+    slowest = 0.0
+    try:
+        for thread in threads:
+            thread.start()
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            odometry.snapshot(state)
+            target.snapshot(setpoint)
+            slowest = max(slowest, time.perf_counter() - start)
+            snapshots += 1
+            # odom writes every field with one value, pose position + orientation with another
+            assert len(set(state[POS]) | set(state[QUAT])) == 1, f'torn state snapshot {state}'
+            assert len(set(state[VEL]) | set(state[OMEGA])) == 1, f'torn state snapshot {state}'
+            assert len(set(setpoint[SP_POS])) == 1, f'torn setpoint snapshot {setpoint}'
+    finally:
+        alive = False
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(switch)
+    assert odometry.seq % 2 == 0 and target.seq % 2 == 0, 'a write was left half done'
+    print(f"4 writer threads on 2 adapters: {snapshots} consistent snapshots, slowest {slowest*1e3:.2f} ms, "
+          f"{odometry.seq // 2 + target.seq // 2} writes")
+
+
+def replay(callbacks, n):
+    ''' (callback s, tick s, gc collections, largest transient tick allocation in bytes). '''
+    clock = time.perf_counter
+    collections = sum(stats['collections'] for stats in gc.get_stats())
+    t_callbacks = t_ticks = 0.0
+    for i, (odom, pose, traj) in enumerate(messages(n)):
+        start = clock()
+        callbacks.odomCb(odom)
+        if i % 10 == 0:
+            callbacks.newPoseCB(pose)
+            callbacks.multiDoFCb(traj)
+        t_callbacks += clock() - start
+        start = clock()
+        callbacks.tick()
+        t_ticks += clock() - start
+    collections = sum(stats['collections'] for stats in gc.get_stats()) - collections
+
+    tracemalloc.start()
+    transient = 0
+    for odom, pose, traj in messages(1000):
+        callbacks.odomCb(odom)
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = callbacks.tick()
+        transient = max(transient, tracemalloc.get_traced_memory()[1] - base)
+        del result
+    tracemalloc.stop()
+    return t_callbacks, t_ticks, collections, transient
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='ROS state adapters vs field-by-field callbacks.')
+    parser.add_argument('--messages', type=int, default=50000, help="Odometry messages to replay.")
+    args = parser.parse_args()
+
+    n = args.messages
+    print(f"{'real genpy' if ROS else 'stand-in'} messages, {n} odometry + {n // 10} new_pose / trajectory")
+
+    # Same numbers reach the controller
+    script, adapter = ScriptCallbacks(), AdapterCallbacks()
+    for odom, pose, traj in messages(50, seed=1):
+        for callbacks in (script, adapter):
+            callbacks.odomCb(odom)
+            callbacks.newPoseCB(pose)
+            callbacks.multiDoFCb(traj)
+        curPos, curVel, quat, rate, desPos, desVel = script.tick()
+        state, setpoint = adapter.tick()
+        assert np.array_equal(state[POS], curPos) and np.array_equal(state[VEL], curVel)
+        assert np.array_equal(state[QUAT], quat) and np.array_equal(state[OMEGA], rate)
+        assert np.array_equal(setpoint[SP_POS], desPos) and np.array_equal(setpoint[SP_VEL], desVel)
+    print("adapter state / setpoint identical to the scripts' arrays")
+    check_concurrent_writers()
+
+    print(f"{'':<10}{'callbacks/msg':>15}{'tick':>10}{'total/msg':>12}{'gc runs':>9}{'tick alloc':>12}")
+    for name, callbacks in (('scripts', ScriptCallbacks()), ('adapters', AdapterCallbacks())):
+        t_callbacks, t_ticks, collections, transient = replay(callbacks, n)
+        print(f"{name:<10}{t_callbacks/n*1e6:>12.2f} us{t_ticks/n*1e6:>7.2f} us{(t_callbacks+t_ticks)/n*1e6:>9.2f} us"
+              f"{collections:>9}{transient:>10} B")
@@ -6,7 +6,8 @@ How to run:
     a. ~/ardupilot_ws/src/ardupilot# ./Tools/autotest/sim_vehicle.py -v ArduCopter --vehicle=ArduCopter --frame=hexa
     b. mavproxy.py --master 127.0.0.1:14551 --out=udp:127.0.0.1:14552 --out=udp:127.0.0.1:14553
 2. Open QGC/Ground control - it will auto connect to 127.0.0.1:14550 or 127.0.0.1:14551
-3. Run this file
+3. Run this file (NAV_CONTROLLER_OUTPUT roll/pitch and body rates are saved to --log-dir as rpy.dflog / w.dflog,
+   read them with src.flightlog.read_log)
 """
 
 import imp
@@ -16,6 +17,7 @@ cur_path=os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, cur_path+"/..")
 
 from src.utility.logger import *
+from src.recorder import DFRingRecorder, DFRecorderSnapshot
 
 from dronekit import connect, mavutil, VehicleMode, LocationGlobalRelative
 
@@ -28,63 +30,27 @@ import json
 
 logging.debug('Beginning of code...')
 
-import threading
+from src.autopilot import DFAutopilot
 
-class Autopilot:
-    """ A Dronekit autopilot connection manager. """
-    def __init__(self, connection_string, *args, **kwargs):
-        logging.debug('connecting to Drone (or SITL/HITL) on: %s', connection_string)
-        self.alive = True
-        self.master = connect(connection_string, wait_ready=True)
-        self.mavutil = mavutil.mavlink_connection('127.0.0.1:14552')
-
-        self.schedules = []
-        self.threads = []
-
-        self.pitch_array = []
-        self.roll_array = []
-        self.rpy_timestamps = []
-
-        self.pitchspeed_array = []
-        self.rollspeed_array = []
-        self.yawspeed_array = []
-        self.w_timestamps = []
-
-        # Add a heartbeat listener
-        # Func for heartbeat
-        def heartbeat_listener(_self, name, msg):
-            self.last_heartbeat = msg
+# Telemetry records, timestamps in microseconds like the rest of the script
+RPY_RECORD = [('t', '<i8'), ('roll', '<f4'), ('pitch', '<f4')]
+W_RECORD = [('t', '<i8'), ('rollspeed', '<f4'), ('pitchspeed', '<f4'), ('yawspeed', '<f4')]
 
-        self.heart = heartbeat_listener
-
-        logging.info('Drone connection successful')
-
-    def __enter__(self):
-        ''' Send regular heartbeats while using in a context manager. '''
-        self.alive = True
-        logging.info('__enter__ -> reviving heart (if required)')
-        # Listen to the heartbeat
-        self.master.add_message_listener('HEARTBEAT', self.heart)
-       
-        return self
+class Autopilot(DFAutopilot):
+    """ DFAutopilot (dronekit link) with the telemetry recorders of this script. """
+    def __init__(self, connection_string, *args, **kwargs):
+        super().__init__(connection_string, *args, **kwargs)
+        # Fixed-size telemetry recorders, saved to disk by background snapshots
+        self.rpy = DFRingRecorder(RPY_RECORD)
+        self.w = DFRingRecorder(W_RECORD)
+        self.snapshots = []
 
     def __exit__(self, *args):
-        ''' Automatically disarm and stop heartbeats on error/context-close. '''
-        self.alive = False
-        logging.info('__exit__ -> disarming, stopping heart and closing connection')
-        # TODO: add reset parameters procedure. Can be based on flag?
-        # Disarm if not disarmed
-        if self.master.armed:
-            self.master.armed = False
-        # Kill heartbeat
-        self.master.remove_message_listener('HEARTBEAT', self.heart)
-        # Kill scheduler
-        for i in range(0, len(self.schedules)-1):
-            t = self.threads[i]
-            t.stop()
-        # Close Drone connection
-        logging.info('disconnect -> closing Drone connection') 
-        self.master.close()
+        self.telemetry.stop()
+        # Save the telemetry not written yet
+        for snapshot in self.snapshots:
+            snapshot.stop()
+        super().__exit__(*args)
 
 if __name__ == '__main__':
     # Set up option parsing to get connection string
@@ -92,6 +58,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Description of what this file does.')
     parser.add_argument('--connect', 
                     help="Vehicle connection target string. If not specified, SITL automatically started and used.")
+    parser.add_argument('--log-dir', default='.', help="Directory for the rpy.dflog and w.dflog telemetry logs.")
     args = parser.parse_args()
 
     connection_string = args.connect
@@ -194,63 +161,15 @@ if __name__ == '__main__':
             # set_motor_dir(5, 0)
             # set_motor_dir(6, 0)
 
-        # RPY Thread
-        def rpy_thread():
-            if(drone.alive)==False:
-                pass
-            while drone.alive:
-                rpy_logger()
-                # TODO: Mayank - test this delay on Pi
-                time.sleep(0.01)
-
-        # W Thread
-        def w_thread():
-            if(drone.alive)==False:
-                pass
-            while drone.alive:
-                w_logger()
-                # TODO: Mayank - test this delay on Pi
-                time.sleep(0.01)
-
-        # Func for rpy logging
-        def rpy_logger():
-            # Procedure to track and store pitch-roll-yaw values
-            nav_msg = drone.mavutil.recv_match(type='NAV_CONTROLLER_OUTPUT', blocking=False)
-            # TODO: Mayank - test this delay on Pi
-            time.sleep(0.01)
-            if(nav_msg) is None:
-                pass
-            elif nav_msg.get_type()!='BAD_DATA':
-                # 'nav_roll', 'nav_pitch', 'alt_error', 'aspd_error', 'xtrack_error', 'nav_bearing', 'target_bearing', 'wp_dist'
-                nav_data = (nav_msg.nav_roll, nav_msg.nav_pitch, nav_msg.alt_error, nav_msg.aspd_error, nav_msg.xtrack_error, nav_msg.nav_bearing, nav_msg.target_bearing, nav_msg.wp_dist) 
-                timestamp = getattr(nav_msg, '_timestamp', None)
-                timestamp = int(timestamp*1.0e6)
-                drone.pitch_array.append(nav_data[1])
-                drone.roll_array.append(nav_data[0])
-                drone.rpy_timestamps.append(timestamp)
-                # TODO: Comment later on, or add exception to logger.py
-                logging.debug("RPY Logged")
-
-        # Func for rpy logging
-        def w_logger():
-            # Procedure to track and store pitch-roll-yaw values
-            nav_msg = drone.mavutil.recv_match(type='ATTITUDE_QUATERNION_COV', blocking=False)
-            # TODO: Mayank - test this delay on Pi
-            time.sleep(0.01)
-            if(nav_msg) is None:
-                pass
-            elif nav_msg.get_type()!='BAD_DATA':
-                # TODO: (Mayank) - print nav_msg and see what vars it has
-                # TODO: change nav_data to have exact same vars from print above
-                nav_data = (nav_msg.time_usec, nav_msg.q, nav_msg.rollspeed, nav_msg.pitchspeed, nav_msg.yawspeed, nav_msg.covariance) 
-                timestamp = getattr(nav_msg, '_timestamp', None)
-                timestamp = int(timestamp*1.0e6)
-                drone.pitchspeed_array.append(nav_data[3])
-                drone.rollspeed_array.append(nav_data[2])
-                drone.yawspeed_array.append(nav_data[4])
-                drone.w_timestamps.append(timestamp)
-                # TODO: Comment later on, or add exception to logger.py
-                logging.debug("W Logged")
+        # NAV_CONTROLLER_OUTPUT: 'nav_roll', 'nav_pitch', 'alt_error', 'aspd_error', 'xtrack_error', 'nav_bearing', 'target_bearing', 'wp_dist'
+        def rpy_logger(nav_msg):
+            timestamp = int(nav_msg._timestamp*1.0e6)
+            drone.rpy.append(timestamp, nav_msg.nav_roll, nav_msg.nav_pitch)
+
+        # ATTITUDE_QUATERNION_COV: 'time_usec', 'q', 'rollspeed', 'pitchspeed', 'yawspeed', 'covariance'
+        def w_logger(nav_msg):
+            timestamp = int(nav_msg._timestamp*1.0e6)
+            drone.w.append(timestamp, nav_msg.rollspeed, nav_msg.pitchspeed, nav_msg.yawspeed)
 
         # Reset all motor configs
         set_motor_mode(1, 33)
@@ -283,10 +202,16 @@ if __name__ == '__main__':
         drone.master.mode = VehicleMode("GUIDED")
         drone.master.armed = True
         
-        # Start RPY Logger
-        threading.Thread(target= rpy_thread).start()
-        # Start W Logger
-        threading.Thread(target= w_thread).start()
+        # Snapshot the recorders to disk once a second
+        for name, recorder in (('rpy', drone.rpy), ('w', drone.w)):
+            snapshot = DFRecorderSnapshot(recorder, os.path.join(args.log_dir, f'{name}.dflog'))
+            snapshot.start()
+            drone.snapshots.append(snapshot)
+
+        # Log RPY and W from the link's receiver thread, every message as it arrives
+        drone.telemetry.subscribe('NAV_CONTROLLER_OUTPUT', rpy_logger)
+        drone.telemetry.subscribe('ATTITUDE_QUATERNION_COV', w_logger)
+        drone.telemetry.start()
 
         # Confirm vehicle armed before attempting to take off
         while not drone.master.armed: